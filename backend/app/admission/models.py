@@ -0,0 +1,42 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+from datetime import datetime
+from enum import Enum
+
+class QueueStatus(str, Enum):
+    WAITING = "waiting"
+    ADMITTED = "admitted"
+    EXPIRED = "expired"
+
+class QueueConfig(BaseModel):
+    enabled: bool = True
+    admit_rate: Optional[float] = Field(None, gt=0)  # buyers admitted per second
+    burst: Optional[int] = Field(None, ge=1)
+
+class QueueConfigResponse(BaseModel):
+    event_id: str
+    enabled: bool
+    admit_rate: float
+    burst: int
+    queued: int
+    admitted: int
+
+class QueueTicket(BaseModel):
+    token: str
+    event_id: str
+    position: int
+    status: QueueStatus
+    ahead: int = 0
+    admitted_until: Optional[datetime] = None
+
+# Database indexes
+ADMISSION_TOKEN_INDEXES = [
+    {
+        "keys": [("event_id", 1), ("user_id", 1)],
+        "unique": True
+    },
+    {
+        "keys": [("purge_at", 1)],
+        "expireAfterSeconds": 0
+    }
+]
@@ -0,0 +1,79 @@
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from app.database import get_database
+from app.auth.utils import get_current_active_user, get_current_admin_user
+from app.auth.models import UserModel
+from app.services.admission_service import AdmissionService
+from .models import QueueConfig, QueueConfigResponse, QueueTicket
+from bson import ObjectId
+import logging
+
+router = APIRouter(prefix="/queue", tags=["queue"])
+logger = logging.getLogger(__name__)
+admission_service = AdmissionService()
+
+def parse_event_id(event_id: str) -> ObjectId:
+    try:
+        return ObjectId(event_id)
+    except:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid event ID format"
+        )
+
+@router.put("/{event_id}", response_model=QueueConfigResponse)
+async def configure_queue(
+    event_id: str,
+    config: QueueConfig,
+    db = Depends(get_database),
+    current_user: UserModel = Depends(get_current_admin_user)
+):
+    """
+    Open, tune or close the waiting room of an event (admin only)
+    """
+    event_oid = parse_event_id(event_id)
+    event = await db.events.find_one({"_id": event_oid}, projection={"_id": 1})
+    if not event:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Event not found"
+        )
+    
+    queue = await admission_service.configure(
+        db, event_oid, config.enabled, config.admit_rate, config.burst
+    )
+    return QueueConfigResponse(
+        event_id=event_id,
+        enabled=queue["enabled"],
+        admit_rate=queue["rate"],
+        burst=queue["burst"],
+        queued=queue["next_position"],
+        admitted=queue["admitted_upto"]
+    )
+
+@router.post("/{event_id}/join", response_model=QueueTicket)
+async def join_queue(
+    event_id: str,
+    db = Depends(get_database),
+    current_user: UserModel = Depends(get_current_active_user)
+):
+    """
+    Join the waiting room of an event and get a queue token
+    """
+    event_oid = parse_event_id(event_id)
+    token = await admission_service.join(db, event_oid, str(current_user.id))
+    queue = await admission_service.get_queue(db, event_oid)
+    return QueueTicket(**admission_service.describe(token, queue))
+
+@router.get("/{event_id}/status", response_model=QueueTicket)
+async def get_queue_status(
+    event_id: str,
+    token: str = Query(...),
+    db = Depends(get_database),
+    current_user: UserModel = Depends(get_current_active_user)
+):
+    """
+    Poll the queue position; once admitted, send the token as X-Queue-Token
+    when creating payments or tickets
+    """
+    event_oid = parse_event_id(event_id)
+    return QueueTicket(**await admission_service.status(db, event_oid, token))
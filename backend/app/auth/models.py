@@ -1,7 +1,8 @@
-from pydantic import BaseModel, EmailStr, Field, ConfigDict
+from pydantic import BaseModel, EmailStr, Field, ConfigDict, validator
 from typing import Optional
 from bson import ObjectId
 from app.core.utils.objectid import PyObjectId
+from app.core.utils.phone import normalize_phone
 from datetime import datetime
 
 class UserBase(BaseModel):
@@ -12,6 +13,10 @@ class UserBase(BaseModel):
 class UserCreate(UserBase):
     password: str = Field(..., min_length=8)
 
+    @validator('phone_number')
+    def normalize_phone_number(cls, v):
+        return normalize_phone(v)
+
 class UserLogin(BaseModel):
     email: EmailStr
     password: str
@@ -70,3 +75,12 @@ class UserModel(BaseModel):
             return None
         id = data.pop('_id', None)
         return cls(**dict(data, id=str(id)))
+
+
+# Database indexes
+USER_INDEXES = [
+    {
+        "keys": [("email", 1)],
+        "unique": True
+    }
+]
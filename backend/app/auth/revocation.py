@@ -0,0 +1,96 @@
+import asyncio
+import hashlib
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+from pymongo.errors import DuplicateKeyError
+from app.core.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+REVOKED_TOKEN_INDEXES = [
+    [("revoked_at", 1)],
+    # Revocations are only needed until the token itself expires
+    {"keys": [("expires_at", 1)], "expireAfterSeconds": 0}
+]
+
+
+def token_key(token: str, claims: Dict[str, Any]) -> str:
+    """
+    Revocation key of a token: its jti, or a hash for tokens issued without one
+    """
+    if claims.get("jti"):
+        return claims["jti"]
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class TokenRevocationStore:
+    """
+    Revoked access tokens, shared by all workers through the revoked_tokens
+    collection and mirrored in memory by each worker.
+
+    Checks only look at the in-memory mirror, so the usual "not revoked" case
+    costs no database round-trip. Each worker pulls new revocations every
+    TOKEN_REVOCATION_SYNC_SECONDS; the revoking worker sees its own
+    revocations at once. Entries are dropped when the token expires.
+    """
+
+    def __init__(self):
+        self.sync_seconds = settings.TOKEN_REVOCATION_SYNC_SECONDS
+        # key -> token expiry
+        self._revoked: Dict[str, datetime] = {}
+        self._synced_at: Optional[datetime] = None
+
+    def is_revoked(self, key: str) -> bool:
+        return key in self._revoked
+
+    async def revoke(self, db, key: str, expires_at: datetime) -> None:
+        """
+        Revoke a token until it expires
+        """
+        self._revoked[key] = expires_at
+        try:
+            await db.revoked_tokens.insert_one({
+                "_id": key,
+                "expires_at": expires_at,
+                "revoked_at": datetime.utcnow()
+            })
+        except DuplicateKeyError:
+            pass
+
+    async def sync(self, db) -> None:
+        """
+        Pull revocations made since the last sync (all live ones on the first call)
+        """
+        now = datetime.utcnow()
+        if self._synced_at is None:
+            query = {"expires_at": {"$gt": now}}
+        else:
+            # Overlap the previous window to tolerate clock skew between workers
+            query = {"revoked_at": {"$gte": self._synced_at - timedelta(seconds=max(60, self.sync_seconds * 2))}}
+        async for doc in db.revoked_tokens.find(query, projection={"expires_at": 1}):
+            self._revoked[doc["_id"]] = doc["expires_at"]
+        self._synced_at = now
+
+        expired = [key for key, expires_at in self._revoked.items() if expires_at <= now]
+        for key in expired:
+            del self._revoked[key]
+
+    async def run_sync(self, db) -> None:
+        """
+        Keep the in-memory mirror up to date
+        """
+        while True:
+            try:
+                await self.sync(db)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error syncing revoked tokens: {str(e)}")
+            await asyncio.sleep(self.sync_seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "revoked": len(self._revoked),
+            "synced_at": self._synced_at
+        }
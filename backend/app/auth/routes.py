@@ -6,13 +6,15 @@ from app.core.config import settings
 from app.database import Database, get_database
 from app.auth.models import UserCreate, UserModel, Token, UserLogin
 from app.auth.utils import (
-    get_password_hash,
-    verify_password,
+    get_password_hash_async,
+    verify_and_update_password,
     create_access_token,
     get_current_user,
     get_current_active_user,
     get_current_admin_user,
-    add_token_to_blacklist
+    add_token_to_blacklist,
+    user_cache,
+    revocation_store
 )
 from app.auth.social_auth import (
     get_google_auth_url,
@@ -25,8 +27,27 @@ from sqlalchemy.orm import Session
 from fastapi.responses import RedirectResponse
 import urllib.parse
 import json
+import asyncio
+import logging
 
 router = APIRouter(prefix="/auth", tags=["auth"])
+logger = logging.getLogger(__name__)
+
+_revocation_tasks = []
+
+@router.on_event("startup")
+async def start_revocation_sync():
+    """
+    Keep this worker's revocation mirror in sync
+    """
+    db = await Database.get_db()
+    _revocation_tasks.append(asyncio.create_task(revocation_store.run_sync(db)))
+
+@router.on_event("shutdown")
+async def stop_revocation_sync():
+    for task in _revocation_tasks:
+        task.cancel()
+    _revocation_tasks.clear()
 
 @router.post("/register", response_model=UserModel)
 async def register(user_data: UserCreate) -> Any:
@@ -45,7 +66,7 @@ async def register(user_data: UserCreate) -> Any:
     
     # Create new user
     user_dict = user_data.model_dump()
-    user_dict["hashed_password"] = get_password_hash(user_data.password)
+    user_dict["hashed_password"] = await get_password_hash_async(user_data.password)
     del user_dict["password"]
     
     # Add additional fields
@@ -71,13 +92,23 @@ async def login(user_data: UserLogin) -> Any:
     db = await Database.get_db()
     user = await db.users.find_one({"email": user_data.email})
     
-    if not user or not verify_password(user_data.password, user["hashed_password"]):
+    valid, new_hash = (False, None)
+    if user:
+        valid, new_hash = await verify_and_update_password(user_data.password, user.get("hashed_password", ""))
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    if new_hash:
+        # Stored hash used an old bcrypt cost
+        await db.users.update_one(
+            {"_id": user["_id"], "hashed_password": user["hashed_password"]},
+            {"$set": {"hashed_password": new_hash}}
+        )
+    
     if not user.get("is_active", True):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -131,6 +162,7 @@ async def verify_email(token: str, current_user: UserModel = Depends(get_current
         {"email": current_user.email},
         {"$set": {"is_verified": True, "updated_at": datetime.utcnow()}}
     )
+    user_cache.invalidate(current_user.email)
     return {"message": "Email verified successfully"}
 
 @router.post("/change-password")
@@ -145,7 +177,8 @@ async def change_password(
     db = await Database.get_db()
     user = await db.users.find_one({"email": current_user.email})
     
-    if not verify_password(current_password, user["hashed_password"]):
+    valid, _ = await verify_and_update_password(current_password, user.get("hashed_password", ""))
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Incorrect current password"
@@ -155,11 +188,12 @@ async def change_password(
         {"email": current_user.email},
         {
             "$set": {
-                "hashed_password": get_password_hash(new_password),
+                "hashed_password": await get_password_hash_async(new_password),
                 "updated_at": datetime.utcnow()
             }
         }
     )
+    user_cache.invalidate(current_user.email)
     return {"message": "Password changed successfully"}
 
 @router.get("/google")
@@ -188,6 +222,7 @@ async def google_callback(code: str, state: str = None, db = Depends(get_databas
                 "updated_at": datetime.utcnow().isoformat()
             }
             result = await db.users.insert_one(user_data)
+            user_cache.invalidate(user_info["email"])
             user_data["_id"] = str(result.inserted_id)
             user = user_data
         else:
@@ -249,6 +284,7 @@ async def facebook_callback(code: str, state: str = None, db = Depends(get_datab
                 "updated_at": datetime.utcnow().isoformat()
             }
             result = await db.users.insert_one(user_data)
+            user_cache.invalidate(user_info["email"])
             user_data["_id"] = str(result.inserted_id)
             user = user_data
         else:
@@ -338,11 +374,12 @@ async def reset_password_confirm(token: str, new_password: str):
             )
         
         # Update password
-        hashed_password = get_password_hash(new_password)
+        hashed_password = await get_password_hash_async(new_password)
         await db.users.update_one(
             {"email": email},
             {"$set": {"hashed_password": hashed_password}}
         )
+        user_cache.invalidate(email)
         
         return {"message": "Password reset successfully"}
     except Exception as e:
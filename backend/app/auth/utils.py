@@ -1,5 +1,7 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Callable, Dict, Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
@@ -7,18 +9,156 @@ from fastapi.security import OAuth2PasswordBearer
 from app.core.config import settings
 from app.database import Database
 from app.auth.models import UserModel, TokenData
+from app.auth.revocation import TokenRevocationStore, token_key
+import asyncio
 import logging
+import time
+import uuid
 
 logger = logging.getLogger(__name__)
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing; hashes made with a different cost are flagged for rehashing
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS
+)
+
+class PasswordHasher:
+    """
+    Runs bcrypt in a bounded thread pool so hashing never blocks the event loop.
+
+    bcrypt releases the GIL, so `workers` threads hash in parallel; callers
+    beyond `max_pending` in flight are rejected with 503 rather than queueing
+    without bound. Queue time and hash time are tracked for /health.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.queue_seconds = 0.0
+        self.max_queue_seconds = 0.0
+        self.hash_seconds = 0.0
+
+    async def run(self, fn: Callable, *args) -> Any:
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many authentication requests, please retry",
+                headers={"Retry-After": "1"}
+            )
+        submitted = time.monotonic()
+
+        def timed():
+            started = time.monotonic()
+            try:
+                return fn(*args)
+            finally:
+                finished = time.monotonic()
+                queued = started - submitted
+                self.queue_seconds += queued
+                self.max_queue_seconds = max(self.max_queue_seconds, queued)
+                self.hash_seconds += finished - started
+
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, timed)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "rounds": settings.BCRYPT_ROUNDS,
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_queue_ms": round(self.queue_seconds / self.completed * 1000, 2) if self.completed else 0.0,
+            "max_queue_ms": round(self.max_queue_seconds * 1000, 2),
+            "avg_hash_ms": round(self.hash_seconds / self.completed * 1000, 2) if self.completed else 0.0
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING
+)
 
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
 
-# In-memory token blacklist (for development)
-token_blacklist = set()
+# Revoked tokens, shared across workers via the revoked_tokens collection
+revocation_store = TokenRevocationStore()
+
+class UserCache:
+    """
+    Bounded TTL/LRU cache of users keyed by token subject (email).
+
+    The cache is per process: writes to `users` call invalidate() so this
+    worker sees them at once, and the TTL bounds how long other workers can
+    serve a stale user.
+    """
+
+    def __init__(self, enabled: bool, ttl_seconds: float, max_size: int):
+        self.enabled = enabled
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[float, UserModel]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, subject: str) -> Optional[UserModel]:
+        if not self.enabled:
+            return None
+        entry = self._entries.get(subject)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[subject]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(subject)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, subject: str, user: UserModel) -> None:
+        if not self.enabled:
+            return
+        self._entries[subject] = (time.monotonic() + self.ttl_seconds, user)
+        self._entries.move_to_end(subject)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, subject: str) -> None:
+        self._entries.pop(subject, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0
+        }
+
+user_cache = UserCache(
+    enabled=settings.USER_CACHE_ENABLED,
+    ttl_seconds=settings.USER_CACHE_TTL_SECONDS,
+    max_size=settings.USER_CACHE_MAX_SIZE
+)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against a hash"""
@@ -28,6 +168,21 @@ def get_password_hash(password: str) -> str:
     """Hash a password"""
     return pwd_context.hash(password)
 
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password without blocking the event loop"""
+    return await password_hasher.run(pwd_context.hash, password)
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password without blocking the event loop.
+    Returns (valid, new_hash); new_hash is set when the stored hash should be
+    replaced, e.g. after BCRYPT_ROUNDS changed.
+    """
+    if not hashed_password:
+        # Social-login accounts have no password
+        return False, None
+    return await password_hasher.run(pwd_context.verify_and_update, plain_password, hashed_password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """
     Create JWT access token
@@ -37,7 +192,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, settings.JWT_SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
@@ -56,11 +211,21 @@ def verify_token(token: str) -> Optional[str]:
 
 async def is_token_blacklisted(token: str) -> bool:
     """Check if a token is blacklisted"""
-    return token in token_blacklist
+    try:
+        claims = jwt.get_unverified_claims(token)
+    except JWTError:
+        return False
+    return revocation_store.is_revoked(token_key(token, claims))
 
 async def add_token_to_blacklist(token: str) -> None:
-    """Add a token to the blacklist"""
-    token_blacklist.add(token)
+    """Revoke a token until it expires"""
+    claims = jwt.get_unverified_claims(token)
+    if claims.get("exp"):
+        expires_at = datetime.utcfromtimestamp(claims["exp"])
+    else:
+        expires_at = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    db = await Database.get_db()
+    await revocation_store.revoke(db, token_key(token, claims), expires_at)
 
 async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserModel:
     """Get current user from token"""
@@ -71,11 +236,10 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserModel:
     )
     
     try:
+        payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.ALGORITHM])
         # Check if token is blacklisted
-        if await is_token_blacklisted(token):
+        if revocation_store.is_revoked(token_key(token, payload)):
             raise credentials_exception
-            
-        payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.ALGORITHM])
         email: str = payload.get("sub")
         if email is None:
             raise credentials_exception
@@ -83,12 +247,18 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserModel:
     except JWTError:
         raise credentials_exception
         
+    cached = user_cache.get(token_data.email)
+    if cached is not None:
+        return cached
+
     db = await Database.get_db()
     user = await db.users.find_one({"email": token_data.email})
     if user is None:
         raise credentials_exception
         
-    return UserModel.from_mongo(user)
+    user = UserModel.from_mongo(user)
+    user_cache.set(token_data.email, user)
+    return user
 
 async def get_current_active_user(current_user: UserModel = Depends(get_current_user)) -> UserModel:
     """Get current active user"""
@@ -17,15 +17,80 @@ class Settings(BaseSettings):
     MONGO_URI: str = os.getenv("MONGO_URI", "mongodb://localhost:27017")
     DATABASE_NAME: str = os.getenv("DATABASE_NAME", "event_booking")
     
+    # Create/update declared indexes at startup (otherwise run `python -m app.core.indexes`)
+    INDEXES_ON_STARTUP: bool = os.getenv("INDEXES_ON_STARTUP", "true").lower() == "true"
+    
+    # List query settings
+    LIST_TOTAL_CACHE_SECONDS: int = int(os.getenv("LIST_TOTAL_CACHE_SECONDS", "30"))
+    LIST_TOTAL_CACHE_MAX_SIZE: int = int(os.getenv("LIST_TOTAL_CACHE_MAX_SIZE", "1024"))
+    
+    # Ticket inventory settings
+    TICKET_HOLD_MINUTES: int = int(os.getenv("TICKET_HOLD_MINUTES", "15"))
+    TICKET_HOLD_RETENTION_HOURS: int = int(os.getenv("TICKET_HOLD_RETENTION_HOURS", "24"))
+    TICKET_HOLD_SWEEP_SECONDS: int = int(os.getenv("TICKET_HOLD_SWEEP_SECONDS", "30"))
+    INVENTORY_SHARD_RECONCILE_SECONDS: int = int(os.getenv("INVENTORY_SHARD_RECONCILE_SECONDS", "5"))
+    INVENTORY_MAX_SHARDS: int = int(os.getenv("INVENTORY_MAX_SHARDS", "64"))
+    # How long a worker trusts its cached list of sharded events
+    INVENTORY_SHARD_CACHE_SECONDS: int = int(os.getenv("INVENTORY_SHARD_CACHE_SECONDS", "30"))
+    
+    # Waiting room settings
+    ADMISSION_ADMIT_RATE: float = float(os.getenv("ADMISSION_ADMIT_RATE", "5"))
+    ADMISSION_BURST: int = int(os.getenv("ADMISSION_BURST", "50"))
+    ADMISSION_WINDOW_MINUTES: int = int(os.getenv("ADMISSION_WINDOW_MINUTES", "10"))
+    ADMISSION_TOKEN_TTL_HOURS: int = int(os.getenv("ADMISSION_TOKEN_TTL_HOURS", "12"))
+    ADMISSION_REFRESH_SECONDS: float = float(os.getenv("ADMISSION_REFRESH_SECONDS", "1"))
+    
+    # Ticket QR codes
+    # HMAC key for QR payloads and scanner manifests; keep it separate from JWT_SECRET_KEY
+    QR_SIGNING_KEY: str = os.getenv("QR_SIGNING_KEY", "your-qr-signing-key-here")
+    # Comma-separated keys still accepted when validating payloads, e.g. the JWT
+    # secret that signed QR codes issued before QR_SIGNING_KEY existed
+    QR_PREVIOUS_SIGNING_KEYS: str = os.getenv("QR_PREVIOUS_SIGNING_KEYS", "")
+    QR_IMAGE_CACHE_SIZE: int = int(os.getenv("QR_IMAGE_CACHE_SIZE", "1024"))
+    QR_IMAGE_MAX_AGE: int = int(os.getenv("QR_IMAGE_MAX_AGE", "86400"))
+    # Render pool processes; 0 uses one per CPU core
+    QR_RENDER_WORKERS: int = int(os.getenv("QR_RENDER_WORKERS", "0"))
+    # Largest image edge in pixels; the module size is derived from it
+    QR_TARGET_SIZE: int = int(os.getenv("QR_TARGET_SIZE", "300"))
+    QR_BORDER: int = int(os.getenv("QR_BORDER", "4"))
+    # Events whose used-ticket sets are kept in memory for gate scanning
+    SCAN_INDEX_MAX_EVENTS: int = int(os.getenv("SCAN_INDEX_MAX_EVENTS", "64"))
+    # Largest batch of offline scans accepted in one upload
+    SCAN_UPLOAD_MAX: int = int(os.getenv("SCAN_UPLOAD_MAX", "5000"))
+    
     # JWT Settings
     JWT_SECRET_KEY: str = os.getenv("JWT_SECRET_KEY", "your-secret-key-here")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    TOKEN_REVOCATION_SYNC_SECONDS: float = float(os.getenv("TOKEN_REVOCATION_SYNC_SECONDS", "5"))
+    
+    # Password hashing (bcrypt runs in a thread pool off the event loop)
+    BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", "12"))
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+    PASSWORD_HASH_MAX_PENDING: int = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+    
+    # Per-process cache of users resolved from access tokens
+    USER_CACHE_ENABLED: bool = os.getenv("USER_CACHE_ENABLED", "true").lower() == "true"
+    USER_CACHE_TTL_SECONDS: float = float(os.getenv("USER_CACHE_TTL_SECONDS", "30"))
+    USER_CACHE_MAX_SIZE: int = int(os.getenv("USER_CACHE_MAX_SIZE", "10000"))
+    
+    # Outbound HTTP client settings
+    HTTP_CLIENT_HTTP2: bool = os.getenv("HTTP_CLIENT_HTTP2", "true").lower() == "true"
+    HTTP_CLIENT_MAX_CONNECTIONS: int = int(os.getenv("HTTP_CLIENT_MAX_CONNECTIONS", "100"))
+    HTTP_CLIENT_MAX_KEEPALIVE: int = int(os.getenv("HTTP_CLIENT_MAX_KEEPALIVE", "20"))
+    HTTP_CLIENT_KEEPALIVE_EXPIRY: float = float(os.getenv("HTTP_CLIENT_KEEPALIVE_EXPIRY", "60"))
+    HTTP_CLIENT_TIMEOUT: float = float(os.getenv("HTTP_CLIENT_TIMEOUT", "15"))
+    HTTP_CLIENT_CONNECT_TIMEOUT: float = float(os.getenv("HTTP_CLIENT_CONNECT_TIMEOUT", "5"))
+    HTTP_CLIENT_POOL_TIMEOUT: float = float(os.getenv("HTTP_CLIENT_POOL_TIMEOUT", "5"))
     
     # Paystack Settings
     PAYSTACK_SECRET_KEY: str = os.getenv("PAYSTACK_SECRET_KEY", "")
     PAYSTACK_PUBLIC_KEY: str = os.getenv("PAYSTACK_PUBLIC_KEY", "")
     PAYSTACK_CALLBACK_URL: str = "http://localhost:8000/api/v1/tickets/verify-payment"
+    PAYSTACK_BASE_URL: str = os.getenv("PAYSTACK_BASE_URL", "https://api.paystack.co")
+    PAYSTACK_VERIFY_FALLBACK_SECONDS: int = int(os.getenv("PAYSTACK_VERIFY_FALLBACK_SECONDS", "30"))
+    # A fulfillment that has not finished within this time can be taken over
+    PAYMENT_FULFILL_LEASE_SECONDS: int = int(os.getenv("PAYMENT_FULFILL_LEASE_SECONDS", "300"))
     
     # Email Settings
     EMAIL_HOST: str = os.getenv("EMAIL_HOST", "smtp.gmail.com")
@@ -33,11 +98,29 @@ class Settings(BaseSettings):
     EMAIL_HOST_USER: str = os.getenv("EMAIL_HOST_USER", "")
     EMAIL_HOST_PASSWORD: str = os.getenv("EMAIL_HOST_PASSWORD", "")
     EMAIL_USE_TLS: bool = True
+    EMAIL_POOL_SIZE: int = int(os.getenv("EMAIL_POOL_SIZE", "4"))
+    EMAIL_POOL_IDLE_SECONDS: int = int(os.getenv("EMAIL_POOL_IDLE_SECONDS", "60"))
+    EMAIL_TIMEOUT: int = int(os.getenv("EMAIL_TIMEOUT", "30"))
+
+    # Notification outbox (processed by `python -m app.worker`)
+    OUTBOX_CONCURRENCY: int = int(os.getenv("OUTBOX_CONCURRENCY", "8"))
+    OUTBOX_POLL_SECONDS: float = float(os.getenv("OUTBOX_POLL_SECONDS", "1"))
+    OUTBOX_LEASE_SECONDS: int = int(os.getenv("OUTBOX_LEASE_SECONDS", "120"))
+    OUTBOX_MAX_ATTEMPTS: int = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+    OUTBOX_BACKOFF_SECONDS: int = int(os.getenv("OUTBOX_BACKOFF_SECONDS", "10"))
+    OUTBOX_BACKOFF_MAX_SECONDS: int = int(os.getenv("OUTBOX_BACKOFF_MAX_SECONDS", "1800"))
+    OUTBOX_RETENTION_HOURS: int = int(os.getenv("OUTBOX_RETENTION_HOURS", "72"))
     
     # Twilio Settings
     TWILIO_ACCOUNT_SID: str = os.getenv("TWILIO_ACCOUNT_SID", "")
     TWILIO_AUTH_TOKEN: str = os.getenv("TWILIO_AUTH_TOKEN", "")
     TWILIO_PHONE_NUMBER: str = os.getenv("TWILIO_PHONE_NUMBER", "")
+    TWILIO_BASE_URL: str = os.getenv("TWILIO_BASE_URL", "https://api.twilio.com/2010-04-01")
+    TWILIO_MAX_CONCURRENCY: int = int(os.getenv("TWILIO_MAX_CONCURRENCY", "10"))
+    # 0 disables the rate limit
+    TWILIO_RATE_PER_SECOND: float = float(os.getenv("TWILIO_RATE_PER_SECOND", "10"))
+    # Country code assumed for phone numbers entered without one
+    DEFAULT_PHONE_COUNTRY_CODE: str = os.getenv("DEFAULT_PHONE_COUNTRY_CODE", "254")
     
     # CORS Settings
     BACKEND_CORS_ORIGINS: List[str] = [
@@ -51,6 +134,20 @@ class Settings(BaseSettings):
     CLOUDINARY_API_KEY: str
     CLOUDINARY_API_SECRET: str
 
+    # Image uploads (run in a thread pool, sent to Cloudinary in chunks)
+    UPLOAD_MAX_BYTES: int = int(os.getenv("UPLOAD_MAX_BYTES", str(10 * 1024 * 1024)))
+    # Cloudinary needs chunks of at least 5 MB, except the last
+    UPLOAD_CHUNK_SIZE: int = int(os.getenv("UPLOAD_CHUNK_SIZE", str(6 * 1024 * 1024)))
+    UPLOAD_WORKERS: int = int(os.getenv("UPLOAD_WORKERS", "4"))
+    UPLOAD_MAX_CONCURRENT: int = int(os.getenv("UPLOAD_MAX_CONCURRENT", "4"))
+    UPLOAD_QUEUE_TIMEOUT: float = float(os.getenv("UPLOAD_QUEUE_TIMEOUT", "10"))
+    # Browser-to-Cloudinary uploads; Cloudinary itself rejects signatures older than an hour
+    CLOUDINARY_UPLOAD_URL: str = os.getenv("CLOUDINARY_UPLOAD_URL", "https://api.cloudinary.com/v1_1")
+    DIRECT_UPLOAD_TTL_SECONDS: int = int(os.getenv("DIRECT_UPLOAD_TTL_SECONDS", "900"))
+    # Thumb/card/hero variants rendered by the worker; 0 workers uses one per CPU core
+    IMAGE_VARIANT_WORKERS: int = int(os.getenv("IMAGE_VARIANT_WORKERS", "0"))
+    IMAGE_VARIANT_QUALITY: int = int(os.getenv("IMAGE_VARIANT_QUALITY", "80"))
+
 
 
     # Google OAuth Settings
@@ -0,0 +1,93 @@
+import httpx
+from typing import Any, Dict
+from app.core.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class HTTPClient:
+    """
+    Application-wide pooled HTTP client for outbound API calls.
+
+    Connections (and their TLS sessions) are kept alive and reused across
+    requests instead of being opened per call. Started and closed with the app.
+    """
+    client: httpx.AsyncClient = None
+    requests_sent: int = 0
+
+    @classmethod
+    async def _count_request(cls, request: httpx.Request) -> None:
+        cls.requests_sent += 1
+
+    @classmethod
+    def _create_client(cls) -> httpx.AsyncClient:
+        http2 = settings.HTTP_CLIENT_HTTP2 and HTTP2_AVAILABLE
+        if settings.HTTP_CLIENT_HTTP2 and not HTTP2_AVAILABLE:
+            logger.warning("HTTP/2 requested but the h2 package is not installed; using HTTP/1.1")
+        return httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_CLIENT_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.HTTP_CLIENT_MAX_KEEPALIVE,
+                keepalive_expiry=settings.HTTP_CLIENT_KEEPALIVE_EXPIRY
+            ),
+            timeout=httpx.Timeout(
+                settings.HTTP_CLIENT_TIMEOUT,
+                connect=settings.HTTP_CLIENT_CONNECT_TIMEOUT,
+                pool=settings.HTTP_CLIENT_POOL_TIMEOUT
+            ),
+            event_hooks={"request": [cls._count_request]}
+        )
+
+    @classmethod
+    async def start(cls) -> None:
+        """Create the shared client"""
+        if cls.client is None:
+            cls.client = cls._create_client()
+            logger.info("Started shared HTTP client")
+
+    @classmethod
+    async def close(cls) -> None:
+        """Close the shared client and its connections"""
+        if cls.client is not None:
+            await cls.client.aclose()
+            cls.client = None
+            logger.info("Closed shared HTTP client")
+
+    @classmethod
+    def get_client(cls) -> httpx.AsyncClient:
+        """Get the shared client, creating it if the app has not started it"""
+        if cls.client is None:
+            cls.client = cls._create_client()
+        return cls.client
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        """Connection pool usage, for sizing HTTP_CLIENT_MAX_CONNECTIONS"""
+        stats = {
+            "started": cls.client is not None,
+            "http2": bool(settings.HTTP_CLIENT_HTTP2 and HTTP2_AVAILABLE),
+            "max_connections": settings.HTTP_CLIENT_MAX_CONNECTIONS,
+            "max_keepalive_connections": settings.HTTP_CLIENT_MAX_KEEPALIVE,
+            "requests_sent": cls.requests_sent,
+            "connections": 0,
+            "idle_connections": 0,
+            "active_connections": 0
+        }
+        # httpcore does not expose pool metrics publicly; read them defensively
+        pool = getattr(getattr(cls.client, "_transport", None), "_pool", None)
+        connections = list(getattr(pool, "connections", []) or [])
+        idle = sum(1 for connection in connections if connection.is_idle())
+        stats.update(
+            connections=len(connections),
+            idle_connections=idle,
+            active_connections=len(connections) - idle
+        )
+        return stats
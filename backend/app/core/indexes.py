@@ -0,0 +1,331 @@
+"""
+Declarative index management.
+
+Every collection's indexes are declared next to its models as a list of
+specs: either a list of (field, direction) tuples or a dict with "keys" and
+create_index options. ensure_indexes() compares the declared specs with
+list_indexes() and only touches what changed:
+
+- missing indexes are built in the background
+- a changed TTL is altered in place with collMod
+- any other change (unique, partial filter, text weights) rebuilds that one
+  index: the new version is built next to the old one, which is only dropped
+  once the build has succeeded
+- a unique index is not built while the collection holds duplicate keys; the
+  duplicates are logged and the existing index is kept
+
+Indexes that exist but are not declared are reported and left alone unless
+prune=True. Run outside app startup with:
+
+    python -m app.core.indexes [--dry-run] [--prune] [--collection NAME ...]
+"""
+import argparse
+import asyncio
+from typing import Any, Dict, List, Optional
+from pymongo.errors import OperationFailure
+from app.auth.models import USER_INDEXES
+from app.auth.revocation import REVOKED_TOKEN_INDEXES
+from app.admission.models import ADMISSION_TOKEN_INDEXES
+from app.events.schemas import EVENT_INDEXES
+from app.payments.models import PAYMENT_INDEXES, PAYMENT_EVENT_INDEXES
+from app.services.outbox_service import OUTBOX_INDEXES
+from app.tickets.schemas import TICKET_INDEXES, TICKET_HOLD_INDEXES, INVENTORY_SHARD_INDEXES
+import logging
+
+logger = logging.getLogger(__name__)
+
+INDEX_SPECS: Dict[str, List[Any]] = {
+    "events": EVENT_INDEXES,
+    "tickets": TICKET_INDEXES,
+    "payments": PAYMENT_INDEXES,
+    "users": USER_INDEXES,
+    "ticket_holds": TICKET_HOLD_INDEXES,
+    "inventory_shards": INVENTORY_SHARD_INDEXES,
+    "payment_events": PAYMENT_EVENT_INDEXES,
+    "admission_tokens": ADMISSION_TOKEN_INDEXES,
+    "revoked_tokens": REVOKED_TOKEN_INDEXES,
+    "outbox": OUTBOX_INDEXES
+}
+
+# Options that define an index; anything else (e.g. background) is build-time only
+_COMPARED_OPTIONS = ("unique", "sparse", "partialFilterExpression", "expireAfterSeconds", "weights")
+
+# Server errors for an index that cannot sit next to an existing one on the
+# same keys (IndexOptionsConflict, IndexKeySpecsConflict), and for duplicate keys
+_INDEX_CONFLICT_CODES = (85, 86)
+_DUPLICATE_KEY_CODE = 11000
+
+# Index options worth carrying over when an old index has to be restored
+_RESTORED_OPTIONS = _COMPARED_OPTIONS + ("default_language", "language_override")
+
+
+def _normalize_value(value: Any) -> Any:
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, dict):
+        return {k: _normalize_value(v) for k, v in value.items()}
+    return value
+
+
+def _spec_parts(spec: Any):
+    """
+    Split a spec into (keys, options)
+    """
+    if isinstance(spec, dict):
+        return list(spec["keys"]), {k: v for k, v in spec.items() if k != "keys"}
+    return list(spec), {}
+
+
+def _index_name(keys: List[tuple], options: Dict[str, Any]) -> str:
+    return options.get("name") or "_".join(f"{field}_{direction}" for field, direction in keys)
+
+
+def _is_text(keys: List[tuple]) -> bool:
+    return any(direction == "text" for _, direction in keys)
+
+
+def _declared_options(keys: List[tuple], options: Dict[str, Any]) -> Dict[str, Any]:
+    declared = {
+        "unique": bool(options.get("unique", False)),
+        "sparse": bool(options.get("sparse", False)),
+        "partialFilterExpression": _normalize_value(options.get("partialFilterExpression")),
+        "expireAfterSeconds": _normalize_value(options.get("expireAfterSeconds")),
+        "weights": None
+    }
+    if _is_text(keys):
+        weights = options.get("weights") or {}
+        declared["weights"] = {
+            field: _normalize_value(weights.get(field, 1))
+            for field, direction in keys if direction == "text"
+        }
+    return declared
+
+
+def _existing_options(info: Dict[str, Any]) -> Dict[str, Any]:
+    partial = info.get("partialFilterExpression")
+    weights = info.get("weights")
+    return {
+        "unique": bool(info.get("unique", False)),
+        "sparse": bool(info.get("sparse", False)),
+        "partialFilterExpression": _normalize_value(dict(partial)) if partial else None,
+        "expireAfterSeconds": _normalize_value(info.get("expireAfterSeconds")),
+        "weights": _normalize_value(dict(weights)) if weights else None
+    }
+
+
+def _existing_keys(info: Dict[str, Any]) -> List[tuple]:
+    return [(field, _normalize_value(direction)) for field, direction in info["key"].items()]
+
+
+def _find_existing(keys: List[tuple], name: str, existing: Dict[str, Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    if name in existing:
+        return existing[name]
+    # Same index created under another name; text indexes are matched by type
+    for info in existing.values():
+        if _is_text(keys):
+            if "_fts" in info["key"]:
+                return info
+        elif _existing_keys(info) == keys:
+            return info
+    return None
+
+
+async def plan_collection(db, collection_name: str, specs: List[Any], prune: bool = False) -> List[Dict[str, Any]]:
+    """
+    Work out the changes needed to bring one collection in line with its specs
+    """
+    existing = {
+        info["name"]: info
+        async for info in db[collection_name].list_indexes()
+        if info["name"] != "_id_"
+    }
+    actions = []
+    matched = set()
+    for spec in specs:
+        keys, options = _spec_parts(spec)
+        name = _index_name(keys, options)
+        info = _find_existing(keys, name, existing)
+        if info is None:
+            actions.append({"action": "create", "collection": collection_name, "name": name,
+                            "keys": keys, "options": options})
+            continue
+        matched.add(info["name"])
+
+        declared = _declared_options(keys, options)
+        current = _existing_options(info)
+        changed = [option for option in _COMPARED_OPTIONS if declared[option] != current[option]]
+        keys_changed = not _is_text(keys) and _existing_keys(info) != keys
+        if not changed and not keys_changed:
+            continue
+        if changed == ["expireAfterSeconds"] and not keys_changed and current["expireAfterSeconds"] is not None \
+                and declared["expireAfterSeconds"] is not None:
+            actions.append({"action": "alter_ttl", "collection": collection_name, "name": info["name"],
+                            "expireAfterSeconds": declared["expireAfterSeconds"]})
+        else:
+            actions.append({"action": "rebuild", "collection": collection_name, "name": info["name"],
+                            "keys": keys, "options": options, "changed": changed, "existing": info})
+
+    for name in existing:
+        if name not in matched:
+            actions.append({"action": "drop" if prune else "unmanaged", "collection": collection_name, "name": name})
+    return actions
+
+
+class DuplicateKeysError(Exception):
+    """Raised when a unique index cannot be built because of duplicate keys"""
+
+
+async def _log_duplicates(collection, keys: List[tuple], options: Dict[str, Any], limit: int = 20) -> int:
+    """
+    Log up to `limit` key values that more than one document shares; returns how many were found
+    """
+    group_id = {field.replace(".", "_"): f"${field}" for field, _ in keys}
+    match = dict(options.get("partialFilterExpression") or {})
+    if options.get("sparse"):
+        match.update({field: {"$exists": True} for field, _ in keys if field not in match})
+    pipeline = [
+        {"$match": match},
+        {"$group": {"_id": group_id, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$limit": limit}
+    ]
+    duplicates = await collection.aggregate(pipeline, allowDiskUse=True).to_list(length=limit)
+    for duplicate in duplicates:
+        logger.error(
+            f"Duplicate key in {collection.name} blocks unique index "
+            f"{_index_name(keys, options)}: {duplicate['_id']} ({duplicate['count']} documents)"
+        )
+    return len(duplicates)
+
+
+async def _create(collection, keys: List[tuple], options: Dict[str, Any]) -> None:
+    try:
+        await collection.create_index(keys, background=True, **options)
+    except OperationFailure as e:
+        if e.code == _DUPLICATE_KEY_CODE and options.get("unique"):
+            await _log_duplicates(collection, keys, options)
+            raise DuplicateKeysError(f"duplicate keys in {collection.name}, see the log") from e
+        raise
+
+
+def _restore_spec(info: Dict[str, Any]):
+    """
+    (keys, options) that recreate an index from its list_indexes() entry
+    """
+    options = {option: info[option] for option in _RESTORED_OPTIONS if option in info}
+    if "_fts" in info["key"]:
+        keys = [(field, "text") for field in info.get("weights", {})]
+        keys += [(field, direction) for field, direction in info["key"].items() if field not in ("_fts", "_ftsx")]
+    else:
+        keys = list(info["key"].items())
+    return keys, dict(options, name=info["name"])
+
+
+async def _rebuild(collection, action: Dict[str, Any]) -> None:
+    """
+    Replace an index without leaving the collection unindexed.
+
+    The new index is built under a temporary name and the old one dropped
+    once it exists. MongoDB refuses some pairs on the same keys (e.g. unique
+    and non-unique, or two text indexes); those are dropped and recreated,
+    and the old index is put back if the new one cannot be built.
+    """
+    keys, options = action["keys"], action["options"]
+    if options.get("unique") and await _log_duplicates(collection, keys, options):
+        raise DuplicateKeysError(f"duplicate keys in {collection.name}, kept index {action['name']}")
+
+    try:
+        await _create(collection, keys, dict(options, name=f"{_index_name(keys, options)}_rebuild"))
+    except OperationFailure as e:
+        if e.code not in _INDEX_CONFLICT_CODES:
+            raise
+    else:
+        await collection.drop_index(action["name"])
+        return
+
+    await collection.drop_index(action["name"])
+    try:
+        await _create(collection, keys, options)
+    except Exception:
+        restore_keys, restore_options = _restore_spec(action["existing"])
+        await collection.create_index(restore_keys, background=True, **restore_options)
+        logger.warning(f"Restored index {collection.name}.{action['name']} after its rebuild failed")
+        raise
+
+
+async def _apply(db, action: Dict[str, Any]) -> None:
+    collection = db[action["collection"]]
+    kind = action["action"]
+    if kind == "alter_ttl":
+        await db.command({
+            "collMod": action["collection"],
+            "index": {"name": action["name"], "expireAfterSeconds": action["expireAfterSeconds"]}
+        })
+    elif kind == "create":
+        await _create(collection, action["keys"], action["options"])
+    elif kind == "rebuild":
+        await _rebuild(collection, action)
+    elif kind == "drop":
+        await collection.drop_index(action["name"])
+
+
+async def ensure_indexes(
+    db,
+    collections: Optional[List[str]] = None,
+    dry_run: bool = False,
+    prune: bool = False
+) -> List[Dict[str, Any]]:
+    """
+    Bring the declared collections' indexes up to date and return the actions taken
+    """
+    actions = []
+    for collection_name, specs in INDEX_SPECS.items():
+        if collections and collection_name not in collections:
+            continue
+        try:
+            planned = await plan_collection(db, collection_name, specs, prune=prune)
+        except Exception as e:
+            logger.error(f"Error reading indexes of {collection_name}: {str(e)}")
+            continue
+        for action in planned:
+            actions.append(action)
+            if action["action"] == "unmanaged":
+                logger.info(f"Index {collection_name}.{action['name']} is not declared; leaving it")
+                continue
+            if dry_run:
+                continue
+            try:
+                await _apply(db, action)
+                logger.info(f"Index {collection_name}.{action['name']}: {action['action']}")
+            except Exception as e:
+                logger.error(f"Error applying {action['action']} to index {collection_name}.{action['name']}: {str(e)}")
+    return actions
+
+
+async def _main(args) -> None:
+    from app.database import Database
+
+    db = await Database.get_db()
+    try:
+        actions = await ensure_indexes(db, collections=args.collection, dry_run=args.dry_run, prune=args.prune)
+    finally:
+        await Database.close_mongo_connection()
+    if not actions:
+        print("Indexes are up to date")
+    for action in actions:
+        detail = ", ".join(action.get("changed", []))
+        print(f"{action['action']:<10} {action['collection']}.{action['name']}" + (f" ({detail})" if detail else ""))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create or update MongoDB indexes")
+    parser.add_argument("--dry-run", action="store_true", help="show the changes without applying them")
+    parser.add_argument("--prune", action="store_true", help="drop indexes that are not declared")
+    parser.add_argument("--collection", action="append", help="limit to a collection (repeatable)")
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,189 @@
+import base64
+import json
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from bson import ObjectId, json_util
+from app.core.config import settings
+
+TOTAL_EXACT = "exact"
+TOTAL_CACHED = "cached"
+TOTAL_ESTIMATED = "estimated"
+
+# Per-process cache of list totals: key -> (expires_at, total)
+_total_cache: Dict[str, Tuple[float, int]] = {}
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+
+def encode_cursor(document: dict, sort_field: str) -> str:
+    """
+    Build an opaque cursor pointing just after the given document
+    """
+    value = document.get(sort_field)
+    if isinstance(value, datetime):
+        value = {"$date": value.isoformat()}
+    payload = {"v": value, "id": str(document["_id"])}
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, ObjectId]:
+    """
+    Decode a cursor produced by encode_cursor into (sort value, _id)
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        value = payload["v"]
+        if isinstance(value, dict) and "$date" in value:
+            value = datetime.fromisoformat(value["$date"])
+        return value, ObjectId(payload["id"])
+    except Exception as e:
+        raise InvalidCursor(f"Invalid cursor: {str(e)}")
+
+
+def keyset_filter(sort_field: str, value: Any, last_id: ObjectId) -> Dict[str, Any]:
+    """
+    Filter matching documents that sort strictly after (value, last_id)
+    in ascending (sort_field, _id) order
+    """
+    return {
+        "$or": [
+            {sort_field: {"$gt": value}},
+            {sort_field: value, "_id": {"$gt": last_id}}
+        ]
+    }
+
+
+def apply_cursor(query: Dict[str, Any], sort_field: str, cursor: Optional[str]) -> Dict[str, Any]:
+    """
+    Combine a list query with the keyset condition for the given cursor
+    """
+    if not cursor:
+        return query
+    value, last_id = decode_cursor(cursor)
+    condition = keyset_filter(sort_field, value, last_id)
+    if not query:
+        return condition
+    return {"$and": [query, condition]}
+
+
+async def find_keyset_page(
+    collection,
+    query: Dict[str, Any],
+    sort_field: str,
+    size: int,
+    cursor: Optional[str] = None,
+    projection: Optional[Dict[str, Any]] = None
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    Fetch one page in (sort_field, _id) order starting after cursor.
+
+    Returns the documents and the cursor for the next page (None on the last page).
+    A projection always keeps sort_field, which the next cursor is built from.
+    """
+    page_query = apply_cursor(query, sort_field, cursor)
+    if projection is not None:
+        projection = {**projection, sort_field: 1}
+    documents = await collection.find(page_query, projection).sort(
+        [(sort_field, 1), ("_id", 1)]
+    ).limit(size + 1).to_list(length=size + 1)
+
+    next_cursor = None
+    if len(documents) > size:
+        documents = documents[:size]
+        next_cursor = encode_cursor(documents[-1], sort_field)
+    return documents, next_cursor
+
+
+def _total_cache_key(collection, query: Dict[str, Any]) -> str:
+    return f"{collection.full_name}:{json_util.dumps(query, sort_keys=True)}"
+
+
+def _cache_total(key: str, total: int) -> None:
+    if len(_total_cache) >= settings.LIST_TOTAL_CACHE_MAX_SIZE:
+        # Drop the entry closest to expiry to stay bounded
+        oldest = min(_total_cache, key=lambda k: _total_cache[k][0])
+        _total_cache.pop(oldest, None)
+    _total_cache[key] = (time.monotonic() + settings.LIST_TOTAL_CACHE_SECONDS, total)
+
+
+def _cached_total(key: str) -> Optional[int]:
+    entry = _total_cache.get(key)
+    if entry is None:
+        return None
+    expires_at, total = entry
+    if expires_at < time.monotonic():
+        _total_cache.pop(key, None)
+        return None
+    return total
+
+
+async def count_total(collection, query: Dict[str, Any], total_mode: str = TOTAL_EXACT) -> int:
+    """
+    Count documents matching query.
+
+    "estimated" uses collection metadata when the query is unfiltered,
+    "cached" reuses a recent count for the same query, "exact" always counts.
+    """
+    if total_mode == TOTAL_ESTIMATED and not query:
+        return await collection.estimated_document_count()
+    if total_mode in (TOTAL_CACHED, TOTAL_ESTIMATED):
+        key = _total_cache_key(collection, query)
+        total = _cached_total(key)
+        if total is None:
+            total = await collection.count_documents(query)
+            _cache_total(key, total)
+        return total
+    return await collection.count_documents(query)
+
+
+async def find_page(
+    collection,
+    query: Dict[str, Any],
+    skip: int = 0,
+    limit: int = 10,
+    sort: Optional[List[Tuple[str, int]]] = None,
+    total_mode: str = TOTAL_EXACT,
+    projection: Optional[Dict[str, Any]] = None
+) -> Tuple[List[dict], int]:
+    """
+    Fetch one page of documents together with the total match count.
+
+    In "exact" mode (or on a cache miss) the count and the page are computed by
+    a single $facet aggregation, so the filter is evaluated in one round-trip.
+    When a cached or estimated total is available only the page is fetched.
+    """
+    if total_mode == TOTAL_ESTIMATED and not query:
+        total = await collection.estimated_document_count()
+    elif total_mode in (TOTAL_CACHED, TOTAL_ESTIMATED):
+        total = _cached_total(_total_cache_key(collection, query))
+    else:
+        total = None
+
+    if total is not None:
+        cursor = collection.find(query, projection)
+        if sort:
+            cursor = cursor.sort(sort)
+        documents = await cursor.skip(skip).limit(limit).to_list(length=limit)
+        return documents, total
+
+    items: List[Dict[str, Any]] = [{"$skip": skip}, {"$limit": limit}]
+    if projection is not None:
+        items.append({"$project": projection})
+    # Stages inside $facet cannot use an index, so the sort goes before it,
+    # where $match + $sort can be answered from the sort index
+    pipeline: List[Dict[str, Any]] = [{"$match": query}]
+    if sort:
+        pipeline.append({"$sort": dict(sort)})
+    pipeline.append({"$facet": {"items": items, "total": [{"$count": "count"}]}})
+    result = await collection.aggregate(pipeline).to_list(length=1)
+    facet = result[0] if result else {"items": [], "total": []}
+    total = facet["total"][0]["count"] if facet["total"] else 0
+
+    if total_mode != TOTAL_EXACT:
+        _cache_total(_total_cache_key(collection, query), total)
+    return facet["items"], total
@@ -0,0 +1,26 @@
+from typing import Optional
+from app.core.config import settings
+
+
+def normalize_phone(number: Optional[str]) -> Optional[str]:
+    """
+    Convert a phone number to E.164 (+<country code><number>).
+
+    Numbers without a leading + are assumed to be local to
+    DEFAULT_PHONE_COUNTRY_CODE; a leading trunk 0 is dropped. Empty values
+    become None. Raises ValueError when there are no digits to work with.
+    """
+    if number is None or not number.strip():
+        return None
+    number = number.strip()
+    digits = "".join(filter(str.isdigit, number))
+    if len(digits) < 7:
+        raise ValueError("Invalid phone number")
+    if number.startswith("+"):
+        return "+" + digits
+    if digits.startswith("00"):
+        return "+" + digits[2:]
+    country_code = settings.DEFAULT_PHONE_COUNTRY_CODE
+    if not digits.startswith(country_code):
+        digits = country_code + digits.lstrip("0")
+    return "+" + digits
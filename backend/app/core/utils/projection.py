@@ -0,0 +1,40 @@
+from typing import Dict, Iterable, Optional
+
+# fields= value that returns whole documents
+ALL_FIELDS = "all"
+
+
+class InvalidFields(ValueError):
+    """Raised when a fields= parameter names a field that cannot be selected"""
+
+
+def build_projection(
+    fields: Optional[str],
+    allowed: Iterable[str],
+    summary: Iterable[str]
+) -> Optional[Dict[str, int]]:
+    """
+    Turn a comma-separated fields= value into a Mongo projection.
+
+    No value selects the summary fields, "all" returns whole documents (None),
+    anything else must be a list of allowed field names. "id" maps to _id,
+    which Mongo always returns.
+    """
+    if fields is None:
+        selected = list(summary)
+    elif fields.strip() == ALL_FIELDS:
+        return None
+    else:
+        selected = [field.strip() for field in fields.split(",") if field.strip()]
+        allowed = set(allowed)
+        unknown = [field for field in selected if field != "id" and field not in allowed]
+        if unknown:
+            raise InvalidFields(f"Unknown fields: {', '.join(unknown)}")
+    selected = set(selected) - {"id"}
+    # Mongo rejects a path together with one of its sub-paths
+    projection = {
+        field: 1 for field in selected
+        if not any(field.startswith(f"{parent}.") for parent in selected)
+    }
+    # An empty projection would return whole documents
+    return projection or {"_id": 1}
@@ -1,12 +1,13 @@
 from pydantic import BaseModel, Field, EmailStr
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 from enum import Enum
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
+from app.core.utils.pagination import find_page
 from .schemas import (
     EventCreate, EventUpdate, EventInDB, Event,
-    EventCategory, TicketType, EVENT_INDEXES
+    EventCategory, TicketType
 )
 
 class EventCategory(str, Enum):
@@ -71,6 +72,13 @@ class EventInDB(EventBase):
     updated_at: datetime
     total_tickets_sold: int = 0
     total_revenue: float = 0.0
+    # Variant name (thumb, card, hero) -> URL, once the worker has built them
+    image_variants: Optional[Dict[str, str]] = None
+    # Maintained from ticket_types by refresh_event_summary
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    remaining_total: Optional[int] = None
+    sold_out: Optional[bool] = None
 
     class Config:
         json_encoders = {
@@ -123,29 +131,129 @@ class EventSearch(BaseModel):
     location: Optional[str] = None
     is_published: Optional[bool] = True
 
+class TicketTypeSummary(BaseModel):
+    name: Optional[str] = None
+    price: Optional[float] = None
+    quantity: Optional[int] = None
+    description: Optional[str] = None
+    is_available: Optional[bool] = None
+
+class ImageVariants(BaseModel):
+    thumb: Optional[str] = None
+    card: Optional[str] = None
+    hero: Optional[str] = None
+
+class EventSummary(BaseModel):
+    """Event as returned by list endpoints; only the projected fields are set"""
+    id: str
+    title: Optional[str] = None
+    description: Optional[str] = None
+    category: Optional[EventCategory] = None
+    venue: Optional[str] = None
+    location: Optional[str] = None
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    image_url: Optional[str] = None
+    image_variants: Optional[ImageVariants] = None
+    organizer_name: Optional[str] = None
+    organizer_email: Optional[str] = None
+    organizer_phone: Optional[str] = None
+    ticket_types: Optional[List[TicketTypeSummary]] = None
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    remaining_total: Optional[int] = None
+    sold_out: Optional[bool] = None
+    is_published: Optional[bool] = None
+    max_attendees: Optional[int] = None
+    featured: Optional[bool] = None
+    total_tickets_sold: Optional[int] = None
+    total_revenue: Optional[float] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+# Default fields of event list items; cards use the card-sized image variant
+EVENT_SUMMARY_FIELDS = [
+    "title", "category", "venue", "location", "start_date", "end_date", "image_url", "image_variants.card",
+    "featured", "is_published", "min_price", "max_price", "sold_out",
+    "ticket_types.name", "ticket_types.price", "ticket_types.is_available"
+]
+
+# Fields that can be requested with ?fields=
+EVENT_LIST_FIELDS = [
+    field for field in EventSummary.model_fields if field != "id"
+] + [f"ticket_types.{field}" for field in TicketTypeSummary.model_fields] \
+  + [f"image_variants.{field}" for field in ImageVariants.model_fields]
+
 class EventResponse(BaseModel):
-    events: List[Event]
+    events: List[EventSummary]
     total: int
     page: int
     size: int
+    next_cursor: Optional[str] = None
+
+class DirectUploadParams(BaseModel):
+    """Form fields for a browser upload to Cloudinary, plus where to send it"""
+    upload_url: str
+    api_key: str
+    cloud_name: str
+    folder: str
+    public_id: str
+    timestamp: int
+    signature: str
+    expires_at: int
+
+class DirectUploadResult(BaseModel):
+    """Fields of Cloudinary's upload response, reported back to attach the image"""
+    public_id: str
+    version: int
+    signature: str
+    secure_url: str
+
+# Recomputes the denormalized price bounds and stock summary from ticket_types.
+# remaining_total only counts ticket types that are on sale.
+EVENT_SUMMARY_PIPELINE = [
+    {
+        "$set": {
+            "min_price": {"$min": "$ticket_types.price"},
+            "max_price": {"$max": "$ticket_types.price"},
+            "remaining_total": {
+                "$sum": {
+                    "$map": {
+                        "input": {
+                            "$filter": {
+                                "input": {"$ifNull": ["$ticket_types", []]},
+                                "cond": {"$ne": ["$$this.is_available", False]}
+                            }
+                        },
+                        "in": {"$max": ["$$this.quantity", 0]}
+                    }
+                }
+            }
+        }
+    },
+    {"$set": {"sold_out": {"$lte": ["$remaining_total", 0]}}}
+]
+
+async def refresh_event_summary(db, event_id) -> None:
+    """
+    Bring min_price, max_price, remaining_total and sold_out in line with ticket_types
+    """
+    await db.events.update_one({"_id": event_id}, EVENT_SUMMARY_PIPELINE)
+
+def price_filter(min_price: Optional[float], max_price: Optional[float]) -> dict:
+    """
+    Events with a ticket type priced within [min_price, max_price]
+    """
+    query = {}
+    if min_price is not None:
+        query["max_price"] = {"$gte": min_price}
+    if max_price is not None:
+        query["min_price"] = {"$lte": max_price}
+    return query
 
 class EventModel:
     def __init__(self, db: AsyncIOMotorDatabase):
         self.collection = db.events
-        self._ensure_indexes()
-
-    async def _ensure_indexes(self):
-        """Create necessary indexes for the events collection"""
-        for index in EVENT_INDEXES:
-            if isinstance(index, dict):
-                # Text index
-                await self.collection.create_index(
-                    index["keys"],
-                    weights=index["weights"]
-                )
-            else:
-                # Regular index
-                await self.collection.create_index(index)
 
     async def create(self, event: EventCreate) -> EventInDB:
         """Create a new event"""
@@ -155,6 +263,7 @@ class EventModel:
         event_dict["total_revenue"] = 0.0
         
         result = await self.collection.insert_one(event_dict)
+        await self.collection.update_one({"_id": result.inserted_id}, EVENT_SUMMARY_PIPELINE)
         event_dict["id"] = str(result.inserted_id)
         
         return EventInDB(**event_dict)
@@ -180,6 +289,7 @@ class EventModel:
         max_price: Optional[float] = None,
         location: Optional[str] = None,
         is_published: Optional[bool] = True,
+        available: Optional[bool] = None,
         page: int = 1,
         size: int = 10
     ) -> tuple[List[EventInDB], int]:
@@ -202,22 +312,17 @@ class EventModel:
         if location:
             filter_query["location"] = {"$regex": location, "$options": "i"}
         
-        if min_price is not None or max_price is not None:
-            filter_query["ticket_types.price"] = {}
-            if min_price is not None:
-                filter_query["ticket_types.price"]["$gte"] = min_price
-            if max_price is not None:
-                filter_query["ticket_types.price"]["$lte"] = max_price
-
-        # Get total count
-        total = await self.collection.count_documents(filter_query)
-        
-        # Get paginated results
+        filter_query.update(price_filter(min_price, max_price))
+
+        if available is not None:
+            filter_query["sold_out"] = not available
+
+        # Get paginated results with the total in one round-trip
         skip = (page - 1) * size
-        cursor = self.collection.find(filter_query).skip(skip).limit(size)
+        documents, total = await find_page(self.collection, filter_query, skip, size)
         events = []
         
-        async for event in cursor:
+        for event in documents:
             event["id"] = str(event.pop("_id"))
             events.append(EventInDB(**event))
         
@@ -236,6 +341,12 @@ class EventModel:
             {"$set": update_data},
             return_document=True
         )
+        if result and "ticket_types" in update_data:
+            result = await self.collection.find_one_and_update(
+                {"_id": result["_id"]},
+                EVENT_SUMMARY_PIPELINE,
+                return_document=True
+            )
         
         if result:
             result["id"] = str(result.pop("_id"))
@@ -274,6 +385,8 @@ class EventModel:
                     }
                 }
             )
+            if result.modified_count:
+                await self.collection.update_one({"_id": ObjectId(event_id)}, EVENT_SUMMARY_PIPELINE)
             return result.modified_count > 0
         except:
             return False
@@ -2,91 +2,93 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File, Form
 from typing import List, Optional
 from datetime import datetime
-import cloudinary
-import cloudinary.uploader
 from app.core.config import settings
 from app.database import Database, get_database
 from app.auth.utils import get_current_active_user, get_current_admin_user
 from app.auth.models import UserModel
-from .models import Event, EventCreate, EventUpdate, EventCategory, EventResponse, EVENT_INDEXES
+from .models import (
+    Event, EventCreate, EventUpdate, EventCategory, EventResponse, EventSummary,
+    DirectUploadParams, DirectUploadResult, EVENT_SUMMARY_FIELDS, EVENT_LIST_FIELDS,
+    refresh_event_summary, price_filter
+)
 from app.tickets.models import TicketModel
+from app.services.inventory_service import InventoryService
+from app.services.upload_service import upload_service
+from app.services.image_service import image_service
+from app.services.outbox_service import OutboxService, JOB_IMAGE_VARIANTS
+from app.core.utils.pagination import (
+    find_keyset_page, find_page, count_total, InvalidCursor, TOTAL_CACHED
+)
+from app.core.utils.projection import build_projection, InvalidFields
 from bson import ObjectId
+from pymongo import ReturnDocument
+import hashlib
 import logging
 import json
 from pydantic import BaseModel
 
 router = APIRouter(prefix="/events", tags=["events"])
 logger = logging.getLogger(__name__)
+inventory_service = InventoryService()
+outbox_service = OutboxService()
 
-# Configure Cloudinary
-cloudinary.config(
-    cloud_name=settings.CLOUDINARY_CLOUD_NAME,
-    api_key=settings.CLOUDINARY_API_KEY,
-    api_secret=settings.CLOUDINARY_API_SECRET
-)
+EVENT_IMAGE_FOLDER = "event_images"
 
-# Create indexes when the application starts
-@router.on_event("startup")
-async def create_indexes():
-    try:
-        db = await get_database()
-        collection = db.events
-        
-        # Get list of existing indexes
-        existing_indexes = await collection.list_indexes().to_list(length=None)
-        existing_index_names = [index["name"] for index in existing_indexes]
-        
-        # Drop existing text index if it exists
-        text_index_name = "title_text_description_text_venue_text_location_text"
-        if text_index_name in existing_index_names:
-            try:
-                await collection.drop_index(text_index_name)
-                logger.info(f"Dropped existing text index: {text_index_name}")
-            except Exception as e:
-                logger.error(f"Error dropping text index: {str(e)}")
-        
-        # Create new indexes
-        for index in EVENT_INDEXES:
-            try:
-                if isinstance(index, dict) and "keys" in index:
-                    # This is the text index
-                    await collection.create_index(
-                        index["keys"],
-                        weights=index.get("weights", {}),
-                        name=text_index_name
-                    )
-                    logger.info(f"Created text index: {text_index_name}")
-                else:
-                    # These are regular indexes
-                    index_name = "_".join([f"{field}_{direction}" for field, direction in index])
-                    if index_name not in existing_index_names:
-                        await collection.create_index(index)
-                        logger.info(f"Created index: {index_name}")
-            except Exception as e:
-                logger.error(f"Error creating index {index}: {str(e)}")
-    except Exception as e:
-        logger.error(f"Error in create_indexes: {str(e)}")
-        raise
+async def upload_image_to_cloudinary(db, file: UploadFile) -> dict:
+    """
+    Upload an event image and return its image_assets record; a file uploaded before is not sent again
+    """
+    # Reject empty and oversized files before reading them to hash
+    upload_service.check_size(file)
+    digest = await image_service.hash_file(file.file)
+    asset = await image_service.find_asset(db, digest)
+    if asset:
+        logger.info(f"Reusing stored image {digest[:12]}")
+        return asset
+    result = await upload_service.upload_image(file, folder=EVENT_IMAGE_FOLDER)
+    return await image_service.record_asset(db, digest, result)
 
-async def upload_image_to_cloudinary(file: UploadFile) -> str:
+def _image_fields(asset: dict) -> dict:
+    return {
+        "image_url": asset["url"],
+        "image_asset_id": asset["_id"],
+        "image_variants": asset.get("variants")
+    }
+
+async def _queue_image_variants(db, event_id, image_url: str, asset_id: Optional[str] = None) -> None:
+    """
+    Have the worker build thumb/card/hero variants for an event's new image
+    """
+    payload = {"event_id": str(event_id), "image_url": image_url}
+    if asset_id:
+        payload["asset_id"] = asset_id
+    await outbox_service.enqueue(
+        db,
+        JOB_IMAGE_VARIANTS,
+        payload,
+        dedupe_key=f"{JOB_IMAGE_VARIANTS}:{event_id}:{hashlib.sha256(image_url.encode()).hexdigest()[:16]}"
+    )
+
+async def _get_editable_event(db, event_id: str, current_user: UserModel) -> dict:
     try:
-        # Read the file content
-        contents = await file.read()
-        
-        # Upload to Cloudinary
-        result = cloudinary.uploader.upload(
-            contents,
-            folder="event_images",
-            resource_type="auto"
+        event_id = ObjectId(event_id)
+    except:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid event ID format"
         )
-        
-        return result["secure_url"]
-    except Exception as e:
-        logger.error(f"Error uploading image to Cloudinary: {str(e)}")
+    event = await db.events.find_one({"_id": event_id})
+    if not event:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to upload image"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Event not found"
+        )
+    if str(event["organizer_id"]) != str(current_user.id) and not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to update this event"
         )
+    return event
 
 @router.post("/", response_model=Event)
 async def create_event(
@@ -119,9 +121,9 @@ async def create_event(
         )
     
     # Upload image if provided
-    image_url = None
+    image_fields = {"image_url": None}
     if image:
-        image_url = await upload_image_to_cloudinary(image)
+        image_fields = _image_fields(await upload_image_to_cloudinary(db, image))
     
     try:
         # Parse ticket_types from JSON string
@@ -157,16 +159,19 @@ async def create_event(
         "featured": featured_bool,  # Use the converted boolean value
         "total_tickets_sold": 0,
         "total_revenue": 0.0,
-        "image_url": image_url
+        **image_fields
     }
     
     # Insert event into database
     result = await db.events.insert_one(event_dict)
+    await refresh_event_summary(db, result.inserted_id)
     event_dict["id"] = str(result.inserted_id)
+    if event_dict["image_url"] and not event_dict.get("image_variants"):
+        await _queue_image_variants(db, result.inserted_id, event_dict["image_url"], event_dict["image_asset_id"])
     
     return Event(**event_dict)
 
-@router.get("/", response_model=EventResponse)
+@router.get("/", response_model=EventResponse, response_model_exclude_unset=True)
 async def get_events(
     db: Database = Depends(get_database),
     category: Optional[EventCategory] = None,
@@ -174,12 +179,15 @@ async def get_events(
     end_date: Optional[datetime] = None,
     min_price: Optional[float] = None,
     max_price: Optional[float] = None,
+    available: Optional[bool] = Query(None, description="true: only events with tickets left; false: only sold-out events"),
     search: Optional[str] = None,
     page: int = Query(1, ge=1),
-    size: int = Query(10, ge=1, le=100)
+    size: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Keyset pagination: pass an empty cursor for the first page, then next_cursor; page is ignored"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, or 'all'; defaults to a summary")
 ):
     try:
-        logger.info(f"Fetching events with page={page}, size={size}")
+        logger.info(f"Fetching events with page={page}, size={size}, cursor={cursor}")
         
         # Build query
         query = {}
@@ -189,24 +197,29 @@ async def get_events(
             query["start_date"] = {"$gte": start_date}
         if end_date:
             query["end_date"] = {"$lte": end_date}
-        if min_price is not None or max_price is not None:
-            query["ticket_types.price"] = {}
-            if min_price is not None:
-                query["ticket_types.price"]["$gte"] = min_price
-            if max_price is not None:
-                query["ticket_types.price"]["$lte"] = max_price
+        # Denormalized bounds kept by refresh_event_summary, so these are index range scans
+        query.update(price_filter(min_price, max_price))
+        if available is not None:
+            query["sold_out"] = not available
         if search:
             query["$text"] = {"$search": search}
 
-        # Get total count
-        total = await db.events.count_documents(query)
-        logger.info(f"Total events found: {total}")
+        # Summary fields unless the caller asked for others
+        projection = build_projection(fields, EVENT_LIST_FIELDS, EVENT_SUMMARY_FIELDS)
 
-        # Get paginated results
-        skip = (page - 1) * size
-        cursor = db.events.find(query).skip(skip).limit(size)
+        # Get paginated results with the total, keyset on (start_date, _id) when a cursor is given
+        next_cursor = None
+        if cursor is not None:
+            documents, next_cursor = await find_keyset_page(
+                db.events, query, "start_date", size, cursor or None, projection=projection
+            )
+            total = await count_total(db.events, query, TOTAL_CACHED)
+        else:
+            skip = (page - 1) * size
+            documents, total = await find_page(db.events, query, skip, size, projection=projection)
+        logger.info(f"Total events found: {total}")
         events = []
-        async for event in cursor:
+        for event in documents:
             try:
                 # Convert MongoDB document to Event instance
                 event_dict = dict(event)
@@ -221,7 +234,7 @@ async def get_events(
                     for ticket_type in event_dict['ticket_types']:
                         if '_id' in ticket_type:
                             ticket_type['id'] = str(ticket_type.pop('_id'))
-                events.append(Event(**event_dict))
+                events.append(EventSummary(**event_dict))
             except Exception as e:
                 logger.error(f"Error converting event document: {str(e)}")
                 continue
@@ -240,7 +253,18 @@ async def get_events(
             events=events,
             total=total,
             page=page,
-            size=size
+            size=size,
+            next_cursor=next_cursor
+        )
+    except InvalidCursor:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        )
+    except InvalidFields as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
         )
     except Exception as e:
         logger.error(f"Error fetching events: {str(e)}")
@@ -249,30 +273,39 @@ async def get_events(
             detail="Failed to fetch events"
         )
 
-@router.get("/featured", response_model=EventResponse)
+@router.get("/featured", response_model=EventResponse, response_model_exclude_unset=True)
 async def get_featured_events(
     db: Database = Depends(get_database),
     page: int = Query(1, ge=1),
-    size: int = Query(8, ge=1, le=100)
+    size: int = Query(8, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="Keyset pagination: pass an empty cursor for the first page, then next_cursor; page is ignored"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, or 'all'; defaults to a summary")
 ):
     """
     Get featured events
     """
     try:
-        logger.info(f"Fetching featured events with page={page}, size={size}")
+        logger.info(f"Fetching featured events with page={page}, size={size}, cursor={cursor}")
         
         # Build query for featured events - only check featured status
         query = {"featured": True}
         
-        # Get total count
-        total = await db.events.count_documents(query)
+        # Summary fields unless the caller asked for others
+        projection = build_projection(fields, EVENT_LIST_FIELDS, EVENT_SUMMARY_FIELDS)
+
+        # Get paginated results with the total, keyset on (start_date, _id) when a cursor is given
+        next_cursor = None
+        if cursor is not None:
+            documents, next_cursor = await find_keyset_page(
+                db.events, query, "start_date", size, cursor or None, projection=projection
+            )
+            total = await count_total(db.events, query, TOTAL_CACHED)
+        else:
+            skip = (page - 1) * size
+            documents, total = await find_page(db.events, query, skip, size, projection=projection)
         logger.info(f"Total featured events: {total}")
-        
-        # Get paginated results
-        skip = (page - 1) * size
-        cursor = db.events.find(query).skip(skip).limit(size)
         events = []
-        async for event in cursor:
+        for event in documents:
             try:
                 # Convert MongoDB document to Event instance
                 event_dict = dict(event)
@@ -288,9 +321,9 @@ async def get_featured_events(
                         if '_id' in ticket_type:
                             ticket_type['id'] = str(ticket_type.pop('_id'))
                 # Ensure image_url is present
-                if 'image_url' not in event_dict:
+                if 'image_url' not in event_dict and (projection is None or 'image_url' in projection):
                     event_dict['image_url'] = 'https://via.placeholder.com/300x200?text=Event+Image'
-                events.append(Event(**event_dict))
+                events.append(EventSummary(**event_dict))
             except Exception as e:
                 logger.error(f"Error converting event document: {str(e)}")
                 continue
@@ -309,7 +342,18 @@ async def get_featured_events(
             events=events,
             total=total,
             page=page,
-            size=size
+            size=size,
+            next_cursor=next_cursor
+        )
+    except InvalidCursor:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        )
+    except InvalidFields as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
         )
     except Exception as e:
         logger.error(f"Error fetching featured events: {str(e)}")
@@ -382,14 +426,24 @@ async def update_event(
             detail="Not authorized to update this event"
         )
     
+    # Sharded stock lives in the counter documents, not in ticket_types
+    if event.get("inventory_shards") and event_update.ticket_types is not None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Ticket types cannot be changed while inventory is sharded; use the availability endpoint to stop sales"
+        )
+    
     # Upload new image if provided
     image_url = event.get("image_url")
+    image_fields = {}
     if image:
-        image_url = await upload_image_to_cloudinary(image)
+        image_fields = _image_fields(await upload_image_to_cloudinary(db, image))
+        image_url = image_fields["image_url"]
     
     # Update event
     update_data = event_update.model_dump(exclude_unset=True)
     update_data["updated_at"] = datetime.utcnow()
+    update_data.update(image_fields)
     if image_url:
         update_data["image_url"] = image_url
     
@@ -397,6 +451,10 @@ async def update_event(
         {"_id": event_id},
         {"$set": update_data}
     )
+    if "ticket_types" in update_data:
+        await refresh_event_summary(db, event_id)
+    if image_fields and not image_fields["image_variants"]:
+        await _queue_image_variants(db, event_id, image_url, image_fields["image_asset_id"])
     
     # Get updated event
     updated_event = await db.events.find_one({"_id": event_id})
@@ -487,3 +545,104 @@ async def update_event_featured_status(
     if '_id' in event_dict:
         event_dict['id'] = str(event_dict.pop('_id'))
     return Event(**event_dict)
+
+
+
+@router.post("/{event_id}/image/upload-params", response_model=DirectUploadParams)
+async def get_image_upload_params(
+    event_id: str,
+    current_user: UserModel = Depends(get_current_active_user)
+) -> DirectUploadParams:
+    """
+    Signed parameters for uploading an event image straight to Cloudinary
+    """
+    db = await Database.get_db()
+    event = await _get_editable_event(db, event_id, current_user)
+    return DirectUploadParams(
+        **upload_service.direct_upload_params(EVENT_IMAGE_FOLDER, prefix=f"event_{event['_id']}")
+    )
+
+@router.post("/{event_id}/image", response_model=Event)
+async def attach_uploaded_image(
+    event_id: str,
+    upload: DirectUploadResult,
+    current_user: UserModel = Depends(get_current_active_user)
+) -> Event:
+    """
+    Set an event's image from a direct Cloudinary upload, after checking Cloudinary's signature
+    """
+    db = await Database.get_db()
+    event = await _get_editable_event(db, event_id, current_user)
+    ok, reason = upload_service.verify_direct_upload(
+        upload.public_id,
+        upload.version,
+        upload.signature,
+        upload.secure_url,
+        folder=EVENT_IMAGE_FOLDER,
+        prefix=f"event_{event['_id']}"
+    )
+    if not ok:
+        logger.warning(f"Rejected direct upload for event {event['_id']}: {reason}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=reason
+        )
+
+    updated_event = await db.events.find_one_and_update(
+        {"_id": event["_id"]},
+        {
+            "$set": {"image_url": upload.secure_url, "updated_at": datetime.utcnow()},
+            "$unset": {"image_variants": "", "image_asset_id": ""}
+        },
+        return_document=ReturnDocument.AFTER
+    )
+    # The bytes went straight to Cloudinary; the worker fetches them to build variants
+    await _queue_image_variants(db, event["_id"], upload.secure_url)
+    event_dict = dict(updated_event)
+    event_dict['id'] = str(event_dict.pop('_id'))
+    return Event(**event_dict)
+
+@router.post("/{event_id}/inventory/shards")
+async def shard_event_inventory(
+    event_id: str,
+    shards: int = Query(..., ge=2),
+    db: Database = Depends(get_database),
+    current_user: UserModel = Depends(get_current_admin_user)
+):
+    """
+    Split ticket stock across counter documents for high-demand on-sales (admin only)
+    """
+    try:
+        event_id = ObjectId(event_id)
+    except:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid event ID format"
+        )
+    
+    if shards > settings.INVENTORY_MAX_SHARDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.INVENTORY_MAX_SHARDS} shards are allowed"
+        )
+    
+    return await inventory_service.enable_sharding(db, event_id, shards)
+
+@router.put("/{event_id}/ticket-types/{ticket_type_name}/availability")
+async def set_ticket_type_availability(
+    event_id: str,
+    ticket_type_name: str,
+    is_available: bool,
+    db: Database = Depends(get_database),
+    current_user: UserModel = Depends(get_current_active_user)
+):
+    """
+    Open or close sales of one ticket type; also applies to sharded inventory
+    """
+    event = await _get_editable_event(db, event_id, current_user)
+    if not await inventory_service.set_availability(db, event["_id"], ticket_type_name, is_available):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Ticket type not found"
+        )
+    return {"event_id": str(event["_id"]), "ticket_type_name": ticket_type_name, "is_available": is_available}
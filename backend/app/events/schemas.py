@@ -90,6 +90,7 @@ class EventResponse(BaseModel):
     total: int
     page: int
     size: int
+    next_cursor: Optional[str] = None
 
 # Database indexes
 EVENT_INDEXES = [
@@ -99,8 +100,24 @@ EVENT_INDEXES = [
     },
     [("category", 1)],
     [("start_date", 1)],
+    [("start_date", 1), ("_id", 1)],
+    # Only featured events are indexed; serves /events/featured
+    {
+        "keys": [("featured", 1), ("start_date", 1), ("_id", 1)],
+        "partialFilterExpression": {"featured": True}
+    },
     [("end_date", 1)],
     [("location", 1)],
     [("is_published", 1)],
-    [("created_at", -1)]
+    [("created_at", -1)],
+    # Price range filters: max_price >= min and min_price <= max
+    [("min_price", 1), ("max_price", 1)],
+    [("sold_out", 1), ("min_price", 1), ("max_price", 1)],
+    # Events with tickets left, in listing order
+    [("sold_out", 1), ("start_date", 1), ("_id", 1)],
+    # Only sharded events are indexed; serves the shard reconciler
+    {
+        "keys": [("inventory_shards", 1)],
+        "partialFilterExpression": {"inventory_shards": {"$gt": 0}}
+    }
 ] 
\ No newline at end of file
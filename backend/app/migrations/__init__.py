@@ -0,0 +1,3 @@
+"""
+Data migrations, each runnable with `python -m app.migrations.<name>`
+"""
@@ -0,0 +1,76 @@
+"""
+Fill in the denormalized min_price, max_price, remaining_total and sold_out
+fields on events created before they were maintained.
+
+Events are recomputed from their ticket_types in batches ordered by _id, so
+the migration can be stopped and re-run safely; --all recomputes every event
+rather than only those missing the fields:
+
+    python -m app.migrations.backfill_event_summary [--batch-size 500] [--all] [--dry-run]
+"""
+import argparse
+import asyncio
+from app.database import Database
+from app.events.models import EVENT_SUMMARY_PIPELINE
+import logging
+
+logger = logging.getLogger(__name__)
+
+MISSING_SUMMARY_QUERY = {"sold_out": {"$exists": False}}
+
+
+async def backfill_event_summary(
+    db,
+    batch_size: int = 500,
+    recompute_all: bool = False,
+    dry_run: bool = False
+) -> int:
+    """
+    Recompute the summary fields; returns how many events were (or would be) updated
+    """
+    base_query = {} if recompute_all else MISSING_SUMMARY_QUERY
+    updated = 0
+    last_id = None
+    while True:
+        query = dict(base_query)
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = await db.events.find(
+            query,
+            projection={"_id": 1}
+        ).sort("_id", 1).limit(batch_size).to_list(length=batch_size)
+        if not batch:
+            break
+        ids = [event["_id"] for event in batch]
+        last_id = ids[-1]
+
+        if not dry_run:
+            result = await db.events.update_many({"_id": {"$in": ids}}, EVENT_SUMMARY_PIPELINE)
+            updated += result.modified_count
+        else:
+            updated += len(ids)
+        logger.info(f"Processed {updated} events (last _id {last_id})")
+    return updated
+
+
+async def _main(args) -> None:
+    db = await Database.get_db()
+    try:
+        updated = await backfill_event_summary(
+            db, batch_size=args.batch_size, recompute_all=args.all, dry_run=args.dry_run
+        )
+    finally:
+        await Database.close_mongo_connection()
+    print(f"{'Would update' if args.dry_run else 'Updated'} {updated} events")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill event price bounds and availability")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--all", action="store_true", help="recompute every event, not only those missing the fields")
+    parser.add_argument("--dry-run", action="store_true", help="count events without changing them")
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,146 @@
+"""
+Replace inline base64 QR images on tickets with their signed QR payloads.
+
+Tickets used to store a PNG data URI in qr_code_url. The payload encoded in
+that image has already been emailed to the buyer and is listed in door
+manifests, so it is kept: each image is decoded, the payload is checked
+(signature valid, ticket ID matches) and stored as qr_payload, which
+GET /tickets/{id}/qr.png renders on demand, and the data URI is removed.
+Tickets whose image cannot be decoded are left untouched and reported.
+
+Decoding needs pyzbar (with the zbar library) or opencv-python; neither is
+a runtime dependency of the API. Batches are ordered by _id, so the
+migration can be stopped and re-run safely:
+
+    python -m app.migrations.strip_inline_qr_codes [--batch-size 500] [--dry-run]
+"""
+import argparse
+import asyncio
+import base64
+import io
+from typing import Any, Dict, List, Optional, Tuple
+from PIL import Image
+from pymongo import UpdateOne
+from app.database import Database
+from app.services.qr_service import QRService
+import logging
+
+try:
+    from pyzbar.pyzbar import decode as zbar_decode
+except ImportError:
+    zbar_decode = None
+
+try:
+    import cv2
+    import numpy
+except ImportError:
+    cv2 = None
+
+logger = logging.getLogger(__name__)
+
+INLINE_QR_QUERY = {"qr_code_url": {"$regex": "^data:image/"}}
+
+
+def decoder_available() -> bool:
+    return zbar_decode is not None or cv2 is not None
+
+
+def decode_qr_image(data_uri: str) -> Optional[str]:
+    """
+    Text encoded in a data:image/...;base64 QR code, or None if it cannot be read
+    """
+    try:
+        image = Image.open(io.BytesIO(base64.b64decode(data_uri.split(",", 1)[1]))).convert("L")
+    except Exception:
+        return None
+    if zbar_decode is not None:
+        results = zbar_decode(image)
+        if results:
+            return results[0].data.decode()
+    if cv2 is not None:
+        text, _, _ = cv2.QRCodeDetector().detectAndDecode(numpy.array(image))
+        if text:
+            return text
+    return None
+
+
+def _recover_payloads(qr_service: QRService, tickets: List[Dict[str, Any]]) -> Dict[Any, Optional[str]]:
+    """
+    ticket _id -> the verified payload from its inline image (None when it cannot be recovered)
+    """
+    payloads = {}
+    for ticket in tickets:
+        payload = decode_qr_image(ticket["qr_code_url"])
+        parsed = qr_service.parse_payload(payload) if payload else None
+        payloads[ticket["_id"]] = payload if parsed and parsed[0] == str(ticket["_id"]) else None
+    return payloads
+
+
+async def strip_inline_qr_codes(db, batch_size: int = 500, dry_run: bool = False) -> Tuple[int, int]:
+    """
+    Migrate all tickets with an inline QR image; returns (migrated, skipped)
+    """
+    if not decoder_available():
+        raise RuntimeError("Decoding inline QR images needs pyzbar or opencv-python")
+    qr_service = QRService()
+    migrated = 0
+    skipped = 0
+    last_id = None
+    while True:
+        query = dict(INLINE_QR_QUERY)
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = await db.tickets.find(
+            query,
+            projection={"_id": 1, "qr_code_url": 1, "qr_payload": 1}
+        ).sort("_id", 1).limit(batch_size).to_list(length=batch_size)
+        if not batch:
+            break
+        last_id = batch[-1]["_id"]
+
+        # Decoding is CPU-bound; keep it off the event loop
+        payloads = await asyncio.to_thread(
+            _recover_payloads, qr_service, [ticket for ticket in batch if not ticket.get("qr_payload")]
+        )
+        operations = []
+        for ticket in batch:
+            update: Dict[str, Any] = {"$unset": {"qr_code_url": ""}}
+            if not ticket.get("qr_payload"):
+                payload = payloads[ticket["_id"]]
+                if payload is None:
+                    logger.warning(f"Could not recover the QR payload of ticket {ticket['_id']}; left as is")
+                    skipped += 1
+                    continue
+                update["$set"] = {"qr_payload": payload}
+            # Only touch the ticket if it still holds an inline image
+            operations.append(UpdateOne({"_id": ticket["_id"], **INLINE_QR_QUERY}, update))
+
+        if dry_run:
+            migrated += len(operations)
+        elif operations:
+            result = await db.tickets.bulk_write(operations, ordered=False)
+            migrated += result.modified_count
+        logger.info(f"Processed {migrated} tickets, skipped {skipped} (last _id {last_id})")
+    return migrated, skipped
+
+
+async def _main(args) -> None:
+    db = await Database.get_db()
+    try:
+        migrated, skipped = await strip_inline_qr_codes(db, batch_size=args.batch_size, dry_run=args.dry_run)
+    finally:
+        await Database.close_mongo_connection()
+    print(f"{'Would migrate' if args.dry_run else 'Migrated'} {migrated} tickets")
+    if skipped:
+        print(f"Kept the inline image of {skipped} tickets whose payload could not be recovered")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replace inline QR images with their QR payloads")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="count tickets without changing them")
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    asyncio.run(_main(parser.parse_args()))
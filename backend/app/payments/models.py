@@ -1,8 +1,9 @@
 from enum import Enum
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, validator
 from typing import Optional, Dict, Any, List
 from datetime import datetime
 from bson import ObjectId
+from app.core.utils.phone import normalize_phone
 
 class PaymentMethod(str, Enum):
     PAYSTACK = "paystack"
@@ -10,6 +11,8 @@ class PaymentMethod(str, Enum):
 
 class PaymentStatus(str, Enum):
     PENDING = "pending"
+    # Claimed by one fulfillment; tickets are being issued
+    FULFILLING = "fulfilling"
     COMPLETED = "completed"
     FAILED = "failed"
     CANCELLED = "cancelled"
@@ -29,6 +32,10 @@ class PaymentCreate(BaseModel):
     payment_method: PaymentMethod = PaymentMethod.PAYSTACK
     tickets: List[TicketPurchase]
 
+    @validator('phone')
+    def normalize_phone_number(cls, v):
+        return normalize_phone(v)
+
 class PaymentUpdate(BaseModel):
     status: Optional[PaymentStatus] = None
     payment_details: Optional[Dict[str, Any]] = None
@@ -55,4 +62,26 @@ class Payment(BaseModel):
         json_encoders = {
             ObjectId: str,
             datetime: lambda dt: dt.isoformat()
-        } 
\ No newline at end of file
+        }
+
+
+# Database indexes
+PAYMENT_INDEXES = [
+    # Webhook and verify lookups
+    {
+        "keys": [("paystack_reference", 1)],
+        "unique": True,
+        "partialFilterExpression": {"paystack_reference": {"$type": "string"}}
+    },
+    # A user's payment history, newest first
+    [("user_id", 1), ("created_at", -1)]
+]
+
+# Webhook inbox: one document per Paystack event, kept for 30 days
+PAYMENT_EVENT_INDEXES = [
+    [("reference", 1)],
+    {
+        "keys": [("received_at", 1)],
+        "expireAfterSeconds": 30 * 24 * 60 * 60
+    }
+]
@@ -1,20 +1,32 @@
+import hashlib
+import hmac
 import httpx
 from typing import Optional, Dict, Any
 from fastapi import HTTPException, status
 from ..core.config import settings
+from ..core.http_client import HTTPClient
 import logging
 
 logger = logging.getLogger(__name__)
 
 class PaystackService:
     def __init__(self):
-        self.base_url = "https://api.paystack.co"
+        self.base_url = settings.PAYSTACK_BASE_URL
         self.secret_key = settings.PAYSTACK_SECRET_KEY
         self.headers = {
             "Authorization": f"Bearer {self.secret_key}",
             "Content-Type": "application/json"
         }
 
+    def verify_webhook_signature(self, body: bytes, signature: Optional[str]) -> bool:
+        """
+        Check the x-paystack-signature header (HMAC-SHA512 of the raw body)
+        """
+        if not signature or not self.secret_key:
+            return False
+        expected = hmac.new(self.secret_key.encode(), body, hashlib.sha512).hexdigest()
+        return hmac.compare_digest(expected, signature)
+
     async def initialize_transaction(
         self,
         email: str,
@@ -27,40 +39,40 @@ class PaystackService:
         Initialize a payment transaction
         """
         try:
-            async with httpx.AsyncClient() as client:
-                payload = {
-                    "email": email,
-                    "amount": int(amount * 100),  # Convert to kobo/pesewas
-                    "reference": reference,
-                    "callback_url": callback_url,
-                    "metadata": metadata or {}
-                }
-                
-                response = await client.post(
-                    f"{self.base_url}/transaction/initialize",
-                    headers=self.headers,
-                    json=payload
+            client = HTTPClient.get_client()
+            payload = {
+                "email": email,
+                "amount": round(amount * 100),  # Convert to kobo/pesewas
+                "reference": reference,
+                "callback_url": callback_url,
+                "metadata": metadata or {}
+            }
+            
+            response = await client.post(
+                f"{self.base_url}/transaction/initialize",
+                headers=self.headers,
+                json=payload
+            )
+            
+            response_data = response.json()
+            
+            if response.status_code != 200:
+                error_message = response_data.get("message", "Failed to initialize transaction")
+                logger.error(f"Paystack initialization failed: {error_message}")
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=error_message
+                )
+            
+            if not response_data.get("status"):
+                error_message = response_data.get("message", "Transaction initialization failed")
+                logger.error(f"Paystack initialization failed: {error_message}")
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=error_message
                 )
-                
-                response_data = response.json()
-                
-                if response.status_code != 200:
-                    error_message = response_data.get("message", "Failed to initialize transaction")
-                    logger.error(f"Paystack initialization failed: {error_message}")
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail=error_message
-                    )
-                
-                if not response_data.get("status"):
-                    error_message = response_data.get("message", "Transaction initialization failed")
-                    logger.error(f"Paystack initialization failed: {error_message}")
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail=error_message
-                    )
-                
-                return response_data
+            
+            return response_data
         except httpx.RequestError as e:
             logger.error(f"Network error while initializing Paystack transaction: {str(e)}")
             raise HTTPException(
@@ -79,19 +91,19 @@ class PaystackService:
         Verify a transaction status
         """
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.base_url}/transaction/verify/{reference}",
-                    headers=self.headers
+            client = HTTPClient.get_client()
+            response = await client.get(
+                f"{self.base_url}/transaction/verify/{reference}",
+                headers=self.headers
+            )
+            
+            if response.status_code != 200:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Failed to verify transaction"
                 )
-                
-                if response.status_code != 200:
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail="Failed to verify transaction"
-                    )
-                
-                return response.json()
+            
+            return response.json()
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -110,31 +122,31 @@ class PaystackService:
         Initialize M-Pesa payment
         """
         try:
-            async with httpx.AsyncClient() as client:
-                payload = {
-                    "email": email,
-                    "amount": int(amount * 100),  # Convert to kobo/pesewas
-                    "reference": reference,
-                    "mobile_money": {
-                        "phone": phone,
-                        "provider": "mpesa"
-                    },
-                    "metadata": metadata or {}
-                }
-                
-                response = await client.post(
-                    f"{self.base_url}/charge",
-                    headers=self.headers,
-                    json=payload
+            client = HTTPClient.get_client()
+            payload = {
+                "email": email,
+                "amount": round(amount * 100),  # Convert to kobo/pesewas
+                "reference": reference,
+                "mobile_money": {
+                    "phone": phone,
+                    "provider": "mpesa"
+                },
+                "metadata": metadata or {}
+            }
+            
+            response = await client.post(
+                f"{self.base_url}/charge",
+                headers=self.headers,
+                json=payload
+            )
+            
+            if response.status_code != 200:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Failed to initialize M-Pesa payment"
                 )
-                
-                if response.status_code != 200:
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail="Failed to initialize M-Pesa payment"
-                    )
-                
-                return response.json()
+            
+            return response.json()
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -146,19 +158,19 @@ class PaystackService:
         Check M-Pesa payment status
         """
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.base_url}/charge/{reference}",
-                    headers=self.headers
+            client = HTTPClient.get_client()
+            response = await client.get(
+                f"{self.base_url}/charge/{reference}",
+                headers=self.headers
+            )
+            
+            if response.status_code != 200:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Failed to check M-Pesa status"
                 )
-                
-                if response.status_code != 200:
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail="Failed to check M-Pesa status"
-                    )
-                
-                return response.json()
+            
+            return response.json()
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -178,43 +190,43 @@ class PaystackService:
         Initialize a mobile money payment
         """
         try:
-            async with httpx.AsyncClient() as client:
-                payload = {
-                    "email": email,
-                    "amount": int(amount * 100),  # Convert to kobo/pesewas
-                    "reference": reference,
-                    "mobile_money": {
-                        "phone": phone,
-                        "provider": provider
-                    },
-                    "metadata": metadata or {}
-                }
-                
-                response = await client.post(
-                    f"{self.base_url}/charge",
-                    headers=self.headers,
-                    json=payload
+            client = HTTPClient.get_client()
+            payload = {
+                "email": email,
+                "amount": round(amount * 100),  # Convert to kobo/pesewas
+                "reference": reference,
+                "mobile_money": {
+                    "phone": phone,
+                    "provider": provider
+                },
+                "metadata": metadata or {}
+            }
+            
+            response = await client.post(
+                f"{self.base_url}/charge",
+                headers=self.headers,
+                json=payload
+            )
+            
+            response_data = response.json()
+            
+            if response.status_code != 200:
+                error_message = response_data.get("message", "Failed to initialize mobile money payment")
+                logger.error(f"Paystack mobile money initialization failed: {error_message}")
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=error_message
                 )
-                
-                response_data = response.json()
-                
-                if response.status_code != 200:
-                    error_message = response_data.get("message", "Failed to initialize mobile money payment")
-                    logger.error(f"Paystack mobile money initialization failed: {error_message}")
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail=error_message
-                    )
-                
-                if not response_data.get("status"):
-                    error_message = response_data.get("message", "Mobile money payment initialization failed")
-                    logger.error(f"Paystack mobile money initialization failed: {error_message}")
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail=error_message
-                    )
-                
-                return response_data
+            
+            if not response_data.get("status"):
+                error_message = response_data.get("message", "Mobile money payment initialization failed")
+                logger.error(f"Paystack mobile money initialization failed: {error_message}")
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=error_message
+                )
+            
+            return response_data
         except httpx.RequestError as e:
             logger.error(f"Network error while initializing mobile money payment: {str(e)}")
             raise HTTPException(
@@ -233,20 +245,20 @@ class PaystackService:
         Verify a mobile money payment
         """
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.base_url}/transaction/verify/{reference}",
-                    headers=self.headers
+            client = HTTPClient.get_client()
+            response = await client.get(
+                f"{self.base_url}/transaction/verify/{reference}",
+                headers=self.headers
+            )
+            
+            if response.status_code != 200:
+                error_data = response.json()
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=error_data.get("message", "Failed to verify mobile money payment")
                 )
-                
-                if response.status_code != 200:
-                    error_data = response.json()
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail=error_data.get("message", "Failed to verify mobile money payment")
-                    )
-                
-                return response.json()
+            
+            return response.json()
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -1,15 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request, BackgroundTasks
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Header
+from typing import List, Optional
 from ..database import get_database
 from ..auth.utils import get_current_user
 from ..auth.models import UserModel
-from .models import Payment, PaymentCreate, PaymentUpdate, PaymentStatus, PaymentMethod
+from .models import (
+    Payment, PaymentCreate, PaymentUpdate, PaymentStatus, PaymentMethod
+)
 from .paystack import PaystackService
-from ..services.email import EmailService
-from ..services.twilio_service import TwilioService
-from ..services.qr_service import QRService
+from ..services.inventory_service import InventoryService
+from ..services.admission_service import AdmissionService
+from ..services.outbox_service import OutboxService, JOB_TICKET_ISSUED
 from bson import ObjectId
-from datetime import datetime
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from ..core.config import settings
+import hashlib
+import json
 import uuid
 import logging
 from ..email import send_ticket_email
@@ -23,9 +30,9 @@ router = APIRouter(prefix="/payments", tags=["payments"])
 logger.info("Initializing payment router")
 
 paystack_service = PaystackService()
-email_service = EmailService()
-twilio_service = TwilioService()
-qr_service = QRService()
+inventory_service = InventoryService()
+admission_service = AdmissionService()
+outbox_service = OutboxService()
 
 # Debug route to test router registration
 @router.get("/test")
@@ -38,9 +45,15 @@ async def test_payment_router():
 async def create_payment(
     payment: PaymentCreate,
     request: Request,
+    x_queue_token: Optional[str] = Header(None),
     current_user = Depends(get_current_user),
     db = Depends(get_database)
 ):
+    # Buyers must come through the waiting room when the event has one
+    await admission_service.check_admission(
+        db, ObjectId(payment.event_id), x_queue_token, str(current_user.id)
+    )
+
     # Verify event exists
     event = await db.events.find_one({"_id": ObjectId(payment.event_id)})
     if not event:
@@ -65,18 +78,20 @@ async def create_payment(
                 detail=f"Invalid ticket type: {ticket.name}"
             )
         
-        if ticket_type["quantity"] < ticket.quantity:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Not enough tickets available for {ticket.name}"
-            )
-        
         ticket_types.append({
             "name": ticket.name,
             "price": ticket_type["price"],
             "quantity": ticket.quantity
         })
 
+    # Hold the requested tickets until the payment is verified or the hold expires
+    await inventory_service.reserve_many(
+        db,
+        event["_id"],
+        [(tt["name"], tt["quantity"]) for tt in ticket_types],
+        reference
+    )
+
     # Initialize Paystack payment
     try:
         if payment.payment_method == PaymentMethod.PAYSTACK:
@@ -143,92 +158,231 @@ async def create_payment(
 
         return Payment(**payment_data)
     except HTTPException as e:
+        await inventory_service.release_reference(db, reference)
         raise e
     except Exception as e:
+        await inventory_service.release_reference(db, reference)
         logger.error(f"Error creating payment: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An error occurred while processing your payment. Please try again."
         )
 
-async def process_payment_confirmation(
-    payment_id: str,
-    ticket_id: str,
-    background_tasks: BackgroundTasks
-):
+async def fulfill_payment(db, payment: dict) -> bool:
     """
-    Process payment confirmation and send notifications
+    Issue a payment's tickets and mark it as completed.
+
+    The payment is first claimed by moving it to FULFILLING with a lease, so
+    the webhook and the verify endpoint can race without issuing tickets
+    twice. It only becomes COMPLETED once every hold is committed and every
+    ticket is stored; if anything fails the claim is released and a retry
+    picks up where this attempt stopped (committed holds and tickets already
+    issued for the payment are reused). Returns False when the payment is
+    already completed or another fulfillment holds the claim.
     """
+    now = datetime.utcnow()
+    payment = await db.payments.find_one_and_update(
+        {
+            "_id": payment["_id"],
+            "$or": [
+                {"status": {"$nin": [PaymentStatus.COMPLETED, PaymentStatus.FULFILLING]}},
+                {"status": PaymentStatus.FULFILLING, "fulfilling_until": {"$lt": now}}
+            ]
+        },
+        {
+            "$set": {
+                "status": PaymentStatus.FULFILLING,
+                "fulfilling_until": now + timedelta(seconds=settings.PAYMENT_FULFILL_LEASE_SECONDS),
+                "updated_at": now
+            }
+        },
+        return_document=ReturnDocument.AFTER
+    )
+    if not payment:
+        logger.info("Payment already completed or being fulfilled, skipping fulfillment")
+        return False
+    logger.info("Claimed payment for fulfillment")
+
     try:
-        logger.info(f"Starting payment confirmation process for payment {payment_id} and ticket {ticket_id}")
-        
-        db = await get_database()
-        
-        # Get payment and ticket details
-        payment = await db.payments.find_one({"_id": ObjectId(payment_id)})
-        ticket = await db.tickets.find_one({"_id": ObjectId(ticket_id)})
-        event = await db.events.find_one({"_id": ObjectId(ticket["event_id"])})
-        
-        if not all([payment, ticket, event]):
-            logger.error("Missing payment, ticket, or event data")
-            return
-            
-        logger.info("Retrieved payment, ticket, and event data")
-        
-        # Generate QR code
-        logger.info("Generating QR code...")
-        qr_code_url = qr_service.generate_qr_code(str(ticket["_id"]), str(event["_id"]))
-        logger.info("QR code generated successfully")
-        
-        # Update ticket with QR code
-        await db.tickets.update_one(
-            {"_id": ObjectId(ticket_id)},
+        ticket_ids = await _issue_tickets(db, payment)
+    except Exception:
+        # Let the next webhook delivery or verify call retry straight away
+        await db.payments.update_one(
+            {"_id": payment["_id"], "status": PaymentStatus.FULFILLING},
             {
-                "$set": {
-                    "qr_code_url": qr_code_url,
-                    "status": "paid",
-                    "updated_at": datetime.utcnow()
-                }
+                "$set": {"status": PaymentStatus.PENDING, "updated_at": datetime.utcnow()},
+                "$unset": {"fulfilling_until": ""}
             }
         )
-        logger.info("Updated ticket with QR code")
-        
-        # Send email notification with QR code
-        logger.info("Sending email notification...")
-        background_tasks.add_task(
-            email_service.send_ticket_qr_code,
-            ticket,
-            event,
-            qr_code_url,
-            ticket["buyer_email"]
+        raise
+
+    if ticket_ids:
+        # QR codes and notifications are handled by the outbox worker; one job
+        # per payment lets a group purchase render its QR codes in one batch
+        payment_id = str(payment["_id"])
+        await outbox_service.enqueue(
+            db,
+            JOB_TICKET_ISSUED,
+            {"ticket_ids": ticket_ids, "payment_id": payment_id},
+            dedupe_key=f"{JOB_TICKET_ISSUED}:payment:{payment_id}"
         )
+        logger.info(f"Queued ticket_issued job for {len(ticket_ids)} tickets")
+
+    await db.payments.update_one(
+        {"_id": payment["_id"], "status": PaymentStatus.FULFILLING},
+        {
+            "$set": {"status": PaymentStatus.COMPLETED, "updated_at": datetime.utcnow()},
+            "$unset": {"fulfilling_until": ""}
+        }
+    )
+    logger.info("Payment fulfillment completed successfully")
+    return True
+
+async def _issue_tickets(db, payment: dict) -> List[str]:
+    """
+    Commit the holds and store the tickets of a claimed payment; returns the ticket IDs
+    """
+    # Get event details
+    event = await db.events.find_one({"_id": ObjectId(payment["event_id"])})
+    if not event:
+        logger.error(f"Event not found for ID: {payment['event_id']}")
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Event not found"
+        )
+    logger.info(f"Found event: {event['title']}")
+
+    payment_id = str(payment["_id"])
+    ticket_ids = []
+    for ticket_type in payment["ticket_types"]:
+        logger.info(f"Processing ticket type: {ticket_type}")
+
+        # Issued by an earlier, interrupted attempt at this payment
+        issued = await db.tickets.find_one(
+            {"payment_id": payment_id, "ticket_type_name": ticket_type["name"]},
+            projection={"_id": 1}
+        )
+        if issued:
+            ticket_ids.append(str(issued["_id"]))
+            continue
+
+        # Create ticket
+        ticket_data = {
+            "user_id": payment["user_id"],
+            "event_id": payment["event_id"],
+            "payment_id": payment_id,
+            "ticket_type_name": ticket_type["name"],
+            "quantity": ticket_type["quantity"],
+            "total_price": ticket_type["price"] * ticket_type["quantity"],
+            "status": "paid",
+            "buyer_name": payment["name"],
+            "buyer_email": payment["email"],
+            "buyer_phone": payment["phone"],
+            "created_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow()
+        }
+
+        # Commit the stock held for this payment
+        await inventory_service.confirm(
+            db,
+            ObjectId(payment["event_id"]),
+            ticket_type["name"],
+            ticket_type["quantity"],
+            payment["paystack_reference"]
+        )
+        logger.info(f"Committed ticket hold for type: {ticket_type['name']}")
+
+        logger.info(f"Creating ticket with data: {ticket_data}")
         
-        # Send SMS notification
-        if ticket.get("buyer_phone"):
-            logger.info("Sending SMS notification...")
-            background_tasks.add_task(
-                twilio_service.send_ticket_confirmation,
-                ticket["buyer_phone"],
-                event["title"],
-                str(ticket["_id"]),
-                qr_code_url
+        try:
+            result = await db.tickets.insert_one(ticket_data)
+            ticket_id = str(result.inserted_id)
+        except DuplicateKeyError:
+            # A fulfillment whose lease ran out got here first
+            issued = await db.tickets.find_one(
+                {"payment_id": payment_id, "ticket_type_name": ticket_type["name"]},
+                projection={"_id": 1}
             )
-            
-        logger.info("Payment confirmation process completed")
-            
-    except Exception as e:
-        logger.error(f"Error in payment confirmation process: {str(e)}", exc_info=True)
+            ticket_id = str(issued["_id"])
+        ticket_ids.append(ticket_id)
+        logger.info(f"Created ticket with ID: {ticket_id}")
+
+    return ticket_ids
+
+@router.post("/webhook")
+async def paystack_webhook(
+    request: Request,
+    x_paystack_signature: Optional[str] = Header(None),
+    db = Depends(get_database)
+):
+    """
+    Receive Paystack events; each event is recorded once and processed once
+    """
+    body = await request.body()
+    if not paystack_service.verify_webhook_signature(body, x_paystack_signature):
+        logger.warning("Rejected Paystack webhook with an invalid signature")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid signature"
+        )
+
+    try:
+        payload = json.loads(body)
+    except json.JSONDecodeError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid payload"
+        )
+    event_type = payload.get("event", "")
+    data = payload.get("data") or {}
+    reference = data.get("reference")
+    event_key = f"{event_type}:{data['id']}" if data.get("id") else hashlib.sha256(body).hexdigest()
+
+    # Inbox insert doubles as the deduplication check
+    try:
+        await db.payment_events.insert_one({
+            "_id": event_key,
+            "event": event_type,
+            "reference": reference,
+            "payload": payload,
+            "received_at": datetime.utcnow(),
+            "processed_at": None
+        })
+    except DuplicateKeyError:
+        existing = await db.payment_events.find_one({"_id": event_key}, projection={"processed_at": 1})
+        if existing and existing.get("processed_at"):
+            logger.info(f"Duplicate Paystack event {event_key}, already processed")
+            return {"status": "duplicate"}
+        logger.info(f"Retrying unprocessed Paystack event {event_key}")
+
+    if event_type == "charge.success" and reference:
+        payment = await db.payments.find_one({"paystack_reference": reference})
+        if not payment:
+            logger.error(f"Webhook for unknown payment reference: {reference}")
+        elif data.get("amount") != round(payment["amount"] * 100):
+            logger.error(f"Webhook amount mismatch for {reference}: {data.get('amount')}")
+        else:
+            await fulfill_payment(db, payment)
+
+    await db.payment_events.update_one(
+        {"_id": event_key},
+        {"$set": {"processed_at": datetime.utcnow()}}
+    )
+    return {"status": "success"}
 
 @router.post("/verify/{reference}")
 async def verify_payment(
     reference: str,
-    background_tasks: BackgroundTasks,
     request: Request,
     current_user = Depends(get_current_user),
     db = Depends(get_database)
 ):
     """
-    Verify a payment with Paystack and create tickets if successful
+    Check a payment and create tickets if successful.
+
+    Payments are normally completed by the Paystack webhook, so this is a local
+    lookup; Paystack is only asked directly when a payment has been pending
+    for longer than PAYSTACK_VERIFY_FALLBACK_SECONDS (e.g. a missed webhook).
     """
     try:
         logger.info(f"Starting payment verification for reference: {reference}")
@@ -248,6 +402,20 @@ async def verify_payment(
             logger.info("Payment already completed, skipping verification")
             return {"status": "success", "message": "Payment already verified"}
 
+        if payment["status"] == PaymentStatus.FULFILLING:
+            return {"status": "pending", "message": "Payment is being confirmed"}
+
+        if payment["status"] == PaymentStatus.FAILED:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Payment verification failed"
+            )
+
+        # Give the webhook a chance before asking Paystack
+        pending_for = (datetime.utcnow() - payment["created_at"]).total_seconds()
+        if pending_for < settings.PAYSTACK_VERIFY_FALLBACK_SECONDS:
+            return {"status": "pending", "message": "Payment is being confirmed"}
+
         # Verify payment with Paystack
         logger.info("Verifying payment with Paystack...")
         paystack_response = await paystack_service.verify_transaction(reference)
@@ -255,92 +423,13 @@ async def verify_payment(
         
         if paystack_response.get("status") and paystack_response["data"]["status"] == "success":
             logger.info("Payment verification successful")
-            
-            # Update payment status
-            await db.payments.update_one(
-                {"_id": payment["_id"]},
-                {
-                    "$set": {
-                        "status": PaymentStatus.COMPLETED,
-                        "updated_at": datetime.utcnow()
-                    }
-                }
-            )
-            logger.info("Updated payment status to COMPLETED")
-
-            # Get event details
-            event = await db.events.find_one({"_id": ObjectId(payment["event_id"])})
-            if not event:
-                logger.error(f"Event not found for ID: {payment['event_id']}")
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail="Event not found"
-                )
-            logger.info(f"Found event: {event['title']}")
-
-            # Create tickets for each ticket type
-            for ticket_type in payment["ticket_types"]:
-                logger.info(f"Processing ticket type: {ticket_type}")
-                
-                # Check if ticket already exists
-                existing_ticket = await db.tickets.find_one({
-                    "user_id": payment["user_id"],
-                    "event_id": payment["event_id"],
-                    "ticket_type_name": ticket_type["name"],
-                    "status": "paid"
-                })
-                
-                if existing_ticket:
-                    logger.info(f"Ticket already exists for type: {ticket_type['name']}")
-                    continue
-
-                # Create ticket
-                ticket_data = {
-                    "user_id": payment["user_id"],
-                    "event_id": payment["event_id"],
-                    "ticket_type_name": ticket_type["name"],
-                    "quantity": ticket_type["quantity"],
-                    "total_price": ticket_type["price"] * ticket_type["quantity"],
-                    "status": "paid",
-                    "buyer_name": payment["name"],
-                    "buyer_email": payment["email"],
-                    "buyer_phone": payment["phone"],
-                    "created_at": datetime.utcnow(),
-                    "updated_at": datetime.utcnow()
-                }
-                logger.info(f"Creating ticket with data: {ticket_data}")
-                
-                result = await db.tickets.insert_one(ticket_data)
-                ticket_id = str(result.inserted_id)
-                logger.info(f"Created ticket with ID: {ticket_id}")
-                
-                # Update event ticket quantities
-                await db.events.update_one(
-                    {"_id": ObjectId(payment["event_id"]), "ticket_types.name": ticket_type["name"]},
-                    {
-                        "$inc": {
-                            "ticket_types.$.quantity": -ticket_type["quantity"]
-                        }
-                    }
-                )
-                logger.info(f"Updated event ticket quantities")
-
-                # Process payment confirmation in background
-                logger.info("Adding payment confirmation task to background tasks")
-                background_tasks.add_task(
-                    process_payment_confirmation,
-                    str(payment["_id"]),
-                    ticket_id,
-                    background_tasks
-                )
-
-            logger.info("Payment verification and ticket creation completed successfully")
+            await fulfill_payment(db, payment)
             return {"status": "success", "message": "Payment verified and tickets created"}
         else:
             logger.error(f"Payment verification failed: {paystack_response}")
             # Update payment status to failed
             await db.payments.update_one(
-                {"_id": payment["_id"]},
+                {"_id": payment["_id"], "status": PaymentStatus.PENDING},
                 {
                     "$set": {
                         "status": PaymentStatus.FAILED,
@@ -348,6 +437,7 @@ async def verify_payment(
                     }
                 }
             )
+            await inventory_service.release_reference(db, reference)
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Payment verification failed"
@@ -368,7 +458,7 @@ async def get_user_payments(
     current_user = Depends(get_current_user),
     db = Depends(get_database)
 ):
-    payments = await db.payments.find({"user_id": str(current_user.id)}).to_list(length=None)
+    payments = await db.payments.find({"user_id": str(current_user.id)}).sort("created_at", -1).to_list(length=None)
     return [Payment(**payment) for payment in payments]
 
 @router.get("/{payment_id}", response_model=Payment)
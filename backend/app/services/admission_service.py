@@ -0,0 +1,255 @@
+import secrets
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+from bson import ObjectId
+from fastapi import HTTPException, status
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from app.core.config import settings
+from app.admission.models import QueueStatus
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionService:
+    """
+    Virtual waiting room for high-demand on-sales.
+
+    Each event with a waiting room has one admission_queues document holding a
+    token bucket (tokens, rate, burst, last_refill), the next queue position
+    and the highest position admitted so far. Buyers joining get a token in
+    admission_tokens with their position; refilling the bucket and moving the
+    admission line forward is a single pipeline update evaluated with the
+    server clock, so every API worker shares the same queue state.
+    """
+
+    # Per-process cache of queue documents: event_id -> (fetched_at, doc)
+    _queues: Dict[ObjectId, Tuple[float, Optional[Dict[str, Any]]]] = {}
+
+    def __init__(self):
+        self.refresh_seconds = settings.ADMISSION_REFRESH_SECONDS
+        self.window = timedelta(minutes=settings.ADMISSION_WINDOW_MINUTES)
+        self.token_ttl = timedelta(hours=settings.ADMISSION_TOKEN_TTL_HOURS)
+
+    async def configure(
+        self,
+        db,
+        event_id: ObjectId,
+        enabled: bool,
+        admit_rate: Optional[float] = None,
+        burst: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Create or update the waiting room of an event
+        """
+        update: Dict[str, Any] = {"enabled": enabled, "updated_at": datetime.utcnow()}
+        if admit_rate is not None:
+            update["rate"] = admit_rate
+        if burst is not None:
+            update["burst"] = burst
+        defaults = {
+            "tokens": 0.0,
+            "last_refill": datetime.utcnow(),
+            "next_position": 0,
+            "admitted_upto": 0,
+            "created_at": datetime.utcnow()
+        }
+        if admit_rate is None:
+            defaults["rate"] = settings.ADMISSION_ADMIT_RATE
+        if burst is None:
+            defaults["burst"] = settings.ADMISSION_BURST
+        queue = await db.admission_queues.find_one_and_update(
+            {"_id": event_id},
+            {"$set": update, "$setOnInsert": defaults},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self._queues.pop(event_id, None)
+        return queue
+
+    async def _advance(self, db, event_id: ObjectId) -> Optional[Dict[str, Any]]:
+        """
+        Refill the token bucket and admit as many waiting buyers as it allows
+        """
+        refilled = {
+            "$min": [
+                "$burst",
+                {
+                    "$add": [
+                        "$tokens",
+                        {
+                            "$multiply": [
+                                {"$divide": [{"$subtract": ["$$NOW", "$last_refill"]}, 1000]},
+                                "$rate"
+                            ]
+                        }
+                    ]
+                }
+            ]
+        }
+        admit = {
+            "$max": [
+                0,
+                {
+                    "$min": [
+                        {"$floor": "$tokens"},
+                        {"$subtract": ["$next_position", "$admitted_upto"]}
+                    ]
+                }
+            ]
+        }
+        return await db.admission_queues.find_one_and_update(
+            {"_id": event_id, "enabled": True},
+            [
+                {"$set": {"tokens": refilled, "last_refill": "$$NOW"}},
+                {"$set": {"admitting": admit}},
+                {
+                    "$set": {
+                        "admitted_upto": {"$add": ["$admitted_upto", "$admitting"]},
+                        "tokens": {"$subtract": ["$tokens", "$admitting"]}
+                    }
+                },
+                {"$unset": "admitting"}
+            ],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def get_queue(self, db, event_id: ObjectId) -> Optional[Dict[str, Any]]:
+        """
+        Current queue state for an event, advanced at most once per refresh interval
+        per worker; None when the event has no active waiting room
+        """
+        cached = self._queues.get(event_id)
+        if cached and time.monotonic() - cached[0] < self.refresh_seconds:
+            return cached[1]
+        queue = await self._advance(db, event_id)
+        self._queues[event_id] = (time.monotonic(), queue)
+        return queue
+
+    async def join(self, db, event_id: ObjectId, user_id: str) -> Dict[str, Any]:
+        """
+        Put a buyer in the queue, reusing their token if they already joined
+        """
+        existing = await db.admission_tokens.find_one({"event_id": event_id, "user_id": user_id})
+        if existing:
+            if not existing.get("expires_at") or existing["expires_at"] > datetime.utcnow():
+                return existing
+            # Their admission window lapsed: go to the back of the queue
+            await db.admission_tokens.delete_one({"_id": existing["_id"]})
+
+        queue = await db.admission_queues.find_one_and_update(
+            {"_id": event_id, "enabled": True},
+            {"$inc": {"next_position": 1}},
+            projection={"next_position": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if not queue:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="This event has no active waiting room"
+            )
+
+        now = datetime.utcnow()
+        token = {
+            "_id": secrets.token_urlsafe(24),
+            "event_id": event_id,
+            "user_id": user_id,
+            "position": queue["next_position"],
+            "created_at": now,
+            "purge_at": now + self.token_ttl
+        }
+        try:
+            await db.admission_tokens.insert_one(token)
+        except DuplicateKeyError:
+            # A concurrent join from the same buyer won
+            return await db.admission_tokens.find_one({"event_id": event_id, "user_id": user_id})
+        return token
+
+    async def _admit(self, db, token: Dict[str, Any], queue: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Start the purchase window of a token once its position has been reached
+        """
+        if token.get("admitted_at") or not queue or token["position"] > queue["admitted_upto"]:
+            return token
+        now = datetime.utcnow()
+        admitted = await db.admission_tokens.find_one_and_update(
+            {"_id": token["_id"], "admitted_at": {"$exists": False}},
+            {"$set": {"admitted_at": now, "expires_at": now + self.window}},
+            return_document=ReturnDocument.AFTER
+        )
+        return admitted or await db.admission_tokens.find_one({"_id": token["_id"]})
+
+    def describe(self, token: Dict[str, Any], queue: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Client view of a queue token
+        """
+        if token.get("expires_at") and token["expires_at"] <= datetime.utcnow():
+            token_status = QueueStatus.EXPIRED
+        elif token.get("admitted_at"):
+            token_status = QueueStatus.ADMITTED
+        else:
+            token_status = QueueStatus.WAITING
+        admitted_upto = queue["admitted_upto"] if queue else 0
+        return {
+            "token": token["_id"],
+            "event_id": str(token["event_id"]),
+            "position": token["position"],
+            "status": token_status,
+            "ahead": max(0, token["position"] - admitted_upto - 1),
+            "admitted_until": token.get("expires_at")
+        }
+
+    async def status(self, db, event_id: ObjectId, token_id: str) -> Dict[str, Any]:
+        """
+        Position and admission state of a token
+        """
+        token = await db.admission_tokens.find_one({"_id": token_id, "event_id": event_id})
+        if not token:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Queue token not found"
+            )
+        queue = await self.get_queue(db, event_id)
+        token = await self._admit(db, token, queue)
+        return self.describe(token, queue)
+
+    async def check_admission(
+        self,
+        db,
+        event_id: ObjectId,
+        token_id: Optional[str],
+        user_id: str
+    ) -> None:
+        """
+        Reject purchases for events behind a waiting room unless the buyer was admitted
+        """
+        queue = await self.get_queue(db, event_id)
+        if not queue:
+            return
+
+        if not token_id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="This event is behind a waiting room; join the queue first"
+            )
+        token = await db.admission_tokens.find_one({"_id": token_id, "event_id": event_id})
+        if not token or token["user_id"] != user_id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Invalid queue token"
+            )
+
+        token = await self._admit(db, token, queue)
+        if not token.get("admitted_at"):
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="You are still in the queue",
+                headers={"Retry-After": str(max(1, int(self.refresh_seconds)))}
+            )
+        if token["expires_at"] <= datetime.utcnow():
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Your purchase window has expired; join the queue again"
+            )
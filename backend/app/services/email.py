@@ -1,20 +1,59 @@
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-import smtplib
 from typing import Optional
 from app.core.config import settings
+from app.services.smtp_pool import SMTPPool
 from app.events.models import Event
 from app.tickets.models import TicketModel
 from datetime import datetime
 
 class EmailService:
+    # Connection pool shared by every EmailService in the process
+    _pool: Optional[SMTPPool] = None
+
     def __init__(self):
-        self.smtp_server = "smtp.gmail.com"  # Gmail SMTP server
-        self.smtp_port = 587  # Gmail TLS port
+        self.smtp_server = settings.EMAIL_HOST
+        self.smtp_port = settings.EMAIL_PORT
         self.smtp_username = settings.EMAIL_HOST_USER
         self.smtp_password = settings.EMAIL_HOST_PASSWORD
         self.sender_email = settings.EMAIL_HOST_USER  # Using the same email as username
-        self.use_tls = True  # Always use TLS for Gmail
+        self.use_tls = settings.EMAIL_USE_TLS
+
+    @classmethod
+    def get_pool(cls) -> SMTPPool:
+        """
+        Return the shared SMTP pool, creating it on first use
+        """
+        if cls._pool is None:
+            cls._pool = SMTPPool(
+                hostname=settings.EMAIL_HOST,
+                port=settings.EMAIL_PORT,
+                username=settings.EMAIL_HOST_USER,
+                password=settings.EMAIL_HOST_PASSWORD,
+                start_tls=settings.EMAIL_USE_TLS,
+                size=settings.EMAIL_POOL_SIZE,
+                idle_timeout=settings.EMAIL_POOL_IDLE_SECONDS,
+                timeout=settings.EMAIL_TIMEOUT
+            )
+        return cls._pool
+
+    @classmethod
+    async def close_pool(cls) -> None:
+        """
+        Close pooled SMTP connections on shutdown
+        """
+        if cls._pool is not None:
+            await cls._pool.close()
+            cls._pool = None
+
+    @classmethod
+    def stats(cls) -> dict:
+        """
+        SMTP pool metrics for the health endpoint
+        """
+        if cls._pool is None:
+            return {"started": False}
+        return {"started": True, **cls._pool.stats()}
 
     async def send_email(
         self,
@@ -38,11 +77,8 @@ class EmailService:
             if html_body:
                 message.attach(MIMEText(html_body, 'html'))
 
-            # Connect to SMTP server
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()  # Always use TLS for Gmail
-                server.login(self.smtp_username, self.smtp_password)
-                server.send_message(message)
+            # Send over a pooled, already authenticated connection
+            await self.get_pool().send_message(message)
 
             return True
         except Exception as e:
@@ -0,0 +1,186 @@
+import asyncio
+import hashlib
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, BinaryIO, Dict, Optional, Tuple
+from PIL import Image, ImageOps
+from pymongo import ReturnDocument
+from app.core.config import settings
+from app.core.http_client import HTTPClient
+from app.services.upload_service import upload_service
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Variant name -> bounding box (width, height); images are scaled down to fit, never up
+IMAGE_VARIANTS: Dict[str, Tuple[int, int]] = {
+    "thumb": (320, 180),
+    "card": (640, 360),
+    "hero": (1600, 900)
+}
+
+VARIANT_FOLDER = "event_images/variants"
+
+
+def render_variants(data: bytes, quality: int = 80) -> Dict[str, bytes]:
+    """
+    Build every IMAGE_VARIANTS size of an image as WebP bytes.
+
+    Module-level so it can run in a worker process.
+    """
+    with Image.open(io.BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source)
+        image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+    variants = {}
+    for name, size in IMAGE_VARIANTS.items():
+        variant = image.copy()
+        variant.thumbnail(size, Image.LANCZOS)
+        buffered = io.BytesIO()
+        variant.save(buffered, format="WEBP", quality=quality, method=4)
+        variants[name] = buffered.getvalue()
+    return variants
+
+
+def hash_stream(stream: BinaryIO, chunk_size: int = 1024 * 1024) -> str:
+    """
+    SHA-256 of a file object, read in chunks; the stream is rewound afterwards
+    """
+    digest = hashlib.sha256()
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(chunk_size), b""):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+class ImageService:
+    """
+    Event image assets and their resized variants.
+
+    Every image is recorded once in image_assets, keyed by the SHA-256 of its
+    bytes, with its Cloudinary URL and the URLs of its thumb/card/hero
+    variants. Re-uploading the same file reuses the asset instead of storing
+    and resizing it again. Variants are rendered with Pillow in a process
+    pool shared by all instances and uploaded as WebP.
+    """
+
+    _pool: Optional[ProcessPoolExecutor] = None
+
+    @classmethod
+    def get_pool(cls) -> ProcessPoolExecutor:
+        if cls._pool is None:
+            workers = settings.IMAGE_VARIANT_WORKERS or os.cpu_count() or 1
+            cls._pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return cls._pool
+
+    @classmethod
+    def shutdown_pool(cls) -> None:
+        if cls._pool is not None:
+            cls._pool.shutdown(wait=False, cancel_futures=True)
+            cls._pool = None
+
+    async def hash_file(self, stream: BinaryIO) -> str:
+        return await asyncio.to_thread(hash_stream, stream)
+
+    async def find_asset(self, db, digest: str) -> Optional[Dict[str, Any]]:
+        return await db.image_assets.find_one({"_id": digest})
+
+    async def record_asset(self, db, digest: str, upload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Store a newly uploaded original; if the same bytes were recorded meanwhile, that asset wins
+        """
+        return await db.image_assets.find_one_and_update(
+            {"_id": digest},
+            {
+                "$setOnInsert": {
+                    "url": upload["secure_url"],
+                    "public_id": upload.get("public_id"),
+                    "bytes": upload.get("bytes"),
+                    "width": upload.get("width"),
+                    "height": upload.get("height"),
+                    "created_at": datetime.utcnow()
+                }
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def download(self, url: str) -> bytes:
+        """
+        Fetch an image with the shared HTTP client, refusing bodies over UPLOAD_MAX_BYTES
+        """
+        client = HTTPClient.get_client()
+        async with client.stream("GET", url) as response:
+            response.raise_for_status()
+            buffered = bytearray()
+            async for chunk in response.aiter_bytes():
+                buffered.extend(chunk)
+                if len(buffered) > settings.UPLOAD_MAX_BYTES:
+                    raise ValueError(f"Image at {url} is larger than {settings.UPLOAD_MAX_BYTES} bytes")
+        return bytes(buffered)
+
+    async def build_variants(self, db, digest: str, data: bytes) -> Dict[str, str]:
+        """
+        Render, upload and record the variants of an asset; returns variant name -> URL
+        """
+        rendered = await asyncio.get_running_loop().run_in_executor(
+            self.get_pool(), render_variants, data, settings.IMAGE_VARIANT_QUALITY
+        )
+        uploads = await asyncio.gather(*(
+            upload_service.upload_bytes(image, folder=VARIANT_FOLDER, public_id=f"{digest[:32]}_{name}")
+            for name, image in rendered.items()
+        ))
+        variants = {name: upload["secure_url"] for name, upload in zip(rendered, uploads)}
+        await db.image_assets.update_one(
+            {"_id": digest},
+            {"$set": {"variants": variants, "variants_built_at": datetime.utcnow()}}
+        )
+        logger.info(
+            f"Built {len(variants)} variants for image {digest[:12]} "
+            f"({len(data)} bytes -> {', '.join(f'{name} {len(image)}' for name, image in rendered.items())})"
+        )
+        return variants
+
+    async def process_event_image(
+        self,
+        db,
+        event_id,
+        image_url: str,
+        asset_id: Optional[str] = None
+    ) -> Optional[Dict[str, str]]:
+        """
+        Make sure the event's current image has variants and store their URLs on the event
+        """
+        asset = await self.find_asset(db, asset_id) if asset_id else None
+        if asset and asset.get("variants"):
+            variants = asset["variants"]
+        else:
+            data = await self.download(image_url)
+            digest = hashlib.sha256(data).hexdigest()
+            asset = await self.find_asset(db, digest)
+            if asset and asset.get("variants"):
+                variants = asset["variants"]
+            else:
+                if not asset:
+                    asset = await self.record_asset(db, digest, {"secure_url": image_url, "bytes": len(data)})
+                variants = await self.build_variants(db, digest, data)
+            asset_id = digest
+
+        # Only if the event still shows this image
+        result = await db.events.update_one(
+            {"_id": event_id, "image_url": image_url},
+            {"$set": {"image_variants": variants, "image_asset_id": asset_id}}
+        )
+        if not result.matched_count:
+            logger.info(f"Event {event_id} image changed before its variants were ready")
+            return None
+        return variants
+
+
+image_service = ImageService()
@@ -0,0 +1,567 @@
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from bson import ObjectId
+from fastapi import HTTPException, status
+from pymongo import ReturnDocument
+from app.core.config import settings
+from app.events.models import refresh_event_summary
+import logging
+
+logger = logging.getLogger(__name__)
+
+HOLD_ACTIVE = "active"
+HOLD_COMMITTED = "committed"
+HOLD_RELEASED = "released"
+
+
+class InventoryService:
+    """
+    Ticket stock reservations.
+
+    Stock is taken with a conditional decrement on the event document
+    (the filter requires quantity >= n), so concurrent buyers can never drive
+    a ticket type below zero. Every reservation is recorded as a hold in the
+    ticket_holds collection; holds are committed when payment succeeds and
+    released (stock returned) when they are cancelled or expire. Each hold
+    changes state through a single atomic update, so commit, release and the
+    expiry sweeper never double count.
+
+    Hot events can be switched to sharded mode: the stock of each ticket type
+    is split across inventory_shards documents, reservations decrement a
+    randomly chosen shard, and a reconciler periodically folds the shards back
+    into the event document so reads keep working unchanged.
+    """
+
+    # Events known to be sharded in this process: event_id -> (shard count, expiry).
+    # Entries are re-read after INVENTORY_SHARD_CACHE_SECONDS and the
+    # reconciler replaces the whole map each pass, so deleted events drop out.
+    _sharded_events: Dict[ObjectId, Tuple[int, float]] = {}
+
+    def __init__(self):
+        self.hold_minutes = settings.TICKET_HOLD_MINUTES
+        self.retention_hours = settings.TICKET_HOLD_RETENTION_HOURS
+
+    def _purge_at(self) -> datetime:
+        return datetime.utcnow() + timedelta(hours=self.retention_hours)
+
+    def _cached_shards(self, event_id: ObjectId) -> int:
+        entry = self._sharded_events.get(event_id)
+        if entry is None:
+            return 0
+        shards, expires_at = entry
+        if expires_at <= time.monotonic():
+            self._sharded_events.pop(event_id, None)
+            return 0
+        return shards
+
+    def _remember_shards(self, event_id: ObjectId, shards: int) -> None:
+        self._sharded_events[event_id] = (shards, time.monotonic() + settings.INVENTORY_SHARD_CACHE_SECONDS)
+
+    def forget(self, event_id: ObjectId) -> None:
+        """
+        Drop an event from the sharded-event cache
+        """
+        self._sharded_events.pop(event_id, None)
+
+    async def _shard_count(self, db, event_id: ObjectId) -> int:
+        shards = self._cached_shards(event_id)
+        if shards:
+            return shards
+        event = await db.events.find_one({"_id": event_id}, projection={"inventory_shards": 1})
+        shards = (event or {}).get("inventory_shards") or 0
+        if shards:
+            self._remember_shards(event_id, shards)
+        return shards
+
+    async def _take_stock(
+        self,
+        db,
+        event_id: ObjectId,
+        ticket_type_name: str,
+        quantity: int
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Decrement stock if enough is left.
+
+        Returns the ticket type as it was, with an "allocations" list when the
+        stock came from shards, or None when there is not enough stock.
+        """
+        if self._cached_shards(event_id):
+            return await self._take_shard_stock(db, event_id, ticket_type_name, quantity)
+
+        event = await db.events.find_one_and_update(
+            {
+                "_id": event_id,
+                "inventory_shards": {"$not": {"$gt": 0}},
+                "ticket_types": {
+                    "$elemMatch": {
+                        "name": ticket_type_name,
+                        "quantity": {"$gte": quantity},
+                        "is_available": {"$ne": False}
+                    }
+                }
+            },
+            {"$inc": {"ticket_types.$.quantity": -quantity, "remaining_total": -quantity}},
+            projection={"ticket_types": 1, "remaining_total": 1}
+        )
+        if not event:
+            # The event may have been switched to sharded mode
+            if await self._shard_count(db, event_id):
+                return await self._take_shard_stock(db, event_id, ticket_type_name, quantity)
+            return None
+        # remaining_total is kept exact by the $inc; sold_out only changes at zero
+        # (and events from before the summary fields need a full recompute)
+        if event.get("remaining_total") is None or event["remaining_total"] - quantity <= 0:
+            await refresh_event_summary(db, event_id)
+        return next(
+            (tt for tt in event["ticket_types"] if tt["name"] == ticket_type_name),
+            None
+        )
+
+    async def _take_shard_stock(
+        self,
+        db,
+        event_id: ObjectId,
+        ticket_type_name: str,
+        quantity: int
+    ) -> Optional[Dict[str, Any]]:
+        shard_filter = {
+            "event_id": event_id,
+            "ticket_type_name": ticket_type_name,
+            "is_available": {"$ne": False}
+        }
+        shards = list(range(await self._shard_count(db, event_id)))
+        random.shuffle(shards)
+
+        # Fast path: the whole quantity from one shard
+        for shard in shards:
+            doc = await db.inventory_shards.find_one_and_update(
+                dict(shard_filter, shard=shard, quantity={"$gte": quantity}),
+                {"$inc": {"quantity": -quantity}},
+                projection={"price": 1}
+            )
+            if doc:
+                return {
+                    "name": ticket_type_name,
+                    "price": doc["price"],
+                    "allocations": [{"shard": shard, "quantity": quantity}]
+                }
+
+        # Stock is fragmented: gather it from several shards
+        allocations = []
+        remaining = quantity
+        price = None
+        async for doc in db.inventory_shards.find(
+            dict(shard_filter, quantity={"$gt": 0}),
+            projection={"shard": 1, "quantity": 1, "price": 1}
+        ):
+            take = min(remaining, doc["quantity"])
+            result = await db.inventory_shards.update_one(
+                {"_id": doc["_id"], "quantity": {"$gte": take}},
+                {"$inc": {"quantity": -take}}
+            )
+            if result.modified_count:
+                allocations.append({"shard": doc["shard"], "quantity": take})
+                price = doc["price"]
+                remaining -= take
+            if remaining == 0:
+                return {"name": ticket_type_name, "price": price, "allocations": allocations}
+
+        for allocation in allocations:
+            await self._return_shard_stock(db, event_id, ticket_type_name, allocation)
+        return None
+
+    async def _return_shard_stock(
+        self,
+        db,
+        event_id: ObjectId,
+        ticket_type_name: str,
+        allocation: Dict[str, Any]
+    ) -> None:
+        await db.inventory_shards.update_one(
+            {"event_id": event_id, "ticket_type_name": ticket_type_name, "shard": allocation["shard"]},
+            {"$inc": {"quantity": allocation["quantity"]}}
+        )
+
+    async def _return_stock(self, db, hold: Dict[str, Any]) -> None:
+        if hold.get("allocations"):
+            for allocation in hold["allocations"]:
+                await self._return_shard_stock(db, hold["event_id"], hold["ticket_type_name"], allocation)
+            return
+
+        result = await db.events.update_one(
+            {
+                "_id": hold["event_id"],
+                "inventory_shards": {"$not": {"$gt": 0}},
+                "ticket_types.name": hold["ticket_type_name"]
+            },
+            {"$inc": {"ticket_types.$.quantity": hold["quantity"]}}
+        )
+        if result.matched_count:
+            await refresh_event_summary(db, hold["event_id"])
+        else:
+            # Held before the event was sharded: the stock now lives in the shards
+            shards = await self._shard_count(db, hold["event_id"])
+            if shards:
+                await self._return_shard_stock(
+                    db,
+                    hold["event_id"],
+                    hold["ticket_type_name"],
+                    {"shard": random.randrange(shards), "quantity": hold["quantity"]}
+                )
+
+    async def _record_sale(self, db, hold: Dict[str, Any]) -> None:
+        if hold.get("allocations"):
+            # Accumulate on the shard; the reconciler moves it to the event
+            await db.inventory_shards.update_one(
+                {
+                    "event_id": hold["event_id"],
+                    "ticket_type_name": hold["ticket_type_name"],
+                    "shard": hold["allocations"][0]["shard"]
+                },
+                {
+                    "$inc": {
+                        "pending_sold": hold["quantity"],
+                        "pending_revenue": hold["price"] * hold["quantity"]
+                    }
+                }
+            )
+            return
+        await db.events.update_one(
+            {"_id": hold["event_id"]},
+            {
+                "$inc": {
+                    "total_tickets_sold": hold["quantity"],
+                    "total_revenue": hold["price"] * hold["quantity"]
+                }
+            }
+        )
+
+    async def reserve(
+        self,
+        db,
+        event_id: ObjectId,
+        ticket_type_name: str,
+        quantity: int,
+        reference: str
+    ) -> Dict[str, Any]:
+        """
+        Reserve stock for a ticket type and record a hold for it
+        """
+        ticket_type = await self._take_stock(db, event_id, ticket_type_name, quantity)
+        if ticket_type is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Not enough tickets available for {ticket_type_name}"
+            )
+
+        now = datetime.utcnow()
+        hold = {
+            "event_id": event_id,
+            "ticket_type_name": ticket_type_name,
+            "quantity": quantity,
+            "price": ticket_type["price"],
+            "reference": reference,
+            "status": HOLD_ACTIVE,
+            "created_at": now,
+            "expires_at": now + timedelta(minutes=self.hold_minutes)
+        }
+        if ticket_type.get("allocations"):
+            hold["allocations"] = ticket_type["allocations"]
+        try:
+            result = await db.ticket_holds.insert_one(hold)
+        except Exception:
+            await self._return_stock(db, hold)
+            raise
+        hold["_id"] = result.inserted_id
+        return hold
+
+    async def reserve_many(
+        self,
+        db,
+        event_id: ObjectId,
+        items: List[Tuple[str, int]],
+        reference: str
+    ) -> List[Dict[str, Any]]:
+        """
+        Reserve several ticket types at once; nothing is held if any of them fails
+        """
+        holds = []
+        try:
+            for ticket_type_name, quantity in items:
+                holds.append(await self.reserve(db, event_id, ticket_type_name, quantity, reference))
+        except Exception:
+            for hold in holds:
+                await self.release(db, hold["_id"])
+            raise
+        return holds
+
+    async def confirm(
+        self,
+        db,
+        event_id: ObjectId,
+        ticket_type_name: str,
+        quantity: int,
+        reference: str
+    ) -> Dict[str, Any]:
+        """
+        Commit the active hold for reference, reserving fresh stock if it has lapsed.
+
+        Calling it again for a hold that is already committed returns that hold.
+        """
+        hold = await db.ticket_holds.find_one_and_update(
+            {
+                "reference": reference,
+                "ticket_type_name": ticket_type_name,
+                "status": HOLD_ACTIVE
+            },
+            {
+                "$set": {
+                    "status": HOLD_COMMITTED,
+                    "committed_at": datetime.utcnow(),
+                    "purge_at": self._purge_at()
+                }
+            },
+            return_document=ReturnDocument.AFTER
+        )
+        if hold is None:
+            # A retried fulfillment: the hold was committed on the earlier attempt
+            committed = await db.ticket_holds.find_one({
+                "reference": reference,
+                "ticket_type_name": ticket_type_name,
+                "status": HOLD_COMMITTED
+            })
+            if committed is not None:
+                return committed
+            logger.warning(f"No active hold for {reference}/{ticket_type_name}, reserving again")
+            try:
+                hold = await self.reserve(db, event_id, ticket_type_name, quantity, reference)
+            except HTTPException:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail=f"Tickets for {ticket_type_name} sold out before payment was confirmed"
+                )
+            await db.ticket_holds.update_one(
+                {"_id": hold["_id"]},
+                {
+                    "$set": {
+                        "status": HOLD_COMMITTED,
+                        "committed_at": datetime.utcnow(),
+                        "purge_at": self._purge_at()
+                    }
+                }
+            )
+
+        await self._record_sale(db, hold)
+        return hold
+
+    async def release(self, db, hold_id: ObjectId) -> bool:
+        """
+        Release an active hold and return its stock
+        """
+        hold = await db.ticket_holds.find_one_and_update(
+            {"_id": hold_id, "status": HOLD_ACTIVE},
+            {
+                "$set": {
+                    "status": HOLD_RELEASED,
+                    "released_at": datetime.utcnow(),
+                    "purge_at": self._purge_at()
+                }
+            }
+        )
+        if hold is None:
+            return False
+        await self._return_stock(db, hold)
+        return True
+
+    async def release_reference(self, db, reference: str) -> int:
+        """
+        Release every active hold recorded under a reference
+        """
+        released = 0
+        async for hold in db.ticket_holds.find(
+            {"reference": reference, "status": HOLD_ACTIVE},
+            projection={"_id": 1}
+        ):
+            if await self.release(db, hold["_id"]):
+                released += 1
+        return released
+
+    async def release_expired(self, db, limit: int = 500) -> int:
+        """
+        Release holds whose expiry has passed; safe to run from every worker
+        """
+        released = 0
+        while released < limit:
+            hold = await db.ticket_holds.find_one_and_update(
+                {"status": HOLD_ACTIVE, "expires_at": {"$lt": datetime.utcnow()}},
+                {
+                    "$set": {
+                        "status": HOLD_RELEASED,
+                        "released_at": datetime.utcnow(),
+                        "purge_at": self._purge_at()
+                    }
+                }
+            )
+            if hold is None:
+                break
+            await self._return_stock(db, hold)
+            released += 1
+        if released:
+            logger.info(f"Released {released} expired ticket holds")
+        return released
+
+    async def run_expiry_sweeper(self, db, interval: Optional[float] = None) -> None:
+        """
+        Periodically release expired holds until cancelled
+        """
+        interval = interval or settings.TICKET_HOLD_SWEEP_SECONDS
+        while True:
+            try:
+                await self.release_expired(db)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error releasing expired ticket holds: {str(e)}")
+            await asyncio.sleep(interval)
+
+    async def enable_sharding(self, db, event_id: ObjectId, shards: int) -> Dict[str, Any]:
+        """
+        Split the remaining stock of every ticket type across shard documents
+        """
+        # Setting the flag and reading the quantities happen in one atomic
+        # update, so no single-document reservation can slip in between
+        event = await db.events.find_one_and_update(
+            {"_id": event_id, "inventory_shards": {"$not": {"$gt": 0}}},
+            {"$set": {"inventory_shards": shards, "updated_at": datetime.utcnow()}},
+            projection={"ticket_types": 1}
+        )
+        if not event:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Event not found or inventory already sharded"
+            )
+
+        documents = []
+        for ticket_type in event.get("ticket_types", []):
+            base, extra = divmod(ticket_type["quantity"], shards)
+            for shard in range(shards):
+                documents.append({
+                    "event_id": event_id,
+                    "ticket_type_name": ticket_type["name"],
+                    "shard": shard,
+                    "quantity": base + (1 if shard < extra else 0),
+                    "price": ticket_type["price"],
+                    "is_available": ticket_type.get("is_available", True),
+                    "pending_sold": 0,
+                    "pending_revenue": 0.0
+                })
+        if documents:
+            await db.inventory_shards.insert_many(documents)
+        self._remember_shards(event_id, shards)
+        logger.info(f"Sharded inventory for event {event_id} across {shards} counters")
+        return {"event_id": str(event_id), "shards": shards, "counters": len(documents)}
+
+    async def set_availability(
+        self,
+        db,
+        event_id: ObjectId,
+        ticket_type_name: str,
+        is_available: bool
+    ) -> bool:
+        """
+        Open or close sales of a ticket type, on the event and on its stock shards
+        """
+        result = await db.events.update_one(
+            {"_id": event_id, "ticket_types.name": ticket_type_name},
+            {"$set": {"ticket_types.$.is_available": is_available, "updated_at": datetime.utcnow()}}
+        )
+        if not result.matched_count:
+            return False
+        await db.inventory_shards.update_many(
+            {"event_id": event_id, "ticket_type_name": ticket_type_name, "is_available": {"$ne": is_available}},
+            {"$set": {"is_available": is_available}}
+        )
+        await refresh_event_summary(db, event_id)
+        return True
+
+    async def _sync_shard_availability(self, db, event_id: ObjectId) -> None:
+        """
+        Copy each ticket type's is_available from the event onto its shards
+        """
+        event = await db.events.find_one(
+            {"_id": event_id},
+            projection={"ticket_types.name": 1, "ticket_types.is_available": 1}
+        )
+        for ticket_type in (event or {}).get("ticket_types", []):
+            is_available = ticket_type.get("is_available", True)
+            await db.inventory_shards.update_many(
+                {
+                    "event_id": event_id,
+                    "ticket_type_name": ticket_type["name"],
+                    "is_available": {"$ne": is_available}
+                },
+                {"$set": {"is_available": is_available}}
+            )
+
+    async def reconcile_shards(self, db, event_id: ObjectId) -> None:
+        """
+        Fold shard counters back into the event document
+        """
+        await self._sync_shard_availability(db, event_id)
+        quantities: Dict[str, int] = {}
+        sold = 0
+        revenue = 0.0
+        async for shard in db.inventory_shards.find({"event_id": event_id}, projection={"_id": 1}):
+            # Swap the pending sales out atomically so concurrent sales are never lost
+            doc = await db.inventory_shards.find_one_and_update(
+                {"_id": shard["_id"]},
+                {"$set": {"pending_sold": 0, "pending_revenue": 0.0}}
+            )
+            quantities[doc["ticket_type_name"]] = quantities.get(doc["ticket_type_name"], 0) + doc["quantity"]
+            sold += doc.get("pending_sold", 0)
+            revenue += doc.get("pending_revenue", 0.0)
+
+        if not quantities:
+            return
+        update: Dict[str, Any] = {
+            "$set": {
+                f"ticket_types.$[t{i}].quantity": quantity
+                for i, quantity in enumerate(quantities.values())
+            }
+        }
+        if sold or revenue:
+            update["$inc"] = {"total_tickets_sold": sold, "total_revenue": revenue}
+        await db.events.update_one(
+            {"_id": event_id},
+            update,
+            array_filters=[{f"t{i}.name": name} for i, name in enumerate(quantities)]
+        )
+        await refresh_event_summary(db, event_id)
+
+    async def run_shard_reconciler(self, db, interval: Optional[float] = None) -> None:
+        """
+        Periodically reconcile every sharded event until cancelled
+        """
+        interval = interval or settings.INVENTORY_SHARD_RECONCILE_SECONDS
+        while True:
+            try:
+                sharded = {}
+                # Served by the partial inventory_shards index, which only holds sharded events
+                async for event in db.events.find(
+                    {"inventory_shards": {"$gt": 0}},
+                    projection={"_id": 1, "inventory_shards": 1}
+                ):
+                    sharded[event["_id"]] = event["inventory_shards"]
+                    await self.reconcile_shards(db, event["_id"])
+                self._sharded_events.clear()
+                for event_id, shards in sharded.items():
+                    self._remember_shards(event_id, shards)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error reconciling inventory shards: {str(e)}")
+            await asyncio.sleep(interval)
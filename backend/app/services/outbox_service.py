@@ -0,0 +1,152 @@
+import socket
+import os
+import uuid
+from datetime import datetime, timedelta
+from enum import Enum
+from typing import Any, Dict, Optional
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from app.core.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxStatus(str, Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    DEAD = "dead"
+
+
+# Job kinds handled by app.worker
+JOB_TICKET_ISSUED = "ticket_issued"
+JOB_TICKET_EMAIL = "ticket_email"
+JOB_TICKET_SMS = "ticket_sms"
+JOB_IMAGE_VARIANTS = "image_variants"
+
+OUTBOX_INDEXES = [
+    [("status", 1), ("run_at", 1)],
+    [("status", 1), ("lease_until", 1)],
+    {
+        "keys": [("dedupe_key", 1)],
+        "unique": True,
+        "partialFilterExpression": {"dedupe_key": {"$type": "string"}}
+    },
+    # Finished jobs are removed once their retention period is over
+    {"keys": [("purge_at", 1)], "expireAfterSeconds": 0}
+]
+
+
+class OutboxService:
+    """
+    Durable job queue for notification work, stored in the outbox collection.
+
+    Request handlers only enqueue jobs; the worker process (`python -m
+    app.worker`) claims them with a single find_one_and_update that sets a
+    lease, so a job is run by one worker at a time and is picked up again if
+    that worker dies. Every claim gets its own lease token; a worker whose
+    lease ran out and was taken over can no longer complete or fail the job.
+    Failed jobs are retried with exponential backoff until
+    OUTBOX_MAX_ATTEMPTS, after which they are parked as dead.
+    """
+
+    def __init__(self):
+        self.lease = timedelta(seconds=settings.OUTBOX_LEASE_SECONDS)
+        self.max_attempts = settings.OUTBOX_MAX_ATTEMPTS
+        self.backoff_seconds = settings.OUTBOX_BACKOFF_SECONDS
+        self.backoff_max_seconds = settings.OUTBOX_BACKOFF_MAX_SECONDS
+        self.retention = timedelta(hours=settings.OUTBOX_RETENTION_HOURS)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+    async def enqueue(
+        self,
+        db,
+        kind: str,
+        payload: Dict[str, Any],
+        dedupe_key: Optional[str] = None,
+        run_at: Optional[datetime] = None
+    ) -> Optional[ObjectId]:
+        """
+        Add a job to the outbox; a job with the same dedupe_key is only added once
+        """
+        now = datetime.utcnow()
+        job = {
+            "kind": kind,
+            "payload": payload,
+            "status": OutboxStatus.PENDING,
+            "attempts": 0,
+            "run_at": run_at or now,
+            "created_at": now,
+            "updated_at": now
+        }
+        if dedupe_key:
+            job["dedupe_key"] = dedupe_key
+        try:
+            result = await db.outbox.insert_one(job)
+        except DuplicateKeyError:
+            logger.info(f"Outbox job {dedupe_key} already queued")
+            return None
+        return result.inserted_id
+
+    async def claim(self, db) -> Optional[Dict[str, Any]]:
+        """
+        Lease the next due job, or one whose previous lease ran out
+        """
+        now = datetime.utcnow()
+        return await db.outbox.find_one_and_update(
+            {
+                "$or": [
+                    {"status": OutboxStatus.PENDING, "run_at": {"$lte": now}},
+                    {"status": OutboxStatus.RUNNING, "lease_until": {"$lte": now}}
+                ]
+            },
+            {
+                "$set": {
+                    "status": OutboxStatus.RUNNING,
+                    "lease_until": now + self.lease,
+                    "worker_id": self.worker_id,
+                    "lease_token": uuid.uuid4().hex,
+                    "updated_at": now
+                },
+                "$inc": {"attempts": 1}
+            },
+            sort=[("run_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def complete(self, db, job: Dict[str, Any]) -> None:
+        now = datetime.utcnow()
+        await db.outbox.update_one(
+            {"_id": job["_id"], "lease_token": job["lease_token"]},
+            {
+                "$set": {
+                    "status": OutboxStatus.DONE,
+                    "completed_at": now,
+                    "updated_at": now,
+                    "purge_at": now + self.retention
+                },
+                "$unset": {"lease_until": "", "lease_token": ""}
+            }
+        )
+
+    async def fail(self, db, job: Dict[str, Any], error: str) -> None:
+        """
+        Schedule a retry with exponential backoff, or park the job once it is out of attempts
+        """
+        now = datetime.utcnow()
+        update: Dict[str, Any] = {"last_error": error[:1000], "updated_at": now}
+        if job["attempts"] >= self.max_attempts:
+            update["status"] = OutboxStatus.DEAD
+            update["purge_at"] = now + self.retention
+            logger.error(f"Outbox job {job['_id']} ({job['kind']}) gave up after {job['attempts']} attempts: {error}")
+        else:
+            delay = min(self.backoff_max_seconds, self.backoff_seconds * 2 ** (job["attempts"] - 1))
+            update["status"] = OutboxStatus.PENDING
+            update["run_at"] = now + timedelta(seconds=delay)
+            logger.warning(f"Outbox job {job['_id']} ({job['kind']}) failed, retrying in {delay}s: {error}")
+        await db.outbox.update_one(
+            {"_id": job["_id"], "lease_token": job["lease_token"]},
+            {"$set": update, "$unset": {"lease_until": "", "lease_token": ""}}
+        )
@@ -1,62 +1,167 @@
 import qrcode
+import qrcode.image.svg
 import io
 import base64
 import hmac
 import hashlib
 import time
+import asyncio
+import multiprocessing
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from app.core.config import settings
-from typing import Dict
+from typing import Dict, List, Optional, Tuple
 from PIL import Image
 
+# Rendered image formats and their content types
+QR_FORMATS = {
+    "png": "image/png",
+    "svg": "image/svg+xml"
+}
+
+def render_qr(payload: str, image_format: str = "png", target_size: int = 300, border: int = 4) -> bytes:
+    """
+    Render a payload as PNG or SVG bytes.
+
+    Uses the smallest QR version that fits the payload at the lowest error
+    correction level, and the largest box size that keeps the image within
+    target_size pixels. Module-level so it can run in a worker process.
+    """
+    qr = qrcode.QRCode(
+        version=None,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        border=border,
+    )
+    qr.add_data(payload)
+    qr.make(fit=True)
+    qr.box_size = max(1, target_size // (qr.modules_count + 2 * border))
+
+    buffered = io.BytesIO()
+    if image_format == "svg":
+        qr.make_image(image_factory=qrcode.image.svg.SvgPathImage).save(buffered)
+    else:
+        qr.make_image(fill_color="black", back_color="white").save(buffered, format="PNG")
+    return buffered.getvalue()
+
 class QRService:
+    # Per-process LRU of rendered images: (payload, format) -> bytes
+    _images: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+    # Rendering is CPU-bound, so it runs in a process pool shared by all instances
+    _pool: Optional[ProcessPoolExecutor] = None
+
     def __init__(self):
-        self.secret_key = settings.JWT_SECRET_KEY
+        self.secret_key = settings.QR_SIGNING_KEY
+        # Retired keys: payloads they signed still validate, nothing new is signed with them
+        self.previous_keys = [
+            key.strip() for key in settings.QR_PREVIOUS_SIGNING_KEYS.split(",") if key.strip()
+        ]
+        self.cache_size = settings.QR_IMAGE_CACHE_SIZE
+        self.target_size = settings.QR_TARGET_SIZE
+        self.border = settings.QR_BORDER
 
-    def generate_signature(self, data: str) -> str:
+    @classmethod
+    def get_pool(cls) -> ProcessPoolExecutor:
+        if cls._pool is None:
+            workers = settings.QR_RENDER_WORKERS or os.cpu_count() or 1
+            # spawn: never fork a process that is running an event loop and driver threads
+            cls._pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return cls._pool
+
+    @classmethod
+    def shutdown_pool(cls) -> None:
+        if cls._pool is not None:
+            cls._pool.shutdown(wait=False, cancel_futures=True)
+            cls._pool = None
+
+    def generate_signature(self, data: str, key: Optional[str] = None) -> str:
         """
-        Generate HMAC signature for the data
+        Generate HMAC signature for the data (with the current QR key unless given one)
         """
         return hmac.new(
-            self.secret_key.encode(),
+            (key or self.secret_key).encode(),
             data.encode(),
             hashlib.sha256
         ).hexdigest()
 
+    def signer(self) -> "hmac.HMAC":
+        """
+        Incremental HMAC with the QR key, for signing streamed documents
+        """
+        return hmac.new(self.secret_key.encode(), digestmod=hashlib.sha256)
+
+    def build_payload(self, ticket_id: str, event_id: str) -> str:
+        """
+        Signed string encoded in a ticket's QR code: ticket_id:event_id:timestamp:signature
+        """
+        data_str = f"{ticket_id}:{event_id}:{int(time.time())}"
+        signature = self.generate_signature(data_str)
+        return f"{data_str}:{signature}"
+
+    def render_uncached(self, payload: str, image_format: str = "png") -> bytes:
+        """
+        Render a QR payload in the calling process
+        """
+        return render_qr(payload, image_format, self.target_size, self.border)
+
+    def get_cached(self, payload: str, image_format: str = "png") -> Optional[bytes]:
+        key = (payload, image_format)
+        image = self._images.get(key)
+        if image is not None:
+            self._images.move_to_end(key)
+        return image
+
+    def cache_image(self, payload: str, image_format: str, image: bytes) -> None:
+        self._images[(payload, image_format)] = image
+        while len(self._images) > self.cache_size:
+            self._images.popitem(last=False)
+
+    def render(self, payload: str, image_format: str = "png") -> bytes:
+        """
+        Render a QR payload, reusing recently rendered images
+        """
+        image = self.get_cached(payload, image_format)
+        if image is None:
+            image = self.render_uncached(payload, image_format)
+            self.cache_image(payload, image_format, image)
+        return image
+
+    async def render_async(self, payload: str, image_format: str = "png") -> bytes:
+        """
+        Render a QR payload in the process pool, reusing recently rendered images
+        """
+        return (await self.generate_many([payload], image_format))[0]
+
+    async def generate_many(self, payloads: List[str], image_format: str = "png") -> List[bytes]:
+        """
+        Render several payloads in parallel across the process pool; results keep input order
+        """
+        images: List[Optional[bytes]] = [self.get_cached(payload, image_format) for payload in payloads]
+        missing = [i for i, image in enumerate(images) if image is None]
+        if missing:
+            loop = asyncio.get_running_loop()
+            pool = self.get_pool()
+            rendered = await asyncio.gather(*(
+                loop.run_in_executor(
+                    pool, render_qr, payloads[i], image_format, self.target_size, self.border
+                )
+                for i in missing
+            ))
+            for i, image in zip(missing, rendered):
+                images[i] = image
+                self.cache_image(payloads[i], image_format, image)
+        return images
+
     def generate_qr_code(self, ticket_id: str, event_id: str) -> str:
         """
         Generate QR code for a ticket
         """
         try:
-            # Prepare data for QR code
-            data = {
-                "ticket_id": ticket_id,
-                "event_id": event_id,
-                "timestamp": str(int(time.time()))
-            }
-            
-            # Convert data to string and add signature
-            data_str = f"{data['ticket_id']}:{data['event_id']}:{data['timestamp']}"
-            signature = self.generate_signature(data_str)
-            data_str = f"{data_str}:{signature}"
-            
-            # Generate QR code
-            qr = qrcode.QRCode(
-                version=1,
-                error_correction=qrcode.constants.ERROR_CORRECT_L,
-                box_size=10,
-                border=4,
-            )
-            qr.add_data(data_str)
-            qr.make(fit=True)
-            
-            # Create QR code image
-            img = qr.make_image(fill_color="black", back_color="white")
-            
-            # Convert to base64
-            buffered = io.BytesIO()
-            img.save(buffered, format="PNG")
-            img_str = base64.b64encode(buffered.getvalue()).decode()
-            
+            png = self.render(self.build_payload(ticket_id, event_id))
+            img_str = base64.b64encode(png).decode()
             return f"data:image/png;base64,{img_str}"
         except Exception as e:
             print(f"Error generating QR code: {str(e)}")
@@ -64,7 +169,25 @@ class QRService:
 
     def validate_qr_code(self, data: str, signature: str) -> bool:
         """
-        Validate QR code data
+        Validate QR code data against the current and previous QR keys
         """
-        expected_signature = self.generate_signature(data)
-        return hmac.compare_digest(signature, expected_signature) 
\ No newline at end of file
+        return any(
+            hmac.compare_digest(signature, self.generate_signature(data, key))
+            for key in [self.secret_key, *self.previous_keys]
+        )
+
+    def parse_payload(self, payload: str) -> Optional[Tuple[str, str, int]]:
+        """
+        Split a scanned payload into (ticket_id, event_id, issued_at); None if it is malformed or forged
+        """
+        data, _, signature = payload.strip().rpartition(":")
+        parts = data.split(":")
+        if len(parts) != 3 or not signature:
+            return None
+        if not self.validate_qr_code(data, signature):
+            return None
+        ticket_id, event_id, issued_at = parts
+        try:
+            return ticket_id, event_id, int(issued_at)
+        except ValueError:
+            return None
@@ -0,0 +1,313 @@
+import asyncio
+import hashlib
+import json
+from collections import OrderedDict
+from datetime import datetime, timezone
+from enum import Enum
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ReturnDocument, UpdateOne
+from app.core.config import settings
+from app.services.qr_service import QRService
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Ticket states a door device needs to know about in a full manifest
+MANIFEST_STATUSES = ["paid", "used"]
+MANIFEST_OVERLAP_MS = 5000
+
+
+def to_version(moment: datetime) -> int:
+    """
+    Manifest version of a naive UTC datetime: milliseconds since the epoch
+    """
+    return int(moment.replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def from_version(version: int) -> datetime:
+    return datetime.fromtimestamp(version / 1000, tz=timezone.utc).replace(tzinfo=None)
+
+
+class ScanResult(str, Enum):
+    ADMITTED = "admitted"
+    ALREADY_USED = "already_used"
+    INVALID = "invalid"
+    WRONG_EVENT = "wrong_event"
+    NOT_FOUND = "not_found"
+    NOT_PAID = "not_paid"
+
+
+class ScanService:
+    """
+    Gate check-in for ticket QR codes.
+
+    A scan verifies the HMAC of the QR payload, then flips the ticket from
+    paid to used with one conditional update, so two gates scanning the same
+    ticket cannot both admit it. Each process keeps the ids of used tickets
+    per event (loaded from the database the first time the event is
+    scanned), so repeat scans are rejected without a database round trip.
+    Tickets used through another process are found by the conditional
+    update and added to the set then.
+    """
+
+    # Per-process used-ticket ids: event_id -> set of ticket ids, least recently scanned event first
+    _used: "OrderedDict[str, Set[str]]" = OrderedDict()
+    _loading: Dict[str, asyncio.Lock] = {}
+
+    def __init__(self):
+        self.qr_service = QRService()
+        self.max_events = settings.SCAN_INDEX_MAX_EVENTS
+
+    async def _used_set(self, db, event_id: str) -> Set[str]:
+        used = self._used.get(event_id)
+        if used is not None:
+            self._used.move_to_end(event_id)
+            return used
+        lock = self._loading.setdefault(event_id, asyncio.Lock())
+        async with lock:
+            used = self._used.get(event_id)
+            if used is None:
+                used = {
+                    str(ticket["_id"])
+                    async for ticket in db.tickets.find(
+                        {"event_id": event_id, "status": "used"},
+                        projection={"_id": 1}
+                    )
+                }
+                self._used[event_id] = used
+                while len(self._used) > self.max_events:
+                    evicted, _ = self._used.popitem(last=False)
+                    self._loading.pop(evicted, None)
+                logger.info(f"Loaded {len(used)} used tickets for event {event_id}")
+        return used
+
+    def forget(self, event_id: str, ticket_id: str) -> None:
+        """
+        Drop a ticket from this process's used set, e.g. after an admin changes its status
+        """
+        used = self._used.get(str(event_id))
+        if used is not None:
+            used.discard(str(ticket_id))
+
+    async def scan(
+        self,
+        db,
+        payload: str,
+        event_id: Optional[str] = None,
+        gate: Optional[str] = None,
+        scanned_by: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Check a ticket in; returns the scan result and, when known, the ticket
+        """
+        parsed = self.qr_service.parse_payload(payload)
+        if parsed is None:
+            return {"result": ScanResult.INVALID}
+        ticket_id, ticket_event_id, _ = parsed
+        outcome: Dict[str, Any] = {"ticket_id": ticket_id, "event_id": ticket_event_id}
+        if event_id and event_id != ticket_event_id:
+            return {**outcome, "result": ScanResult.WRONG_EVENT}
+
+        used = await self._used_set(db, ticket_event_id)
+        if ticket_id in used:
+            return {**outcome, "result": ScanResult.ALREADY_USED}
+
+        try:
+            ticket_oid = ObjectId(ticket_id)
+        except InvalidId:
+            return {**outcome, "result": ScanResult.INVALID}
+
+        now = datetime.utcnow()
+        ticket = await db.tickets.find_one_and_update(
+            {"_id": ticket_oid, "status": "paid"},
+            {
+                "$set": {
+                    "status": "used",
+                    "used_at": now,
+                    "used_gate": gate,
+                    "used_by": scanned_by,
+                    "updated_at": now
+                }
+            },
+            projection={"ticket_type_name": 1, "quantity": 1, "buyer_name": 1, "used_at": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if ticket:
+            used.add(ticket_id)
+            return {**outcome, **self._ticket_fields(ticket), "result": ScanResult.ADMITTED}
+
+        # Not admitted: find out why
+        ticket = await db.tickets.find_one(
+            {"_id": ticket_oid},
+            projection={"ticket_type_name": 1, "quantity": 1, "buyer_name": 1, "status": 1, "used_at": 1}
+        )
+        if not ticket:
+            return {**outcome, "result": ScanResult.NOT_FOUND}
+        if ticket.get("status") == "used":
+            used.add(ticket_id)
+            return {**outcome, **self._ticket_fields(ticket), "result": ScanResult.ALREADY_USED}
+        return {**outcome, **self._ticket_fields(ticket), "result": ScanResult.NOT_PAID}
+
+    async def manifest(self, db, event_id: str, since: Optional[int] = None) -> AsyncIterator[bytes]:
+        """
+        Stream an NDJSON manifest of an event's tickets for offline door devices.
+
+        The first line describes the manifest, then one line per ticket
+        ({"id", "s": status, "h": digest of the current QR payload, "v":
+        version}), then a trailer with the count, the version to ask for next
+        time and an HMAC-SHA256 (QR key) over every preceding byte. Without
+        since, only paid and used tickets are listed; with since, every ticket
+        changed at or after that version is, so cancellations reach devices.
+        """
+        signer = self.qr_service.signer()
+        if since is None:
+            query: Dict[str, Any] = {"event_id": event_id, "status": {"$in": MANIFEST_STATUSES}}
+            cursor = db.tickets.find(query, projection={"status": 1, "qr_payload": 1, "updated_at": 1})
+        else:
+            query = {"event_id": event_id, "updated_at": {"$gte": from_version(since)}}
+            cursor = db.tickets.find(
+                query, projection={"status": 1, "qr_payload": 1, "updated_at": 1}
+            ).sort("updated_at", 1)
+
+        # Writes stamp updated_at before they commit, so the next delta starts a
+        # little before now; re-sent entries are harmless to devices
+        version = to_version(datetime.utcnow()) - MANIFEST_OVERLAP_MS
+        header = {
+            "type": "manifest",
+            "event_id": event_id,
+            "since": since,
+            "generated_at": version
+        }
+        line = (json.dumps(header, separators=(",", ":")) + "\n").encode()
+        signer.update(line)
+        yield line
+
+        count = 0
+        async for ticket in cursor:
+            entry: Dict[str, Any] = {"id": str(ticket["_id"]), "s": ticket.get("status")}
+            if ticket.get("qr_payload"):
+                entry["h"] = hashlib.sha256(ticket["qr_payload"].encode()).hexdigest()[:16]
+            if ticket.get("updated_at"):
+                entry["v"] = to_version(ticket["updated_at"])
+            line = (json.dumps(entry, separators=(",", ":")) + "\n").encode()
+            signer.update(line)
+            count += 1
+            yield line
+
+        trailer = {"type": "end", "count": count, "version": version, "signature": signer.hexdigest()}
+        yield (json.dumps(trailer, separators=(",", ":")) + "\n").encode()
+
+    async def replay(
+        self,
+        db,
+        event_id: str,
+        scans: List[Dict[str, Any]],
+        device_id: str,
+        uploaded_by: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Apply scans recorded offline by a door device; returns one result per scan, in input order.
+
+        The earliest scan of a ticket wins, wherever it was made: a paid ticket
+        is marked used at its scan time, and a ticket already used later than
+        an uploaded scan has its check-in moved back to that scan. Every other
+        scan of the ticket is reported as already_used. The batch costs one
+        read, one bulk write and one read back.
+        """
+        results: List[Dict[str, Any]] = [None] * len(scans)
+        earliest: Dict[str, int] = {}
+        for i, scan in enumerate(scans):
+            parsed = self.qr_service.parse_payload(scan["payload"])
+            if parsed is None or not ObjectId.is_valid(parsed[0]):
+                results[i] = {"result": ScanResult.INVALID}
+                continue
+            ticket_id, ticket_event_id, _ = parsed
+            if ticket_event_id != event_id:
+                results[i] = {"ticket_id": ticket_id, "result": ScanResult.WRONG_EVENT}
+                continue
+            # Mongo stores milliseconds; truncate so stored and uploaded times compare equal
+            scanned_at = scan["scanned_at"]
+            if scanned_at.tzinfo is not None:
+                scanned_at = scanned_at.astimezone(timezone.utc).replace(tzinfo=None)
+            scan["scanned_at"] = scanned_at.replace(microsecond=scanned_at.microsecond // 1000 * 1000)
+            results[i] = {"ticket_id": ticket_id}
+            current = earliest.get(ticket_id)
+            if current is None or scan["scanned_at"] < scans[current]["scanned_at"]:
+                earliest[ticket_id] = i
+
+        if earliest:
+            ids = [ObjectId(ticket_id) for ticket_id in earliest]
+            projection = {"status": 1, "used_at": 1, "used_gate": 1, "used_device": 1}
+            existing = {
+                str(ticket["_id"]): ticket
+                async for ticket in db.tickets.find({"_id": {"$in": ids}}, projection=projection)
+            }
+            now = datetime.utcnow()
+            operations = []
+            for ticket_id, i in earliest.items():
+                ticket = existing.get(ticket_id)
+                if ticket is None:
+                    continue
+                scan = scans[i]
+                update = {
+                    "$set": {
+                        "status": "used",
+                        "used_at": scan["scanned_at"],
+                        "used_gate": scan.get("gate"),
+                        "used_by": uploaded_by,
+                        "used_device": device_id,
+                        "updated_at": now
+                    }
+                }
+                if ticket.get("status") == "paid":
+                    operations.append(UpdateOne({"_id": ticket["_id"], "status": "paid"}, update))
+                elif ticket.get("status") == "used" and ticket.get("used_at") and ticket["used_at"] > scan["scanned_at"]:
+                    # Admitted earlier at this device than anywhere else
+                    operations.append(UpdateOne(
+                        {"_id": ticket["_id"], "status": "used", "used_at": {"$gt": scan["scanned_at"]}},
+                        update
+                    ))
+            if operations:
+                await db.tickets.bulk_write(operations, ordered=False)
+                existing = {
+                    str(ticket["_id"]): ticket
+                    async for ticket in db.tickets.find({"_id": {"$in": ids}}, projection=projection)
+                }
+
+            used = await self._used_set(db, event_id)
+            for i, outcome in enumerate(results):
+                if "result" in outcome:
+                    continue
+                ticket = existing.get(outcome["ticket_id"])
+                if ticket is None:
+                    outcome["result"] = ScanResult.NOT_FOUND
+                    continue
+                outcome["used_at"] = ticket.get("used_at")
+                outcome["gate"] = ticket.get("used_gate")
+                if ticket.get("status") != "used":
+                    outcome["result"] = ScanResult.NOT_PAID
+                    continue
+                used.add(outcome["ticket_id"])
+                won = (
+                    earliest[outcome["ticket_id"]] == i
+                    and ticket.get("used_at") == scans[i]["scanned_at"]
+                    and ticket.get("used_device") == device_id
+                )
+                outcome["result"] = ScanResult.ADMITTED if won else ScanResult.ALREADY_USED
+        return results
+
+    @staticmethod
+    def _ticket_fields(ticket: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            field: ticket.get(field)
+            for field in ("ticket_type_name", "quantity", "buyer_name", "used_at")
+        }
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        return {
+            "events": len(cls._used),
+            "used_tickets": sum(len(used) for used in cls._used.values())
+        }
@@ -0,0 +1,138 @@
+import asyncio
+import time
+from email.message import Message
+from typing import Any, Dict, List, Optional, Tuple
+import aiosmtplib
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SMTPPool:
+    """
+    Small pool of authenticated, non-blocking SMTP connections.
+
+    Connections are opened (connect, STARTTLS, login) on demand up to `size`
+    and reused for later messages. A connection that fails mid-send is thrown
+    away and the message is retried once on a fresh one.
+    """
+
+    def __init__(
+        self,
+        hostname: str,
+        port: int,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        start_tls: bool = True,
+        size: int = 4,
+        idle_timeout: float = 60,
+        timeout: float = 30
+    ):
+        self.hostname = hostname
+        self.port = port
+        self.username = username or None
+        self.password = password or None
+        self.start_tls = start_tls
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(size)
+        # Idle connections with the time they were last used, most recent last
+        self._idle: List[Tuple[aiosmtplib.SMTP, float]] = []
+        self._started_at = time.monotonic()
+        self._sent = 0
+        self._failed = 0
+        self._connects = 0
+        self._reconnects = 0
+        self._send_seconds = 0.0
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        smtp = aiosmtplib.SMTP(
+            hostname=self.hostname,
+            port=self.port,
+            username=self.username,
+            password=self.password,
+            start_tls=self.start_tls,
+            timeout=self.timeout
+        )
+        # connect() also runs STARTTLS and login with the credentials above
+        await smtp.connect()
+        self._connects += 1
+        return smtp
+
+    async def _discard(self, smtp: Optional[aiosmtplib.SMTP]) -> None:
+        if smtp is None:
+            return
+        try:
+            if smtp.is_connected:
+                await smtp.quit()
+        except Exception:
+            smtp.close()
+
+    async def _acquire(self) -> aiosmtplib.SMTP:
+        while self._idle:
+            smtp, last_used = self._idle.pop()
+            if smtp.is_connected and time.monotonic() - last_used < self.idle_timeout:
+                return smtp
+            await self._discard(smtp)
+        return await self._connect()
+
+    def _release(self, smtp: aiosmtplib.SMTP) -> None:
+        self._idle.append((smtp, time.monotonic()))
+
+    async def send_message(self, message: Message) -> None:
+        """
+        Send a message over a pooled connection
+        """
+        async with self._semaphore:
+            started = time.monotonic()
+            smtp = None
+            for attempt in range(2):
+                try:
+                    smtp = await self._acquire()
+                    await smtp.send_message(message)
+                except (aiosmtplib.SMTPServerDisconnected, aiosmtplib.SMTPConnectError,
+                        aiosmtplib.SMTPTimeoutError, ConnectionError) as e:
+                    await self._discard(smtp)
+                    smtp = None
+                    if attempt == 0:
+                        self._reconnects += 1
+                        logger.warning(f"SMTP connection lost ({str(e)}), reconnecting")
+                        continue
+                    self._failed += 1
+                    raise
+                except Exception:
+                    # The server rejected this message; the connection is still usable
+                    self._failed += 1
+                    if smtp is not None and smtp.is_connected:
+                        self._release(smtp)
+                    raise
+                self._release(smtp)
+                self._sent += 1
+                self._send_seconds += time.monotonic() - started
+                return
+
+    async def close(self) -> None:
+        """
+        Close every idle connection
+        """
+        while self._idle:
+            smtp, _ = self._idle.pop()
+            await self._discard(smtp)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Throughput and connection metrics
+        """
+        uptime = time.monotonic() - self._started_at
+        return {
+            "size": self.size,
+            "idle_connections": len(self._idle),
+            "in_use": self.size - self._semaphore._value,
+            "sent": self._sent,
+            "failed": self._failed,
+            "connects": self._connects,
+            "reconnects": self._reconnects,
+            "avg_send_ms": round(self._send_seconds / self._sent * 1000, 2) if self._sent else 0.0,
+            "messages_per_second": round(self._sent / uptime, 3) if uptime else 0.0
+        }
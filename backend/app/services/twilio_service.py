@@ -1,46 +1,87 @@
-from twilio.rest import Client
+import asyncio
+import time
+import httpx
+from typing import Dict, List, Optional, Tuple
 from fastapi import HTTPException, status
 from app.core.config import settings
+from app.core.http_client import HTTPClient
+from app.core.utils.phone import normalize_phone
 import logging
 
 logger = logging.getLogger(__name__)
 
 class TwilioService:
+    """
+    SMS over the Twilio REST API, sent through the shared HTTP client.
+
+    Sends from all instances in a process share one concurrency cap
+    (TWILIO_MAX_CONCURRENCY) and one rate limit (TWILIO_RATE_PER_SECOND),
+    so a large fan-out runs in parallel without tripping Twilio's 429s.
+    """
+    _semaphore: Optional[asyncio.Semaphore] = None
+    _rate_lock: Optional[asyncio.Lock] = None
+    _next_send: float = 0.0
+
     def __init__(self):
-        self.client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
+        self.account_sid = settings.TWILIO_ACCOUNT_SID
         self.phone_number = settings.TWILIO_PHONE_NUMBER
+        self.messages_url = f"{settings.TWILIO_BASE_URL}/Accounts/{self.account_sid}/Messages.json"
+        self.auth = httpx.BasicAuth(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
+
+    @classmethod
+    def _limits(cls) -> Tuple[asyncio.Semaphore, asyncio.Lock]:
+        if cls._semaphore is None:
+            cls._semaphore = asyncio.Semaphore(settings.TWILIO_MAX_CONCURRENCY)
+            cls._rate_lock = asyncio.Lock()
+        return cls._semaphore, cls._rate_lock
+
+    @classmethod
+    async def _wait_for_slot(cls) -> None:
+        """
+        Space sends TWILIO_RATE_PER_SECOND apart across the process
+        """
+        if settings.TWILIO_RATE_PER_SECOND <= 0:
+            return
+        _, rate_lock = cls._limits()
+        async with rate_lock:
+            now = time.monotonic()
+            delay = cls._next_send - now
+            cls._next_send = max(now, cls._next_send) + 1 / settings.TWILIO_RATE_PER_SECOND
+        if delay > 0:
+            await asyncio.sleep(delay)
 
     async def send_sms(self, to_number: str, message: str) -> bool:
         """
         Send an SMS message using Twilio
-        
+
         Args:
-            to_number (str): The recipient's phone number
+            to_number (str): The recipient's phone number, normally already E.164
             message (str): The message to send
-            
+
         Returns:
             bool: True if message was sent successfully, False otherwise
         """
         try:
-            # Format the phone number
+            # Numbers are normalized when stored; this only catches older records
             if not to_number.startswith('+'):
-                # Remove any non-digit characters
-                to_number = ''.join(filter(str.isdigit, to_number))
-                # Add country code if not present (assuming Kenya)
-                if not to_number.startswith('254'):
-                    to_number = '254' + to_number.lstrip('0')
-                to_number = '+' + to_number
-            
-            # Send the message
-            message = self.client.messages.create(
-                body=message,
-                from_=self.phone_number,
-                to=to_number
-            )
-            
-            logger.info(f"SMS sent successfully to {to_number}. Message SID: {message.sid}")
+                to_number = normalize_phone(to_number)
+
+            semaphore, _ = self._limits()
+            async with semaphore:
+                await self._wait_for_slot()
+                response = await HTTPClient.get_client().post(
+                    self.messages_url,
+                    auth=self.auth,
+                    data={"To": to_number, "From": self.phone_number, "Body": message}
+                )
+
+            if response.status_code not in (200, 201):
+                error = response.json().get("message", response.text) if response.content else response.status_code
+                raise RuntimeError(f"Twilio returned {response.status_code}: {error}")
+
+            logger.info(f"SMS sent successfully to {to_number}. Message SID: {response.json().get('sid')}")
             return True
-            
+
         except Exception as e:
             logger.error(f"Failed to send SMS: {str(e)}")
             raise HTTPException(
@@ -48,6 +89,16 @@ class TwilioService:
                 detail="Failed to send SMS notification"
             )
 
+    async def send_many(self, messages: List[Tuple[str, str]]) -> List[bool]:
+        """
+        Send (to_number, message) pairs in parallel within the rate limit; results keep input order
+        """
+        results = await asyncio.gather(
+            *(self.send_sms(to_number, message) for to_number, message in messages),
+            return_exceptions=True
+        )
+        return [result is True for result in results]
+
     async def send_ticket_confirmation(
         self,
         to_number: str,
@@ -65,13 +116,13 @@ class TwilioService:
                 f"ID: {ticket_id}\n"
                 "Check email for QR code"
             )
-            
+
             # Only add QR code URL if it's short enough
             if qr_code_url and len(message) + len(qr_code_url) < 1500:
                 message += f"\nQR: {qr_code_url}"
-            
+
             return await self.send_sms(to_number, message)
-            
+
         except Exception as e:
             logger.error(f"Failed to send ticket confirmation SMS: {str(e)}")
             return False
@@ -79,12 +130,12 @@ class TwilioService:
     async def send_payment_confirmation(self, to_number: str, event_title: str, amount: float) -> bool:
         """
         Send a payment confirmation SMS
-        
+
         Args:
             to_number (str): The recipient's phone number
             event_title (str): The title of the event
             amount (float): The amount paid
-            
+
         Returns:
             bool: True if message was sent successfully
         """
@@ -93,4 +144,15 @@ class TwilioService:
             f"Amount: ${amount:.2f}\n"
             f"Thank you for your purchase!"
         )
-        return await self.send_sms(to_number, message) 
\ No newline at end of file
+        return await self.send_sms(to_number, message)
+
+    @classmethod
+    def stats(cls) -> Dict[str, float]:
+        return {
+            "max_concurrency": settings.TWILIO_MAX_CONCURRENCY,
+            "rate_per_second": settings.TWILIO_RATE_PER_SECOND,
+            "in_flight": (
+                settings.TWILIO_MAX_CONCURRENCY - cls._semaphore._value
+                if cls._semaphore is not None else 0
+            )
+        }
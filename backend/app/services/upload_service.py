@@ -0,0 +1,230 @@
+import asyncio
+import hashlib
+import hmac
+import io
+import math
+import os
+import secrets
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+import cloudinary
+import cloudinary.uploader
+from fastapi import HTTPException, UploadFile, status
+from app.core.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Configure Cloudinary
+cloudinary.config(
+    cloud_name=settings.CLOUDINARY_CLOUD_NAME,
+    api_key=settings.CLOUDINARY_API_KEY,
+    api_secret=settings.CLOUDINARY_API_SECRET
+)
+
+
+def cloudinary_signature(params: Dict[str, Any], secret: str) -> str:
+    """
+    Cloudinary request signature: SHA-1 of the sorted, &-joined params followed by the API secret
+    """
+    to_sign = "&".join(f"{key}={params[key]}" for key in sorted(params) if params[key] not in (None, ""))
+    return hashlib.sha1((to_sign + secret).encode()).hexdigest()
+
+
+class UploadService:
+    """
+    Uploads event images to Cloudinary without blocking the event loop.
+
+    The multipart body is already spooled to a temporary file by Starlette;
+    it is size-checked without reading it and handed to the Cloudinary SDK,
+    which sends it in UPLOAD_CHUNK_SIZE chunks from a bounded thread pool.
+    At most `max_concurrent` uploads run per worker; callers that cannot get
+    a slot within UPLOAD_QUEUE_TIMEOUT get a 503. Latencies are tracked for
+    /health.
+    """
+
+    def __init__(self, workers: int, max_concurrent: int):
+        self.workers = workers
+        self.max_concurrent = max_concurrent
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="upload")
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.bytes_uploaded = 0
+        self.upload_seconds = 0.0
+        self.max_upload_seconds = 0.0
+        self._recent: Deque[float] = deque(maxlen=256)
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        return self._semaphore
+
+    @staticmethod
+    def check_size(file: UploadFile) -> int:
+        """
+        Size of a spooled upload, found by seeking; 400 if it is empty, 413 if it is over UPLOAD_MAX_BYTES
+        """
+        file.file.seek(0, os.SEEK_END)
+        size = file.file.tell()
+        file.file.seek(0)
+        if size == 0:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Image file is empty"
+            )
+        if size > settings.UPLOAD_MAX_BYTES:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Image must be at most {settings.UPLOAD_MAX_BYTES // (1024 * 1024)} MB"
+            )
+        return size
+
+    def _record(self, seconds: float) -> None:
+        self.upload_seconds += seconds
+        self.max_upload_seconds = max(self.max_upload_seconds, seconds)
+        self._recent.append(seconds)
+
+    async def upload_image(self, file: UploadFile, folder: str = "event_images") -> Dict[str, Any]:
+        """
+        Upload an image and return Cloudinary's response (secure_url, public_id, ...)
+        """
+        size = self.check_size(file)
+
+        return await self._run(
+            lambda: cloudinary.uploader.upload_large(
+                file.file,
+                folder=folder,
+                resource_type="auto",
+                chunk_size=settings.UPLOAD_CHUNK_SIZE
+            ),
+            size
+        )
+
+    async def upload_bytes(self, data: bytes, folder: str, public_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Upload an image held in memory, e.g. a generated variant
+        """
+        return await self._run(
+            lambda: cloudinary.uploader.upload(
+                io.BytesIO(data),
+                folder=folder,
+                public_id=public_id,
+                resource_type="image"
+            ),
+            len(data)
+        )
+
+    async def _run(self, upload: Callable[[], Dict[str, Any]], size: int) -> Dict[str, Any]:
+        """
+        Run a blocking Cloudinary call in the pool, within the per-worker concurrency limit
+        """
+        semaphore = self._get_semaphore()
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=settings.UPLOAD_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many uploads in progress, please retry",
+                headers={"Retry-After": "5"}
+            )
+
+        started = time.monotonic()
+        self.in_flight += 1
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self._executor, upload)
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Error uploading image to Cloudinary: {str(e)}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to upload image"
+            )
+        finally:
+            self.in_flight -= 1
+            semaphore.release()
+            self._record(time.monotonic() - started)
+
+        self.completed += 1
+        self.bytes_uploaded += size
+        return result
+
+    def direct_upload_params(self, folder: str, prefix: str) -> Dict[str, Any]:
+        """
+        Signed parameters for a browser to upload one image straight to Cloudinary.
+
+        The public_id embeds the issue time, so attach_direct_upload can refuse
+        uploads made more than DIRECT_UPLOAD_TTL_SECONDS after signing.
+        """
+        timestamp = int(time.time())
+        public_id = f"{prefix}_{timestamp}_{secrets.token_hex(6)}"
+        params = {"folder": folder, "public_id": public_id, "timestamp": timestamp}
+        return {
+            **params,
+            "signature": cloudinary_signature(params, settings.CLOUDINARY_API_SECRET),
+            "api_key": settings.CLOUDINARY_API_KEY,
+            "cloud_name": settings.CLOUDINARY_CLOUD_NAME,
+            "upload_url": f"{settings.CLOUDINARY_UPLOAD_URL}/{settings.CLOUDINARY_CLOUD_NAME}/image/upload",
+            "expires_at": timestamp + settings.DIRECT_UPLOAD_TTL_SECONDS
+        }
+
+    def verify_direct_upload(
+        self,
+        public_id: str,
+        version: int,
+        signature: str,
+        secure_url: str,
+        folder: str,
+        prefix: str
+    ) -> Tuple[bool, str]:
+        """
+        Check an upload response reported by a browser; returns (ok, reason)
+
+        Cloudinary signs its upload response as SHA-1("public_id=..&version=.." + secret).
+        """
+        expected = cloudinary_signature({"public_id": public_id, "version": version}, settings.CLOUDINARY_API_SECRET)
+        if not hmac.compare_digest(expected, signature):
+            return False, "Invalid upload signature"
+        name = public_id[len(folder) + 1:] if public_id.startswith(f"{folder}/") else ""
+        if not name.startswith(f"{prefix}_"):
+            return False, "Upload does not belong to this event"
+        try:
+            issued_at = int(name[len(prefix) + 1:].split("_")[0])
+        except ValueError:
+            return False, "Upload does not belong to this event"
+        if not 0 <= version - issued_at <= settings.DIRECT_UPLOAD_TTL_SECONDS:
+            return False, "Upload parameters have expired"
+        url_prefix = f"https://res.cloudinary.com/{settings.CLOUDINARY_CLOUD_NAME}/image/upload/"
+        if not secure_url.startswith(url_prefix) or public_id not in secure_url:
+            return False, "Image URL does not match the upload"
+        return True, ""
+
+    def stats(self) -> Dict[str, Any]:
+        recent = sorted(self._recent)
+        attempts = self.completed + self.failed
+        return {
+            "workers": self.workers,
+            "max_concurrent": self.max_concurrent,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "bytes_uploaded": self.bytes_uploaded,
+            "avg_ms": round(self.upload_seconds / attempts * 1000, 2) if attempts else 0.0,
+            "p95_ms": round(recent[max(0, math.ceil(len(recent) * 0.95) - 1)] * 1000, 2) if recent else 0.0,
+            "max_ms": round(self.max_upload_seconds * 1000, 2)
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+upload_service = UploadService(
+    workers=settings.UPLOAD_WORKERS,
+    max_concurrent=settings.UPLOAD_MAX_CONCURRENT
+)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, validator
 from typing import List, Optional, Tuple
 from datetime import datetime
 from enum import Enum
@@ -6,9 +6,11 @@ from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
 from .schemas import (
     TicketCreate, TicketUpdate, TicketInDB, Ticket,
-    TicketStatus, PaymentMethod, TICKET_INDEXES
+    TicketStatus, PaymentMethod, TicketEvent
 )
 from app.core.utils.objectid import PyObjectId
+from app.core.utils.pagination import find_page
+from app.core.utils.phone import normalize_phone
 
 class TicketStatus(str, Enum):
     PENDING = "pending"
@@ -27,7 +29,9 @@ class TicketBase(BaseModel):
     status: TicketStatus = TicketStatus.PENDING
 
 class TicketCreate(TicketBase):
-    pass
+    @validator('buyer_phone')
+    def normalize_buyer_phone(cls, v):
+        return normalize_phone(v)
 
 class TicketUpdate(BaseModel):
     status: Optional[TicketStatus] = None
@@ -35,12 +39,17 @@ class TicketUpdate(BaseModel):
     buyer_email: Optional[str] = None
     buyer_phone: Optional[str] = None
 
+    @validator('buyer_phone')
+    def normalize_buyer_phone(cls, v):
+        return normalize_phone(v)
+
 class TicketInDB(TicketBase):
     id: str
     user_id: str
     created_at: datetime
     updated_at: datetime
     qr_code_url: Optional[str] = None
+    event: Optional[TicketEvent] = None
 
     class Config:
         json_encoders = {
@@ -56,23 +65,91 @@ class TicketResponse(BaseModel):
     page: int
     size: int
 
+class TicketSummary(BaseModel):
+    """Ticket as returned by list endpoints; only the projected fields are set"""
+    id: str
+    event_id: Optional[str] = None
+    user_id: Optional[str] = None
+    ticket_type_name: Optional[str] = None
+    quantity: Optional[int] = None
+    total_price: Optional[float] = None
+    buyer_name: Optional[str] = None
+    buyer_email: Optional[str] = None
+    buyer_phone: Optional[str] = None
+    status: Optional[TicketStatus] = None
+    payment_status: Optional[str] = None
+    payment_reference: Optional[str] = None
+    qr_code_url: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    event: Optional[TicketEvent] = None
+
+    @classmethod
+    def from_mongo(cls, data: dict) -> "TicketSummary":
+        data = dict(data)
+        data["id"] = str(data.pop("_id"))
+        if isinstance(data.get("event_id"), ObjectId):
+            data["event_id"] = str(data["event_id"])
+        return cls(**data)
+
+class TicketListResponse(BaseModel):
+    tickets: List[TicketSummary]
+    total: int
+    page: int
+    size: int
+
+# Default fields of ticket list items; the QR code is fetched per ticket
+TICKET_SUMMARY_FIELDS = [
+    "event_id", "ticket_type_name", "quantity", "total_price",
+    "status", "buyer_name", "buyer_email", "created_at"
+]
+
+# Fields that can be requested with ?fields=
+TICKET_LIST_FIELDS = [
+    field for field in TicketSummary.model_fields if field not in ("id", "event")
+]
+
+class ScanRequest(BaseModel):
+    payload: str
+    # Event the gate is admitting to; tickets for other events are rejected
+    event_id: Optional[str] = None
+    gate: Optional[str] = None
+
+class ScanResponse(BaseModel):
+    result: str
+    admitted: bool
+    ticket_id: Optional[str] = None
+    event_id: Optional[str] = None
+    ticket_type_name: Optional[str] = None
+    quantity: Optional[int] = None
+    buyer_name: Optional[str] = None
+    used_at: Optional[datetime] = None
+
+class OfflineScan(BaseModel):
+    payload: str
+    scanned_at: datetime
+    gate: Optional[str] = None
+
+class OfflineScanUpload(BaseModel):
+    device_id: str
+    scans: List[OfflineScan]
+
+class OfflineScanResult(BaseModel):
+    result: str
+    ticket_id: Optional[str] = None
+    # Winning check-in of the ticket, which may come from another device
+    used_at: Optional[datetime] = None
+    gate: Optional[str] = None
+
+class OfflineScanUploadResponse(BaseModel):
+    results: List[OfflineScanResult]
+    admitted: int
+    already_used: int
+    rejected: int
+
 class TicketModel:
     def __init__(self, db: AsyncIOMotorDatabase):
         self.collection = db.tickets
-        self._ensure_indexes()
-
-    async def _ensure_indexes(self):
-        """Create necessary indexes for the tickets collection"""
-        for index in TICKET_INDEXES:
-            if isinstance(index, dict):
-                # Text index
-                await self.collection.create_index(
-                    index["keys"],
-                    weights=index["weights"]
-                )
-            else:
-                # Regular index
-                await self.collection.create_index(index)
 
     async def create(self, ticket: TicketCreate) -> TicketInDB:
         """Create a new ticket"""
@@ -100,13 +177,11 @@ class TicketModel:
         """Get tickets for a specific event"""
         filter_query = {"event_id": event_id}
         
-        total = await self.collection.count_documents(filter_query)
         skip = (page - 1) * size
-        
-        cursor = self.collection.find(filter_query).skip(skip).limit(size)
+        documents, total = await find_page(self.collection, filter_query, skip, size)
         tickets = []
         
-        async for ticket in cursor:
+        for ticket in documents:
             ticket["id"] = str(ticket.pop("_id"))
             tickets.append(TicketInDB(**ticket))
         
@@ -116,13 +191,11 @@ class TicketModel:
         """Get tickets purchased by a specific buyer"""
         filter_query = {"buyer_email": buyer_email}
         
-        total = await self.collection.count_documents(filter_query)
         skip = (page - 1) * size
-        
-        cursor = self.collection.find(filter_query).skip(skip).limit(size)
+        documents, total = await find_page(self.collection, filter_query, skip, size)
         tickets = []
         
-        async for ticket in cursor:
+        for ticket in documents:
             ticket["id"] = str(ticket.pop("_id"))
             tickets.append(TicketInDB(**ticket))
         
@@ -220,13 +293,11 @@ class TicketModel:
         if payment_method:
             filter_query["payment_method"] = payment_method
 
-        total = await self.collection.count_documents(filter_query)
         skip = (page - 1) * size
-        
-        cursor = self.collection.find(filter_query).skip(skip).limit(size)
+        documents, total = await find_page(self.collection, filter_query, skip, size)
         tickets = []
         
-        async for ticket in cursor:
+        for ticket in documents:
             ticket["id"] = str(ticket.pop("_id"))
             tickets.append(TicketInDB(**ticket))
         
@@ -1,24 +1,69 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Header, Request, Response
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
 from datetime import datetime
 from app.core.config import settings
 from app.database import get_database
 from app.auth.utils import get_current_active_user, get_current_admin_user, get_current_user
 from app.auth.models import UserModel
-from app.events.models import Event
+from app.events.models import Event, refresh_event_summary
 from .models import (
     Ticket, TicketCreate, TicketUpdate, TicketStatus,
-    PaymentMethod, TicketResponse
+    PaymentMethod, TicketResponse, TicketSummary, TicketListResponse,
+    ScanRequest, ScanResponse, OfflineScanUpload, OfflineScanUploadResponse,
+    OfflineScanResult, TICKET_SUMMARY_FIELDS, TICKET_LIST_FIELDS
 )
 from app.payments.paystack import PaystackService
-from app.services.email import EmailService
-from app.services.twilio_service import TwilioService
+from app.services.inventory_service import InventoryService
+from app.services.admission_service import AdmissionService
+from app.services.outbox_service import OutboxService, JOB_TICKET_ISSUED
+from app.services.qr_service import QRService, QR_FORMATS
+from app.services.scan_service import ScanService, ScanResult
+from app.core.utils.pagination import find_page
+from app.core.utils.projection import build_projection, InvalidFields
+from .schemas import (
+    TicketEvent, TICKET_EVENT_PROJECTION
+)
 from bson import ObjectId
+import asyncio
+import base64
+import hashlib
+import logging
 
 router = APIRouter(prefix="/tickets", tags=["tickets"])
+logger = logging.getLogger(__name__)
 paystack_service = PaystackService()
-email_service = EmailService()
-twilio_service = TwilioService()
+inventory_service = InventoryService()
+admission_service = AdmissionService()
+outbox_service = OutboxService()
+qr_service = QRService()
+scan_service = ScanService()
+
+_inventory_tasks = []
+
+@router.on_event("startup")
+async def start_inventory_tasks():
+    """
+    Start the hold sweeper and shard reconciler
+    """
+    db = await get_database()
+    _inventory_tasks.append(asyncio.create_task(inventory_service.run_expiry_sweeper(db)))
+    _inventory_tasks.append(asyncio.create_task(inventory_service.run_shard_reconciler(db)))
+
+@router.on_event("shutdown")
+async def stop_inventory_tasks():
+    for task in _inventory_tasks:
+        task.cancel()
+    _inventory_tasks.clear()
+
+def _list_projection(fields: Optional[str]):
+    """
+    Projection for ticket list endpoints (summary fields by default)
+    """
+    try:
+        return build_projection(fields, TICKET_LIST_FIELDS, TICKET_SUMMARY_FIELDS)
+    except InvalidFields as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 async def process_payment_confirmation(
     ticket_id: str,
@@ -39,6 +84,16 @@ async def process_payment_confirmation(
         if not event:
             return
 
+        # Turn the reservation made at creation into a sale
+        if ticket.get("hold_id"):
+            await inventory_service.confirm(
+                db,
+                event["_id"],
+                ticket["ticket_type_name"],
+                ticket["quantity"],
+                f"ticket:{ticket['_id']}"
+            )
+
         # Update ticket status
         await db.tickets.update_one(
             {"_id": ticket_id},
@@ -52,23 +107,21 @@ async def process_payment_confirmation(
             }
         )
 
-        # Send notifications
-        await email_service.send_payment_confirmation(ticket, event)
-        await email_service.send_ticket_email(ticket, event)
-        
-        if ticket.get("buyer_phone"):
-            await twilio_service.send_ticket_confirmation(
-                ticket["buyer_phone"],
-                event["title"],
-                str(ticket["_id"])
-            )
+        # QR code and notifications are handled by the outbox worker
+        await outbox_service.enqueue(
+            db,
+            JOB_TICKET_ISSUED,
+            {"ticket_id": str(ticket["_id"])},
+            dedupe_key=f"{JOB_TICKET_ISSUED}:{ticket['_id']}"
+        )
             
     except Exception as e:
-        print(f"Error processing payment confirmation: {str(e)}")
+        logger.error(f"Error processing payment confirmation: {str(e)}")
 
 @router.post("/", response_model=Ticket)
 async def create_ticket(
     ticket: TicketCreate,
+    x_queue_token: Optional[str] = Header(None),
     current_user: UserModel = Depends(get_current_active_user)
 ) -> Ticket:
     """
@@ -85,6 +138,9 @@ async def create_ticket(
             detail="Invalid event ID format"
         )
     
+    # Buyers must come through the waiting room when the event has one
+    await admission_service.check_admission(db, event_id, x_queue_token, str(current_user.id))
+    
     # Check if event exists
     event = await db.events.find_one({"_id": event_id})
     if not event:
@@ -111,52 +167,131 @@ async def create_ticket(
             detail="This ticket type is not available"
         )
     
-    # Check if there are enough tickets available
-    if ticket_type["quantity"] < ticket.quantity:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Not enough tickets available"
-        )
+    # Atomically hold the tickets; fails if there are not enough left
+    ticket_id = ObjectId()
+    hold = await inventory_service.reserve(
+        db, event_id, ticket.ticket_type_name, ticket.quantity, f"ticket:{ticket_id}"
+    )
     
     # Calculate total price
-    total_price = ticket_type["price"] * ticket.quantity
+    total_price = hold["price"] * ticket.quantity
     
     # Create ticket dictionary
     ticket_dict = ticket.model_dump()
     ticket_dict.update({
+        "_id": ticket_id,
         "user_id": str(current_user.id),
         "event_id": str(event_id),
         "total_price": total_price,
         "status": TicketStatus.PENDING,
+        "hold_id": hold["_id"],
+        "hold_expires_at": hold["expires_at"],
         "created_at": datetime.utcnow(),
         "updated_at": datetime.utcnow()
     })
     
     # Insert ticket into database
-    result = await db.tickets.insert_one(ticket_dict)
-    ticket_dict["id"] = str(result.inserted_id)
-    
-    # Update event ticket sales
-    await db.events.update_one(
-        {
-            "_id": event_id,
-            "ticket_types.name": ticket.ticket_type_name
-        },
-        {
-            "$inc": {
-                "ticket_types.$.quantity": -ticket.quantity,
-                "total_tickets_sold": ticket.quantity,
-                "total_revenue": total_price
-            }
-        }
-    )
+    try:
+        await db.tickets.insert_one(ticket_dict)
+    except Exception:
+        await inventory_service.release(db, hold["_id"])
+        raise
+    ticket_dict["id"] = str(ticket_dict.pop("_id"))
     
     return Ticket(**ticket_dict)
 
+@router.post("/scan", response_model=ScanResponse)
+async def scan_ticket(
+    scan: ScanRequest,
+    current_user: UserModel = Depends(get_current_admin_user)
+) -> ScanResponse:
+    """
+    Check a ticket in at the gate from its QR payload; each ticket is admitted once
+    """
+    db = await get_database()
+    outcome = await scan_service.scan(
+        db,
+        scan.payload,
+        event_id=scan.event_id,
+        gate=scan.gate,
+        scanned_by=str(current_user.id)
+    )
+    if outcome["result"] == ScanResult.INVALID:
+        logger.warning(f"Rejected QR payload with an invalid signature at gate {scan.gate}")
+    return ScanResponse(**outcome, admitted=outcome["result"] == ScanResult.ADMITTED)
+
+async def _get_scannable_event(db, event_id: str) -> dict:
+    try:
+        event = await db.events.find_one({"_id": ObjectId(event_id)}, projection={"_id": 1})
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid event ID format"
+        )
+    if not event:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Event not found"
+        )
+    return event
+
+@router.get("/event/{event_id}/manifest")
+async def get_scanner_manifest(
+    event_id: str,
+    since: Optional[int] = Query(None, ge=0, description="Version from a previous manifest; only changes since then are listed"),
+    current_user: UserModel = Depends(get_current_admin_user)
+):
+    """
+    Signed NDJSON list of an event's tickets for door devices that may go offline
+    """
+    db = await get_database()
+    await _get_scannable_event(db, event_id)
+    return StreamingResponse(
+        scan_service.manifest(db, event_id, since=since),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-store"}
+    )
+
+@router.post("/event/{event_id}/scans", response_model=OfflineScanUploadResponse)
+async def upload_offline_scans(
+    event_id: str,
+    upload: OfflineScanUpload,
+    current_user: UserModel = Depends(get_current_admin_user)
+) -> OfflineScanUploadResponse:
+    """
+    Replay scans a door device recorded while offline; the earliest scan of a ticket wins
+    """
+    if len(upload.scans) > settings.SCAN_UPLOAD_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {settings.SCAN_UPLOAD_MAX} scans per upload"
+        )
+    db = await get_database()
+    await _get_scannable_event(db, event_id)
+    outcomes = await scan_service.replay(
+        db,
+        event_id,
+        [scan.model_dump() for scan in upload.scans],
+        device_id=upload.device_id,
+        uploaded_by=str(current_user.id)
+    )
+    results = [OfflineScanResult(**outcome) for outcome in outcomes]
+    admitted = sum(1 for result in results if result.result == ScanResult.ADMITTED)
+    already_used = sum(1 for result in results if result.result == ScanResult.ALREADY_USED)
+    logger.info(
+        f"Device {upload.device_id} uploaded {len(results)} scans for event {event_id}: "
+        f"{admitted} admitted, {already_used} already used"
+    )
+    return OfflineScanUploadResponse(
+        results=results,
+        admitted=admitted,
+        already_used=already_used,
+        rejected=len(results) - admitted - already_used
+    )
+
 @router.post("/{ticket_id}/verify-payment")
 async def verify_payment(
     ticket_id: str,
-    background_tasks: BackgroundTasks,
     current_user: UserModel = Depends(get_current_active_user)
 ):
     """
@@ -178,9 +313,7 @@ async def verify_payment(
             payment_status = await paystack_service.check_mpesa_status(ticket.get("payment_reference"))
 
         if payment_status.get("status") == "success":
-            # Process payment confirmation in background
-            background_tasks.add_task(
-                process_payment_confirmation,
+            await process_payment_confirmation(
                 ticket_id,
                 ticket.get("payment_reference")
             )
@@ -194,6 +327,26 @@ async def verify_payment(
             detail=str(e)
         )
 
+# Registered before /{ticket_id}, which would otherwise match "my-tickets"
+@router.get("/my-tickets", response_model=List[TicketSummary], response_model_exclude_unset=True)
+async def get_my_tickets(
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, or 'all'; defaults to a summary"),
+    current_user: UserModel = Depends(get_current_active_user)
+) -> List[TicketSummary]:
+    """
+    Get all tickets for the current user
+    """
+    db = await get_database()
+    projection = _list_projection(fields)
+    
+    # Get all tickets for the current user
+    tickets = await db.tickets.find(
+        {"user_id": str(current_user.id)}, projection
+    ).sort("created_at", -1).to_list(length=None)
+    
+    # Convert to summary models
+    return [TicketSummary.from_mongo(ticket) for ticket in tickets]
+
 @router.get("/{ticket_id}", response_model=Ticket)
 async def get_ticket(
     ticket_id: str,
@@ -239,12 +392,9 @@ async def get_event_tickets(
     if not current_user.is_admin:
         query["user_id"] = str(current_user.id)
     
-    # Get total count
-    total = await db.tickets.count_documents(query)
-    
-    # Get tickets with pagination
+    # Get tickets with pagination and the total in one round-trip
     skip = (page - 1) * size
-    tickets = await db.tickets.find(query).skip(skip).limit(size).to_list(length=size)
+    tickets, total = await find_page(db.tickets, query, skip, size)
     tickets = [Ticket(**ticket) for ticket in tickets]
     
     return TicketResponse(
@@ -254,11 +404,12 @@ async def get_event_tickets(
         size=size
     )
 
-@router.get("/buyer/{buyer_email}", response_model=TicketResponse)
+@router.get("/buyer/{buyer_email}", response_model=TicketListResponse, response_model_exclude_unset=True)
 async def get_buyer_tickets(
     buyer_email: str,
     page: int = Query(1, ge=1),
     size: int = Query(10, ge=1, le=100),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, or 'all'; defaults to a summary"),
     current_user: UserModel = Depends(get_current_active_user)
 ):
     """
@@ -273,42 +424,32 @@ async def get_buyer_tickets(
     if not current_user.is_admin:
         query["user_id"] = str(current_user.id)
     
-    # Get total count
-    total = await db.tickets.count_documents(query)
+    projection = _list_projection(fields)
     
-    # Get tickets with pagination
+    # Get tickets with pagination and the total in one round-trip
     skip = (page - 1) * size
-    tickets = await db.tickets.find(query).skip(skip).limit(size).to_list(length=size)
-    
-    # Format tickets and fetch event details
+    tickets, total = await find_page(db.tickets, query, skip, size, projection=projection)
+    
+    # Load the events referenced by this page in one query, each event once
+    event_ids = {
+        ObjectId(ticket["event_id"])
+        for ticket in tickets
+        if ObjectId.is_valid(str(ticket.get("event_id")))
+    }
+    events = {}
+    if event_ids:
+        async for event in db.events.find(
+            {"_id": {"$in": list(event_ids)}},
+            projection=TICKET_EVENT_PROJECTION
+        ):
+            event["id"] = str(event.pop("_id"))
+            events[event["id"]] = TicketEvent(**event)
+    
+    # Format tickets and attach event details
     formatted_tickets = []
     for ticket in tickets:
-        # Convert ObjectId to string for id field
-        ticket["id"] = str(ticket.pop("_id"))
-        
-        # Get event details
-        try:
-            event = await db.events.find_one({"_id": ObjectId(ticket["event_id"])})
-            if event:
-                # Convert event ObjectId to string
-                event["id"] = str(event.pop("_id"))
-                
-                # Convert datetime fields in event to ISO format
-                for field in ['start_date', 'end_date', 'created_at', 'updated_at']:
-                    if field in event and isinstance(event[field], datetime):
-                        event[field] = event[field].isoformat()
-                
-                # Convert ticket types ObjectIds if present
-                if 'ticket_types' in event:
-                    for ticket_type in event['ticket_types']:
-                        if '_id' in ticket_type:
-                            ticket_type['id'] = str(ticket_type.pop('_id'))
-                
-                # Add event details to ticket
-                ticket["event"] = event
-        except Exception as e:
-            print(f"Error fetching event details: {str(e)}")
-            ticket["event"] = None
+        if ticket.get("event_id") is not None:
+            ticket["event"] = events.get(str(ticket["event_id"]))
         
         # Convert status to lowercase if present
         if "status" in ticket:
@@ -319,9 +460,9 @@ async def get_buyer_tickets(
             if field in ticket and isinstance(ticket[field], datetime):
                 ticket[field] = ticket[field].isoformat()
             
-        formatted_tickets.append(Ticket(**ticket))
+        formatted_tickets.append(TicketSummary.from_mongo(ticket))
     
-    return TicketResponse(
+    return TicketListResponse(
         tickets=formatted_tickets,
         total=total,
         page=page,
@@ -403,6 +544,8 @@ async def update_ticket_status(
             }
         }
     )
+    if status != TicketStatus.USED:
+        scan_service.forget(ticket["event_id"], ticket["_id"])
     
     # Get updated ticket
     updated_ticket = await db.tickets.find_one({"_id": ticket_id})
@@ -492,29 +635,89 @@ async def update_ticket_qr_code(
     updated_ticket = await db.tickets.find_one({"_id": ticket_id})
     return Ticket(**updated_ticket)
 
-@router.get("/my-tickets", response_model=List[Ticket])
-async def get_my_tickets(
+@router.get("/{ticket_id}/qr.{image_format}")
+async def get_ticket_qr_code(
+    ticket_id: str,
+    image_format: str,
+    request: Request,
     current_user: UserModel = Depends(get_current_active_user)
-) -> List[Ticket]:
+) -> Response:
     """
-    Get all tickets for the current user
+    Render a ticket's QR code as PNG or SVG
     """
+    if image_format not in QR_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Unsupported QR code format"
+        )
     db = await get_database()
-    
-    # Get all tickets for the current user
-    tickets = await db.tickets.find({"user_id": str(current_user.id)}).to_list(length=None)
-    
-    # Convert to Ticket models
-    return [Ticket(**ticket) for ticket in tickets]
+    ticket_key = ObjectId(ticket_id) if ObjectId.is_valid(ticket_id) else ticket_id
+    ticket = await db.tickets.find_one(
+        {"_id": ticket_key},
+        projection={"user_id": 1, "event_id": 1, "status": 1, "qr_payload": 1, "qr_code_url": 1}
+    )
+    if not ticket:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Ticket not found"
+        )
+    if str(ticket["user_id"]) != str(current_user.id) and not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to view this ticket"
+        )
 
-@router.get("/", response_model=TicketResponse)
+    payload = ticket.get("qr_payload")
+    inline = ticket.get("qr_code_url") or ""
+    if not payload and inline.startswith("data:image/png;base64,"):
+        # Not migrated yet: serve the stored image rather than sign a new payload
+        if image_format != "png":
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="QR code for this ticket is only available as PNG"
+            )
+        return Response(
+            content=base64.b64decode(inline.split(",", 1)[1]),
+            media_type=QR_FORMATS["png"],
+            headers={"Cache-Control": f"private, max-age={settings.QR_IMAGE_MAX_AGE}"}
+        )
+    if not payload:
+        if ticket.get("status") not in (TicketStatus.PAID, TicketStatus.USED):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="QR code not available for this ticket"
+            )
+        # Paid before QR payloads were stored (or not yet processed by the worker)
+        payload = qr_service.build_payload(str(ticket["_id"]), str(ticket["event_id"]))
+        result = await db.tickets.update_one(
+            {"_id": ticket["_id"], "qr_payload": {"$exists": False}},
+            {"$set": {"qr_payload": payload}}
+        )
+        if not result.modified_count:
+            stored = await db.tickets.find_one({"_id": ticket["_id"]}, projection={"qr_payload": 1})
+            payload = stored["qr_payload"]
+
+    # The payload never changes for a ticket, so the image can be cached by the client
+    etag = f'"{hashlib.sha256(payload.encode()).hexdigest()[:32]}"'
+    headers = {
+        "Cache-Control": f"private, max-age={settings.QR_IMAGE_MAX_AGE}",
+        "ETag": etag
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    image = await qr_service.render_async(payload, image_format)
+    return Response(content=image, media_type=QR_FORMATS[image_format], headers=headers)
+
+@router.get("/", response_model=TicketListResponse, response_model_exclude_unset=True)
 async def get_tickets(
     event_id: Optional[str] = None,
     status: Optional[TicketStatus] = None,
     page: int = Query(1, ge=1),
     size: int = Query(10, ge=1, le=100),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, or 'all'; defaults to a summary"),
     current_user: UserModel = Depends(get_current_active_user)
-) -> TicketResponse:
+) -> TicketListResponse:
     """
     Get tickets with optional filtering
     """
@@ -537,21 +740,14 @@ async def get_tickets(
     if not current_user.is_admin:
         query["user_id"] = str(current_user.id)
     
-    # Get total count
-    total = await db.tickets.count_documents(query)
+    projection = _list_projection(fields)
     
-    # Get tickets with pagination
+    # Get tickets with pagination and the total in one round-trip
     skip = (page - 1) * size
-    cursor = db.tickets.find(query).skip(skip).limit(size)
-    tickets = []
-    async for ticket in cursor:
-        # Convert MongoDB document to Ticket instance
-        ticket_dict = dict(ticket)
-        if '_id' in ticket_dict:
-            ticket_dict['id'] = str(ticket_dict.pop('_id'))
-        tickets.append(Ticket(**ticket_dict))
+    documents, total = await find_page(db.tickets, query, skip, size, projection=projection)
+    tickets = [TicketSummary.from_mongo(ticket) for ticket in documents]
     
-    return TicketResponse(
+    return TicketListResponse(
         tickets=tickets,
         total=total,
         page=page,
@@ -592,20 +788,25 @@ async def delete_ticket(
     # Delete ticket
     await db.tickets.delete_one({"_id": ticket_id})
     
-    # Update event ticket sales
-    await db.events.update_one(
-        {
-            "_id": ticket["event_id"],
-            "ticket_types.name": ticket["ticket_type_name"]
-        },
-        {
-            "$inc": {
-                "ticket_types.$.quantity": ticket["quantity"],
-                "total_tickets_sold": -ticket["quantity"],
-                "total_revenue": -ticket["total_price"]
+    if ticket.get("hold_id"):
+        # Return the held stock unless the hold already expired
+        await inventory_service.release(db, ticket["hold_id"])
+    else:
+        # Tickets created before holds existed counted as sold immediately
+        await db.events.update_one(
+            {
+                "_id": ticket["event_id"],
+                "ticket_types.name": ticket["ticket_type_name"]
+            },
+            {
+                "$inc": {
+                    "ticket_types.$.quantity": ticket["quantity"],
+                    "total_tickets_sold": -ticket["quantity"],
+                    "total_revenue": -ticket["total_price"]
+                }
             }
-        }
-    )
+        )
+        await refresh_event_summary(db, ticket["event_id"])
     
     return {"message": "Ticket deleted successfully"}
 
@@ -3,7 +3,6 @@ from datetime import datetime
 from typing import Optional, List
 from pydantic import BaseModel, Field, EmailStr, validator
 from enum import Enum
-from app.events.schemas import EventInDB
 
 class TicketStatus(str, Enum):
     PENDING = "pending"
@@ -41,6 +40,27 @@ class TicketUpdate(BaseModel):
     payment_reference: Optional[str] = None
     notes: Optional[str] = None
 
+class TicketEvent(BaseModel):
+    """Event fields embedded in ticket views"""
+    id: str
+    title: Optional[str] = None
+    category: Optional[str] = None
+    venue: Optional[str] = None
+    location: Optional[str] = None
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    image_url: Optional[str] = None
+
+TICKET_EVENT_PROJECTION = {
+    "title": 1,
+    "category": 1,
+    "venue": 1,
+    "location": 1,
+    "start_date": 1,
+    "end_date": 1,
+    "image_url": 1
+}
+
 class TicketInDB(TicketBase):
     id: str
     status: TicketStatus = TicketStatus.PENDING
@@ -50,7 +70,7 @@ class TicketInDB(TicketBase):
     created_at: datetime
     updated_at: datetime
     qr_code_url: Optional[str] = None
-    event: Optional[EventInDB] = None
+    event: Optional[TicketEvent] = None
 
     class Config:
         json_encoders = {
@@ -75,8 +95,40 @@ TICKET_INDEXES = [
     [("status", 1)],
     [("created_at", -1)],
     [("payment_reference", 1)],
+    # One ticket per (payment, ticket type), so a retried fulfillment cannot issue twice
+    {
+        "keys": [("payment_id", 1), ("ticket_type_name", 1)],
+        "unique": True,
+        "partialFilterExpression": {"payment_id": {"$type": "string"}}
+    },
+    # get_my_tickets / non-admin listings, newest first
+    [("user_id", 1), ("created_at", -1)],
+    # Loading an event's used tickets for gate scanning
+    [("event_id", 1), ("status", 1)],
+    # Delta scanner manifests
+    [("event_id", 1), ("updated_at", 1)],
     {
         "keys": [("buyer_name", "text"), ("buyer_email", "text")],
         "weights": {"buyer_name": 10, "buyer_email": 5}
     }
 ]
+
+
+# Inventory hold indexes; purge_at is only set once a hold is committed or
+# released, so active holds are never removed by the TTL monitor
+TICKET_HOLD_INDEXES = [
+    [("status", 1), ("expires_at", 1)],
+    [("reference", 1), ("ticket_type_name", 1), ("status", 1)],
+    {
+        "keys": [("purge_at", 1)],
+        "expireAfterSeconds": 0
+    }
+]
+
+# Sharded inventory counters, one document per (event, ticket type, shard)
+INVENTORY_SHARD_INDEXES = [
+    {
+        "keys": [("event_id", 1), ("ticket_type_name", 1), ("shard", 1)],
+        "unique": True
+    }
+]
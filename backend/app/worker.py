@@ -0,0 +1,197 @@
+"""
+Notification worker.
+
+Runs the jobs queued in the outbox collection (QR generation, ticket emails,
+SMS, event image variants) outside the API processes:
+
+    python -m app.worker
+"""
+import asyncio
+import base64
+import signal
+from typing import Any, Awaitable, Callable, Dict
+from bson import ObjectId
+from datetime import datetime
+from app.core.config import settings
+from app.core.http_client import HTTPClient
+from app.core.indexes import ensure_indexes
+from app.database import Database
+from app.services.email import EmailService
+from app.services.twilio_service import TwilioService
+from app.services.qr_service import QRService
+from app.services.image_service import ImageService, image_service
+from app.services.outbox_service import (
+    OutboxService, JOB_TICKET_ISSUED, JOB_TICKET_EMAIL, JOB_TICKET_SMS, JOB_IMAGE_VARIANTS
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+outbox_service = OutboxService()
+email_service = EmailService()
+twilio_service = TwilioService()
+qr_service = QRService()
+
+
+async def _load_ticket(db, payload: Dict[str, Any]):
+    ticket = await db.tickets.find_one({"_id": ObjectId(payload["ticket_id"])})
+    if not ticket:
+        raise LookupError(f"Ticket {payload['ticket_id']} not found")
+    event = await db.events.find_one({"_id": ObjectId(ticket["event_id"])})
+    if not event:
+        raise LookupError(f"Event {ticket['event_id']} not found")
+    return ticket, event
+
+
+async def handle_ticket_issued(db, payload: Dict[str, Any]) -> None:
+    """
+    Attach signed QR payloads to paid tickets, then queue their emails and SMS.
+
+    Jobs carry either one ticket_id or all ticket_ids of a payment; the QR
+    images of a group purchase are rendered together across the render pool
+    so the email jobs find them in the cache.
+    """
+    ticket_ids = payload.get("ticket_ids") or [payload["ticket_id"]]
+    tickets = await db.tickets.find(
+        {"_id": {"$in": [ObjectId(ticket_id) for ticket_id in ticket_ids]}}
+    ).to_list(length=len(ticket_ids))
+    found = {str(ticket["_id"]) for ticket in tickets}
+    missing = [ticket_id for ticket_id in ticket_ids if ticket_id not in found]
+    if missing:
+        raise LookupError(f"Tickets {', '.join(missing)} not found")
+
+    now = datetime.utcnow()
+    for ticket in tickets:
+        if ticket.get("qr_payload"):
+            continue
+        # Only the payload is stored; images are rendered on demand
+        qr_payload = qr_service.build_payload(str(ticket["_id"]), str(ticket["event_id"]))
+        result = await db.tickets.update_one(
+            {"_id": ticket["_id"], "qr_payload": {"$exists": False}},
+            {"$set": {"qr_payload": qr_payload, "status": "paid", "updated_at": now}}
+        )
+        if result.modified_count:
+            ticket["qr_payload"] = qr_payload
+            logger.info(f"Updated ticket {ticket['_id']} with QR payload")
+        else:
+            # Another run got there first; use the payload it stored
+            ticket = await db.tickets.find_one({"_id": ticket["_id"]}) or ticket
+
+    qr_payloads = [ticket["qr_payload"] for ticket in tickets if ticket.get("qr_payload")]
+    await qr_service.generate_many(qr_payloads)
+
+    for ticket in tickets:
+        ticket_id = str(ticket["_id"])
+        await outbox_service.enqueue(
+            db, JOB_TICKET_EMAIL, {"ticket_id": ticket_id}, dedupe_key=f"{JOB_TICKET_EMAIL}:{ticket_id}"
+        )
+        if ticket.get("buyer_phone"):
+            await outbox_service.enqueue(
+                db, JOB_TICKET_SMS, {"ticket_id": ticket_id}, dedupe_key=f"{JOB_TICKET_SMS}:{ticket_id}"
+            )
+
+
+async def handle_ticket_email(db, payload: Dict[str, Any]) -> None:
+    ticket, event = await _load_ticket(db, payload)
+    if not ticket.get("qr_payload"):
+        raise LookupError(f"Ticket {ticket['_id']} has no QR payload yet")
+    # The email embeds the image as base64; it is not stored on the ticket
+    qr_image = base64.b64encode(await qr_service.render_async(ticket["qr_payload"])).decode()
+    sent = await email_service.send_ticket_qr_code(
+        ticket,
+        event,
+        qr_image,
+        ticket["buyer_email"]
+    )
+    if not sent:
+        raise RuntimeError(f"Ticket email to {ticket['buyer_email']} was not sent")
+
+
+async def handle_ticket_sms(db, payload: Dict[str, Any]) -> None:
+    ticket, event = await _load_ticket(db, payload)
+    sent = await twilio_service.send_ticket_confirmation(
+        ticket["buyer_phone"],
+        event["title"],
+        str(ticket["_id"])
+    )
+    if not sent:
+        raise RuntimeError(f"Ticket SMS to {ticket['buyer_phone']} was not sent")
+
+
+async def handle_image_variants(db, payload: Dict[str, Any]) -> None:
+    await image_service.process_event_image(
+        db,
+        ObjectId(payload["event_id"]),
+        payload["image_url"],
+        asset_id=payload.get("asset_id")
+    )
+
+
+HANDLERS: Dict[str, Callable[[Any, Dict[str, Any]], Awaitable[None]]] = {
+    JOB_TICKET_ISSUED: handle_ticket_issued,
+    JOB_TICKET_EMAIL: handle_ticket_email,
+    JOB_TICKET_SMS: handle_ticket_sms,
+    JOB_IMAGE_VARIANTS: handle_image_variants
+}
+
+
+async def run_job(db, job: Dict[str, Any]) -> None:
+    handler = HANDLERS.get(job["kind"])
+    try:
+        if handler is None:
+            raise LookupError(f"No handler for job kind {job['kind']}")
+        await handler(db, job["payload"])
+    except Exception as e:
+        await outbox_service.fail(db, job, f"{type(e).__name__}: {str(e)}")
+    else:
+        await outbox_service.complete(db, job)
+
+
+async def consume(db, stopping: asyncio.Event) -> None:
+    """
+    Claim and run jobs one at a time until asked to stop
+    """
+    while not stopping.is_set():
+        try:
+            job = await outbox_service.claim(db)
+        except Exception as e:
+            logger.error(f"Error claiming outbox job: {str(e)}")
+            job = None
+        if job is None:
+            try:
+                await asyncio.wait_for(stopping.wait(), timeout=settings.OUTBOX_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        await run_job(db, job)
+
+
+async def main() -> None:
+    db = await Database.get_db()
+    await HTTPClient.start()
+    # The dedupe index must exist before jobs are enqueued
+    await ensure_indexes(db, collections=["outbox"])
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+
+    logger.info(f"Outbox worker {outbox_service.worker_id} started with concurrency {settings.OUTBOX_CONCURRENCY}")
+    try:
+        await asyncio.gather(*(consume(db, stopping) for _ in range(settings.OUTBOX_CONCURRENCY)))
+    finally:
+        await EmailService.close_pool()
+        QRService.shutdown_pool()
+        ImageService.shutdown_pool()
+        await HTTPClient.close()
+        await Database.close_mongo_connection()
+        logger.info("Outbox worker stopped")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    asyncio.run(main())
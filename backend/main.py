@@ -8,11 +8,21 @@ from fastapi.middleware.trustedhost import TrustedHostMiddleware
 import logging
 import uvicorn
 from app.database import Database
+from app.core.http_client import HTTPClient
+from app.core.indexes import ensure_indexes
+from app.services.email import EmailService
+from app.services.qr_service import QRService
+from app.services.image_service import ImageService
+from app.services.scan_service import ScanService
+from app.services.twilio_service import TwilioService
+from app.services.upload_service import upload_service
+from app.auth.utils import user_cache, password_hasher
 from app.core.config import settings
 from app.auth.routes import router as auth_router
 from app.events.routes import router as events_router
 from app.tickets.routes import router as tickets_router
 from app.payments.routes import router as payments_router
+from app.admission.routes import router as admission_router
 
 # Routers (Import and add your routers here)
 # from routes import auth_routes, event_routes, ticket_routes, admin_routes
@@ -51,12 +61,22 @@ app.add_middleware(
 async def startup_event():
     # Connect to MongoDB
     await Database.connect_to_mongo()
+    if settings.INDEXES_ON_STARTUP:
+        await ensure_indexes(Database.db)
+    # Shared pooled client for Paystack and other outbound APIs
+    await HTTPClient.start()
     logger.info("Application startup complete")
 
 @app.on_event("shutdown")
 async def shutdown_event():
     # Close MongoDB connection
     await Database.close_mongo_connection()
+    await HTTPClient.close()
+    await EmailService.close_pool()
+    QRService.shutdown_pool()
+    ImageService.shutdown_pool()
+    password_hasher.shutdown()
+    upload_service.shutdown()
     logger.info("Application shutdown complete")
 
 # Global error handler
@@ -74,7 +94,14 @@ async def health_check():
     return {
         "status": "healthy",
         "version": "1.0.0",
-        "database": "connected" if Database.db else "disconnected"
+        "database": "connected" if Database.db else "disconnected",
+        "http_pool": HTTPClient.stats(),
+        "smtp_pool": EmailService.stats(),
+        "sms": TwilioService.stats(),
+        "user_cache": user_cache.stats(),
+        "password_hashing": password_hasher.stats(),
+        "scan_index": ScanService.stats(),
+        "uploads": upload_service.stats()
     }
 
 # Root route
@@ -90,6 +117,7 @@ async def root():
 app.include_router(auth_router, prefix=settings.API_V1_STR)
 app.include_router(events_router, prefix=settings.API_V1_STR)
 app.include_router(tickets_router, prefix=settings.API_V1_STR)
+app.include_router(admission_router, prefix=settings.API_V1_STR)
 
 # Debug print for payment router
 logger.info(f"Including payment router with prefix: {settings.API_V1_STR}")
@@ -0,0 +1,100 @@
+"""
+Concurrency benchmark for ticket reservations: single event document vs sharded counters.
+
+Needs a local mongod. Each mode gets a fresh event with exactly enough stock
+for every buyer, fires the reservations with bounded concurrency and checks
+that nothing was oversold or lost:
+
+    python -m scripts.bench_inventory [--buyers 5000] [--concurrency 200] [--shards 16]
+
+Everything is written to a scratch database (event_booking_bench by default)
+that is dropped afterwards unless --keep is given.
+"""
+import argparse
+import asyncio
+import time
+from scripts.common import report
+from motor.motor_asyncio import AsyncIOMotorClient
+from app.core.config import settings
+from app.core.indexes import ensure_indexes
+from app.services.inventory_service import InventoryService
+
+TICKET_TYPE = "General"
+
+
+async def _new_event(db, stock: int):
+    result = await db.events.insert_one({
+        "title": "Inventory benchmark",
+        "ticket_types": [{"name": TICKET_TYPE, "price": 10.0, "quantity": stock, "is_available": True}],
+        "total_tickets_sold": 0,
+        "total_revenue": 0.0,
+        "remaining_total": stock,
+        "sold_out": False
+    })
+    return result.inserted_id
+
+
+async def run_mode(db, inventory: InventoryService, shards: int, buyers: int, concurrency: int) -> float:
+    for collection in ("events", "ticket_holds", "inventory_shards"):
+        await db[collection].delete_many({})
+    event_id = await _new_event(db, buyers)
+    if shards:
+        await inventory.enable_sharding(db, event_id, shards)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    failures = 0
+
+    async def buy(i: int) -> None:
+        nonlocal failures
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await inventory.reserve(db, event_id, TICKET_TYPE, 1, f"bench-{shards}-{i}")
+            except Exception:
+                failures += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(buy(i) for i in range(buyers)))
+    elapsed = time.perf_counter() - started
+
+    label = f"sharded ({shards} counters)" if shards else "single document"
+    rate = report(label, buyers - failures, elapsed, latencies)
+
+    if shards:
+        await inventory.reconcile_shards(db, event_id)
+    event = await db.events.find_one({"_id": event_id})
+    left = event["ticket_types"][0]["quantity"]
+    holds = await db.ticket_holds.count_documents({"event_id": event_id})
+    if failures or left != 0 or holds != buyers:
+        print(f"  !! {failures} failed reservations, {left} tickets left, {holds} holds for {buyers} buyers")
+    return rate
+
+
+async def _main(args) -> None:
+    client = AsyncIOMotorClient(args.mongo_uri, maxPoolSize=max(100, args.concurrency))
+    db = client[args.database]
+    inventory = InventoryService()
+    try:
+        await ensure_indexes(db, collections=["events", "ticket_holds", "inventory_shards"])
+        print(f"{args.buyers} buyers, concurrency {args.concurrency}, one ticket each")
+        single = await run_mode(db, inventory, 0, args.buyers, args.concurrency)
+        sharded = await run_mode(db, inventory, args.shards, args.buyers, args.concurrency)
+        if single:
+            print(f"speedup: {sharded / single:.2f}x")
+    finally:
+        if not args.keep:
+            await client.drop_database(args.database)
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark single-document vs sharded ticket reservations")
+    parser.add_argument("--mongo-uri", default=settings.MONGO_URI)
+    parser.add_argument("--database", default="event_booking_bench")
+    parser.add_argument("--buyers", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--shards", type=int, default=16)
+    parser.add_argument("--keep", action="store_true", help="keep the scratch database")
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,121 @@
+"""
+Latency of unrelated requests while a storm of logins is being verified.
+
+A steady stream of light "requests" (1 ms of simulated I/O each) runs on the
+event loop next to --logins bcrypt verifications. The storm is run twice:
+with verify_password called inline, as the auth routes used to, and through
+the PasswordHasher thread pool. The p50/p99 latency of the light requests
+shows how much the storm stalls everything else on the worker:
+
+    python -m scripts.bench_password_hashing [--logins 100] [--concurrency 20] [--rounds 12]
+
+With --url the same measurement is taken against a running API instead:
+POST /api/v1/auth/login for a real account in parallel with GET /health probes.
+
+    python -m scripts.bench_password_hashing --url http://localhost:8000 --email a@b.c --password secret
+"""
+import argparse
+import asyncio
+import os
+import time
+from scripts.common import percentile, report
+
+
+def _settings_from_args(args) -> None:
+    # Must be set before app.auth.utils builds its CryptContext and pool
+    os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+    os.environ["PASSWORD_HASH_WORKERS"] = str(args.workers)
+    os.environ["PASSWORD_HASH_MAX_PENDING"] = str(max(args.logins, 64))
+
+
+async def probe(latencies: list, stop: asyncio.Event, interval: float, request) -> None:
+    """
+    Start a light request every interval and record how long each one takes
+    """
+    tasks = []
+
+    async def one():
+        started = time.perf_counter()
+        await request()
+        latencies.append(time.perf_counter() - started)
+
+    while not stop.is_set():
+        tasks.append(asyncio.create_task(one()))
+        await asyncio.sleep(interval)
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def storm(label: str, logins: int, concurrency: int, login, request, interval: float) -> None:
+    latencies = []
+    stop = asyncio.Event()
+    prober = asyncio.create_task(probe(latencies, stop, interval, request))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await login()
+
+    await asyncio.sleep(0.2)
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await prober
+    report(f"{label} logins", logins, elapsed)
+    print(
+        f"  other requests: {len(latencies)}, p50 {percentile(latencies, 50) * 1000:.1f}ms, "
+        f"p99 {percentile(latencies, 99) * 1000:.1f}ms, max {max(latencies, default=0) * 1000:.1f}ms"
+    )
+
+
+async def run_local(args) -> None:
+    _settings_from_args(args)
+    from app.auth.utils import pwd_context, password_hasher, verify_password, verify_and_update_password
+
+    hashed = pwd_context.hash("correct horse battery staple")
+
+    async def light_request():
+        await asyncio.sleep(0.001)
+
+    async def inline_login():
+        verify_password("correct horse battery staple", hashed)
+
+    async def pooled_login():
+        await verify_and_update_password("correct horse battery staple", hashed)
+
+    print(f"bcrypt cost {args.rounds}, {args.workers} hashing threads, {args.logins} logins")
+    await storm("inline", args.logins, args.concurrency, inline_login, light_request, args.interval / 1000)
+    await storm("thread pool", args.logins, args.concurrency, pooled_login, light_request, args.interval / 1000)
+    print(f"  hasher stats: {password_hasher.stats()}")
+    password_hasher.shutdown()
+
+
+async def run_remote(args) -> None:
+    import httpx
+    from app.core.config import settings
+
+    async with httpx.AsyncClient(base_url=args.url, timeout=60) as client:
+        async def light_request():
+            await client.get("/health")
+
+        async def login():
+            await client.post(
+                f"{settings.API_V1_STR}/auth/login",
+                json={"email": args.email, "password": args.password}
+            )
+
+        await storm("HTTP", args.logins, args.concurrency, login, light_request, args.interval / 1000)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark request latency during a login storm")
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt cost")
+    parser.add_argument("--workers", type=int, default=4, help="hashing threads")
+    parser.add_argument("--interval", type=float, default=5, help="ms between unrelated requests")
+    parser.add_argument("--url", help="server root, e.g. http://localhost:8000, to measure a running API instead")
+    parser.add_argument("--email")
+    parser.add_argument("--password")
+    args = parser.parse_args()
+    asyncio.run(run_remote(args) if args.url else run_local(args))
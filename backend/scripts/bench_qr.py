@@ -0,0 +1,88 @@
+"""
+QR codes per second for the single and batch rendering paths.
+
+Renders --count distinct signed payloads (so the image cache never hits)
+three ways:
+
+- the original renderer: fixed version 1 and box size 10, one at a time
+- QRService.render_uncached, one at a time in this process
+- QRService.generate_many, one batch spread over the process pool
+
+The pool is started and warmed up before it is timed; its start-up time is
+reported separately. Average image size is shown for each path:
+
+    python -m scripts.bench_qr [--count 500] [--workers 0] [--format png]
+"""
+import argparse
+import asyncio
+import io
+import os
+import time
+from scripts.common import report
+
+
+def original_render(payload: str) -> bytes:
+    """
+    QR rendering as QRService.generate_qr_code used to do it
+    """
+    import qrcode
+
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=10,
+        border=4,
+    )
+    qr.add_data(payload)
+    qr.make(fit=True)
+    buffered = io.BytesIO()
+    qr.make_image(fill_color="black", back_color="white").save(buffered, format="PNG")
+    return buffered.getvalue()
+
+
+def _timed(label: str, images_fn, count: int) -> float:
+    started = time.perf_counter()
+    images = images_fn()
+    rate = report(label, count, time.perf_counter() - started)
+    print(f"  average image {sum(len(image) for image in images) / len(images):.0f} bytes")
+    return rate
+
+
+async def _main(args) -> None:
+    # Must be set before the settings are loaded
+    os.environ["QR_RENDER_WORKERS"] = str(args.workers)
+    from app.services.qr_service import QRService
+
+    qr_service = QRService()
+    payloads = [qr_service.build_payload(f"{i:024x}", "64b000000000000000000002") for i in range(args.count)]
+    print(f"{args.count} payloads of {len(payloads[0])} characters, {args.format}")
+
+    if args.format == "png":
+        _timed("original (v1, box 10)", lambda: [original_render(p) for p in payloads], args.count)
+    single = _timed(
+        "single, in process",
+        lambda: [qr_service.render_uncached(p, args.format) for p in payloads],
+        args.count
+    )
+
+    started = time.perf_counter()
+    pool = QRService.get_pool()
+    warm_up = [qr_service.build_payload("warm", str(i)) for i in range(pool._max_workers * 2)]
+    await qr_service.generate_many(warm_up, args.format)
+    print(f"  process pool of {pool._max_workers} started in {time.perf_counter() - started:.2f}s")
+
+    started = time.perf_counter()
+    images = await qr_service.generate_many(payloads, args.format)
+    batch = report("batch, process pool", args.count, time.perf_counter() - started)
+    print(f"  average image {sum(len(image) for image in images) / len(images):.0f} bytes")
+    QRService.shutdown_pool()
+    if single:
+        print(f"speedup: {batch / single:.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark single vs batch QR rendering")
+    parser.add_argument("--count", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=0, help="pool processes; 0 uses one per CPU core")
+    parser.add_argument("--format", choices=["png", "svg"], default="png")
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,148 @@
+"""
+SMS fan-out benchmark against a local stand-in for the Twilio Messages API.
+
+The stand-in answers POST /2010-04-01/Accounts/{sid}/Messages.json with 201
+and a message SID after --latency ms, and records how many requests were in
+flight at once. The same messages are sent two ways through TwilioService:
+
+- send_sms awaited one message at a time, as the notification code used to
+- send_many, bounded by TWILIO_MAX_CONCURRENCY and TWILIO_RATE_PER_SECOND
+
+    python -m scripts.bench_sms [--messages 200] [--latency 150] [--concurrency 10] [--rate 0]
+
+With --serve only the stand-in runs, so a local API can send to it:
+
+    python -m scripts.bench_sms --serve --port 8200
+    TWILIO_BASE_URL=http://localhost:8200/2010-04-01 TWILIO_ACCOUNT_SID=ACfake uvicorn main:app
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from scripts.common import report
+
+MESSAGES_PATH = re.compile(r"^/2010-04-01/Accounts/([^/]+)/Messages\.json$")
+
+
+class FakeTwilio:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.received = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+
+    def reset(self) -> None:
+        with self.lock:
+            self.received = 0
+            self.peak_in_flight = 0
+
+    def handler(self):
+        twilio = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send(self, code: int, body: dict) -> None:
+                data = json.dumps(body).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                match = MESSAGES_PATH.match(self.path)
+                if not match:
+                    return self._send(404, {"code": 20404, "message": "The requested resource was not found"})
+                if not self.headers.get("Authorization", "").startswith("Basic "):
+                    return self._send(401, {"code": 20003, "message": "Authenticate"})
+                with twilio.lock:
+                    twilio.in_flight += 1
+                    twilio.peak_in_flight = max(twilio.peak_in_flight, twilio.in_flight)
+                try:
+                    time.sleep(twilio.latency)
+                finally:
+                    with twilio.lock:
+                        twilio.in_flight -= 1
+                        twilio.received += 1
+                self._send(201, {"sid": f"SM{next(twilio.ids):032x}", "account_sid": match.group(1), "status": "queued"})
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self, host: str, port: int) -> ThreadingHTTPServer:
+        server = ThreadingHTTPServer((host, port), self.handler())
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+async def _main(args, port: int, twilio: FakeTwilio) -> None:
+    # Must be set before the settings are loaded
+    os.environ["TWILIO_BASE_URL"] = f"http://127.0.0.1:{port}/2010-04-01"
+    os.environ.setdefault("TWILIO_ACCOUNT_SID", "ACbench")
+    os.environ.setdefault("TWILIO_AUTH_TOKEN", "bench")
+    os.environ.setdefault("TWILIO_PHONE_NUMBER", "+15005550006")
+    os.environ["TWILIO_MAX_CONCURRENCY"] = str(args.concurrency)
+    os.environ["TWILIO_RATE_PER_SECOND"] = str(args.rate)
+    from app.core.http_client import HTTPClient
+    from app.services.twilio_service import TwilioService
+
+    twilio_service = TwilioService()
+    messages = [(f"+2547{i:08d}", f"Ticket Confirmed: Bench Event\nID: {i}") for i in range(args.messages)]
+    print(
+        f"Twilio stand-in on 127.0.0.1:{port}, {args.messages} messages, {args.latency:.0f}ms per request, "
+        f"concurrency {args.concurrency}, rate {args.rate or 'unlimited'}/s"
+    )
+
+    started = time.perf_counter()
+    sent = 0
+    for to_number, message in messages:
+        try:
+            sent += await twilio_service.send_sms(to_number, message)
+        except Exception:
+            pass
+    baseline = report("send_sms, one at a time", sent, time.perf_counter() - started)
+    print(f"  peak requests in flight: {twilio.peak_in_flight}")
+
+    twilio.reset()
+    started = time.perf_counter()
+    results = await twilio_service.send_many(messages)
+    rate = report("send_many", sum(results), time.perf_counter() - started)
+    print(f"  peak requests in flight: {twilio.peak_in_flight}, failed: {results.count(False)}")
+    await HTTPClient.close()
+    if baseline:
+        print(f"speedup: {rate / baseline:.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark SMS fan-out against a local Twilio stand-in")
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=150, help="ms the stand-in takes per request")
+    parser.add_argument("--concurrency", type=int, default=10, help="TWILIO_MAX_CONCURRENCY")
+    parser.add_argument("--rate", type=float, default=0, help="TWILIO_RATE_PER_SECOND; 0 disables the limit")
+    parser.add_argument("--serve", action="store_true", help="only run the stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0)
+    args = parser.parse_args()
+
+    twilio = FakeTwilio(args.latency / 1000)
+    server = twilio.start(args.host, args.port)
+    port = server.server_address[1]
+    if args.serve:
+        print(f"Twilio stand-in on http://{args.host}:{port}/2010-04-01 (Ctrl+C to stop)")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+    else:
+        asyncio.run(_main(args, port, twilio))
+    server.shutdown()
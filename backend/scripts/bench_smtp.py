@@ -0,0 +1,154 @@
+"""
+Throughput benchmark for the pooled SMTP transport against a local SMTP sink.
+
+The sink runs in a background thread and accepts everything it is sent;
+--latency delays every reply and --connect-latency delays the greeting,
+standing in for network round trips and the TLS + login handshake of a real
+server. Two paths send the same messages:
+
+- smtplib with a new connection per message, called inline as EmailService
+  used to (one message at a time, blocking the event loop)
+- SMTPPool with --pool-size connections and --concurrency senders
+
+Event loop lag is sampled during each run to show the blocking:
+
+    python -m scripts.bench_smtp [--messages 500] [--pool-size 4] [--latency 2] [--connect-latency 50]
+"""
+import argparse
+import asyncio
+import smtplib
+import threading
+import time
+from email.message import EmailMessage
+from scripts.common import report
+from app.services.smtp_pool import SMTPPool
+
+
+class SMTPSink:
+    """
+    Minimal SMTP server that accepts and counts messages
+    """
+
+    def __init__(self, latency: float, connect_latency: float):
+        self.latency = latency
+        self.connect_latency = connect_latency
+        self.received = 0
+        self.connections = 0
+        self.port = None
+        self._ready = threading.Event()
+
+    async def _reply(self, writer: asyncio.StreamWriter, line: str) -> None:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        writer.write(line.encode() + b"\r\n")
+        await writer.drain()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        if self.connect_latency:
+            await asyncio.sleep(self.connect_latency)
+        await self._reply(writer, "220 sink ESMTP")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode(errors="replace").strip().upper()
+                if command.startswith("EHLO"):
+                    await self._reply(writer, "250-sink\r\n250-PIPELINING\r\n250 8BITMIME")
+                elif command.startswith("DATA"):
+                    await self._reply(writer, "354 End data with <CR><LF>.<CR><LF>")
+                    while (await reader.readline()) not in (b".\r\n", b".\n", b""):
+                        pass
+                    self.received += 1
+                    await self._reply(writer, "250 OK queued")
+                elif command.startswith("QUIT"):
+                    await self._reply(writer, "221 Bye")
+                    break
+                elif command.startswith(("HELO", "MAIL", "RCPT", "RSET", "NOOP")):
+                    await self._reply(writer, "250 OK")
+                else:
+                    await self._reply(writer, "502 Command not implemented")
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _serve(self) -> None:
+        server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = server.sockets[0].getsockname()[1]
+        self._ready.set()
+        async with server:
+            await server.serve_forever()
+
+    def start(self) -> int:
+        threading.Thread(target=lambda: asyncio.run(self._serve()), daemon=True).start()
+        self._ready.wait()
+        return self.port
+
+
+def build_message(i: int) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = "tickets@example.com"
+    message["To"] = f"buyer{i}@example.com"
+    message["Subject"] = f"Your ticket #{i}"
+    message.set_content("Thank you for your purchase.\n" * 80)
+    return message
+
+
+async def sample_loop_lag(samples: list, interval: float = 0.01) -> None:
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(time.perf_counter() - started - interval)
+
+
+async def timed(label: str, count: int, run) -> float:
+    lags = []
+    sampler = asyncio.create_task(sample_loop_lag(lags))
+    started = time.perf_counter()
+    await run()
+    elapsed = time.perf_counter() - started
+    sampler.cancel()
+    rate = report(label, count, elapsed)
+    print(f"  event loop lag max {max(lags, default=0) * 1000:.1f}ms over {len(lags)} samples")
+    return rate
+
+
+async def _main(args) -> None:
+    sink = SMTPSink(args.latency / 1000, args.connect_latency / 1000)
+    port = sink.start()
+    messages = [build_message(i) for i in range(args.messages)]
+    print(f"SMTP sink on 127.0.0.1:{port}, {args.messages} messages")
+
+    async def unpooled():
+        for message in messages:
+            with smtplib.SMTP("127.0.0.1", port) as smtp:
+                smtp.send_message(message)
+
+    pool = SMTPPool("127.0.0.1", port, start_tls=False, size=args.pool_size)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def pooled():
+        async def send(message):
+            async with semaphore:
+                await pool.send_message(message)
+        await asyncio.gather(*(send(message) for message in messages))
+
+    baseline = await timed("smtplib, connection each", args.messages, unpooled)
+    connections = sink.connections
+    rate = await timed(f"SMTPPool size {args.pool_size}", args.messages, pooled)
+    print(f"  connections opened: {sink.connections - connections}, pool stats: {pool.stats()}")
+    await pool.close()
+    if baseline:
+        print(f"speedup: {rate / baseline:.2f}x ({sink.received} messages received)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark pooled SMTP sending against a local sink")
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=2, help="ms added to every server reply")
+    parser.add_argument("--connect-latency", type=float, default=50, help="ms added before the greeting")
+    asyncio.run(_main(parser.parse_args()))
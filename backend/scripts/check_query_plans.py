@@ -0,0 +1,118 @@
+"""
+Check that the hot query shapes are served by an index.
+
+Builds the declared indexes in a scratch database on a local mongod, seeds a
+few documents, runs explain() on each query below and exits non-zero if any
+winning plan contains a COLLSCAN (or, with --strict-sort, an in-memory SORT):
+
+    python -m scripts.check_query_plans [--mongo-uri mongodb://localhost:27017] [--keep]
+
+Add a query here whenever a route gains a new filter or sort.
+"""
+import argparse
+import asyncio
+import sys
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional
+import scripts.common  # noqa: F401  (fills in required settings)
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from app.core.config import settings
+from app.core.indexes import ensure_indexes
+
+USER_ID = "64b000000000000000000001"
+EVENT_ID = ObjectId("64b000000000000000000002")
+REFERENCE = "bench-reference"
+NOW = datetime.utcnow()
+
+# (route or job, collection, filter, sort)
+QUERIES: List[tuple] = [
+    ("auth: user by email", "users", {"email": "buyer@example.com"}, None),
+    ("payments: webhook/verify by reference", "payments", {"paystack_reference": REFERENCE}, None),
+    ("payments: user history", "payments", {"user_id": USER_ID}, [("created_at", -1)]),
+    ("tickets: get_my_tickets", "tickets", {"user_id": USER_ID}, [("created_at", -1)]),
+    ("tickets: fulfillment retry lookup", "tickets", {"payment_id": USER_ID, "ticket_type_name": "General"}, None),
+    ("tickets: get_buyer_tickets", "tickets", {"buyer_email": "buyer@example.com", "user_id": USER_ID}, None),
+    ("tickets: used tickets for scanning", "tickets", {"event_id": str(EVENT_ID), "status": "used"}, None),
+    ("tickets: manifest delta", "tickets", {"event_id": str(EVENT_ID), "updated_at": {"$gte": NOW}}, [("updated_at", 1)]),
+    ("events: get_featured_events", "events", {"featured": True}, [("start_date", 1), ("_id", 1)]),
+    ("events: available events", "events", {"sold_out": False}, [("start_date", 1), ("_id", 1)]),
+    ("events: price range", "events", {"max_price": {"$gte": 10}, "min_price": {"$lte": 50}}, None),
+    ("events: shard reconciler", "events", {"inventory_shards": {"$gt": 0}}, None),
+    ("holds: expiry sweeper", "ticket_holds", {"status": "active", "expires_at": {"$lt": NOW}}, None),
+    ("holds: confirm", "ticket_holds", {"reference": REFERENCE, "ticket_type_name": "General", "status": "active"}, None),
+    ("outbox: due jobs", "outbox", {"status": "pending", "run_at": {"$lte": NOW}}, [("run_at", 1)]),
+]
+
+
+async def _seed(db) -> None:
+    await db.users.insert_one({"email": "buyer@example.com"})
+    await db.payments.insert_one({"paystack_reference": REFERENCE, "user_id": USER_ID, "created_at": NOW})
+    await db.events.insert_many([
+        {
+            "title": f"Event {i}", "featured": i % 2 == 0, "start_date": NOW + timedelta(days=i),
+            "min_price": 10.0 * i, "max_price": 20.0 * i, "sold_out": i % 3 == 0,
+            **({"inventory_shards": 4} if i == 0 else {})
+        }
+        for i in range(10)
+    ])
+    await db.tickets.insert_many([
+        {
+            "user_id": USER_ID, "event_id": str(EVENT_ID), "ticket_type_name": "General", "status": "paid",
+            "buyer_email": f"buyer{i}@example.com", "created_at": NOW, "updated_at": NOW
+        }
+        for i in range(10)
+    ])
+
+
+def _stages(plan: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Every stage of an explain() plan, including nested and SBE query plans
+    """
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan
+        for value in plan.values():
+            yield from _stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from _stages(value)
+
+
+async def explain(db, collection: str, query: Dict[str, Any], sort: Optional[List[tuple]]) -> Dict[str, Any]:
+    cursor = db[collection].find(query).limit(20)
+    if sort:
+        cursor = cursor.sort(sort)
+    return await cursor.explain()
+
+
+async def _main(args) -> int:
+    client = AsyncIOMotorClient(args.mongo_uri)
+    db = client[args.database]
+    failures = 0
+    try:
+        await client.drop_database(args.database)
+        await ensure_indexes(db)
+        await _seed(db)
+        for label, collection, query, sort in QUERIES:
+            plan = (await explain(db, collection, query, sort))["queryPlanner"]["winningPlan"]
+            stages = [stage["stage"] for stage in _stages(plan)]
+            indexes = sorted({stage["indexName"] for stage in _stages(plan) if stage.get("indexName")})
+            bad = "COLLSCAN" in stages or (args.strict_sort and "SORT" in stages)
+            failures += bad
+            print(f"{'FAIL' if bad else 'ok':<5} {label:<44} {' > '.join(stages):<32} {', '.join(indexes)}")
+    finally:
+        if not args.keep:
+            await client.drop_database(args.database)
+        client.close()
+    print(f"{failures} of {len(QUERIES)} queries not served by an index" if failures else "All queries use an index")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fail if a hot query shape needs a collection scan")
+    parser.add_argument("--mongo-uri", default=settings.MONGO_URI)
+    parser.add_argument("--database", default="event_booking_plans")
+    parser.add_argument("--strict-sort", action="store_true", help="also fail on in-memory sorts")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch database")
+    sys.exit(asyncio.run(_main(parser.parse_args())))
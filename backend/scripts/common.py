@@ -0,0 +1,36 @@
+"""
+Helpers shared by the benchmark and stand-in scripts.
+
+Run the scripts from backend/ as modules, e.g. `python -m scripts.bench_inventory`.
+Import this module before anything from app: it fills in the settings that
+have no default so the scripts run without a .env file.
+"""
+import math
+import os
+from typing import List, Optional
+
+# Settings refuses to load without Cloudinary credentials; no script talks to Cloudinary
+for _name in ("CLOUDINARY_CLOUD_NAME", "CLOUDINARY_API_KEY", "CLOUDINARY_API_SECRET"):
+    os.environ.setdefault(_name, "bench")
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(len(ordered) * pct / 100) - 1)]
+
+
+def report(label: str, count: int, seconds: float, latencies: Optional[List[float]] = None) -> float:
+    """
+    Print one result line and return the rate per second
+    """
+    rate = count / seconds if seconds else 0.0
+    line = f"{label:<28} {count:>7} in {seconds:7.2f}s  {rate:10.1f}/s"
+    if latencies:
+        line += (
+            f"  p50 {percentile(latencies, 50) * 1000:7.1f}ms"
+            f"  p99 {percentile(latencies, 99) * 1000:7.1f}ms"
+        )
+    print(line)
+    return rate
@@ -0,0 +1,219 @@
+"""
+Local stand-in for the Paystack API that sends signed webhooks, for testing payments offline.
+
+Start it, then point the API at it and use the same secret on both sides:
+
+    python -m scripts.fake_paystack [--port 8100] [--webhook-url URL] [--auto-pay 2] [--duplicates 2]
+    PAYSTACK_BASE_URL=http://localhost:8100 PAYSTACK_SECRET_KEY=sk_test_fake uvicorn main:app
+
+Implemented endpoints: POST /transaction/initialize, GET /transaction/verify/{reference},
+POST /charge and GET /charge/{reference}. Opening a transaction's
+authorization_url (GET /checkout/{reference}) plays the buyer paying: the
+transaction succeeds, a charge.success webhook signed with HMAC-SHA512 of the
+body is posted to --webhook-url, and the browser is sent on to the callback
+URL. --auto-pay completes transactions by itself after a delay, and
+--duplicates delivers every webhook more than once to exercise the inbox.
+Failed deliveries are retried a few times, like Paystack does.
+"""
+import argparse
+import hashlib
+import hmac
+import itertools
+import json
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+from urllib.parse import urlencode
+from scripts.common import percentile
+from app.core.config import settings
+
+_ids = itertools.count(1000)
+
+
+class FakePaystack:
+    def __init__(self, base_url: str, secret: str, webhook_url: str, auto_pay: Optional[float], duplicates: int):
+        self.base_url = base_url
+        self.secret = secret
+        self.webhook_url = webhook_url
+        self.auto_pay = auto_pay
+        self.duplicates = duplicates
+        self.transactions: Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+        self.delivery_seconds = []
+
+    def create(self, payload: Dict[str, Any], channel: str) -> Dict[str, Any]:
+        reference = payload.get("reference") or uuid.uuid4().hex
+        transaction = {
+            "id": next(_ids),
+            "reference": reference,
+            "amount": int(payload.get("amount") or 0),
+            "currency": "KES",
+            "channel": channel,
+            "status": "pending" if channel == "card" else "pay_offline",
+            "customer": {"email": payload.get("email")},
+            "metadata": payload.get("metadata") or {},
+            "callback_url": payload.get("callback_url"),
+            "paid_at": None
+        }
+        with self.lock:
+            self.transactions[reference] = transaction
+        if self.auto_pay is not None:
+            threading.Timer(self.auto_pay, self.pay, args=(reference,)).start()
+        return transaction
+
+    def pay(self, reference: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            transaction = self.transactions.get(reference)
+            if transaction is None or transaction["status"] == "success":
+                return transaction
+            transaction["status"] = "success"
+            transaction["paid_at"] = time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime())
+        event = {"event": "charge.success", "data": self.public(transaction)}
+        for _ in range(self.duplicates):
+            threading.Thread(target=self.deliver, args=(event,), daemon=True).start()
+        return transaction
+
+    def deliver(self, event: Dict[str, Any], attempts: int = 4) -> None:
+        body = json.dumps(event).encode()
+        signature = hmac.new(self.secret.encode(), body, hashlib.sha512).hexdigest()
+        reference = event["data"]["reference"]
+        for attempt in range(1, attempts + 1):
+            started = time.perf_counter()
+            request = urllib.request.Request(
+                self.webhook_url,
+                data=body,
+                headers={"Content-Type": "application/json", "x-paystack-signature": signature},
+                method="POST"
+            )
+            try:
+                with urllib.request.urlopen(request, timeout=10) as response:
+                    outcome = response.status
+            except urllib.error.HTTPError as e:
+                outcome = e.code
+            except OSError as e:
+                outcome = str(e)
+            elapsed = time.perf_counter() - started
+            print(f"webhook {reference} attempt {attempt}: {outcome} in {elapsed * 1000:.1f}ms")
+            if outcome == 200:
+                with self.lock:
+                    self.delivery_seconds.append(elapsed)
+                return
+            time.sleep(2 ** attempt)
+
+    @staticmethod
+    def public(transaction: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: value for key, value in transaction.items() if key != "callback_url"}
+
+
+class Handler(BaseHTTPRequestHandler):
+    paystack: FakePaystack = None
+
+    def _send(self, code: int, body: Dict[str, Any]) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _authorized(self) -> bool:
+        if self.headers.get("Authorization") == f"Bearer {self.paystack.secret}":
+            return True
+        self._send(401, {"status": False, "message": "Invalid key"})
+        return False
+
+    def _json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        payload = self._json()
+        if self.path == "/transaction/initialize":
+            transaction = self.paystack.create(payload, "card")
+            self._send(200, {
+                "status": True,
+                "message": "Authorization URL created",
+                "data": {
+                    "authorization_url": f"{self.paystack.base_url}/checkout/{transaction['reference']}",
+                    "access_code": uuid.uuid4().hex[:16],
+                    "reference": transaction["reference"]
+                }
+            })
+        elif self.path == "/charge":
+            transaction = self.paystack.create(payload, "mobile_money")
+            self._send(200, {"status": True, "message": "Charge attempted", "data": self.paystack.public(transaction)})
+        else:
+            self._send(404, {"status": False, "message": "Not found"})
+
+    def do_GET(self):
+        checkout = re.fullmatch(r"/checkout/([^/?]+)", self.path)
+        if checkout:
+            transaction = self.paystack.pay(checkout.group(1))
+            if transaction is None:
+                self._send(404, {"status": False, "message": "Transaction not found"})
+                return
+            if transaction.get("callback_url"):
+                reference = transaction["reference"]
+                self.send_response(302)
+                self.send_header(
+                    "Location",
+                    f"{transaction['callback_url']}?{urlencode({'reference': reference, 'trxref': reference})}"
+                )
+                self.end_headers()
+            else:
+                self._send(200, {"status": True, "message": "Paid"})
+            return
+
+        if not self._authorized():
+            return
+        lookup = re.fullmatch(r"/(?:transaction/verify|charge)/([^/?]+)", self.path)
+        transaction = self.paystack.transactions.get(lookup.group(1)) if lookup else None
+        if transaction is None:
+            self._send(404, {"status": False, "message": "Transaction reference not found"})
+            return
+        self._send(200, {"status": True, "message": "Verification successful", "data": self.paystack.public(transaction)})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fake Paystack API that emits signed webhooks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--secret", default=settings.PAYSTACK_SECRET_KEY or "sk_test_fake")
+    parser.add_argument(
+        "--webhook-url",
+        default=f"http://localhost:8000{settings.API_V1_STR}/payments/webhook"
+    )
+    parser.add_argument("--auto-pay", type=float, help="complete every transaction after this many seconds")
+    parser.add_argument("--duplicates", type=int, default=1, help="deliver each webhook this many times")
+    args = parser.parse_args()
+
+    base_url = f"http://{args.host}:{args.port}"
+    Handler.paystack = FakePaystack(base_url, args.secret, args.webhook_url, args.auto_pay, max(1, args.duplicates))
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    print(f"Fake Paystack on {base_url}, webhooks to {args.webhook_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        deliveries = Handler.paystack.delivery_seconds
+        if deliveries:
+            print(
+                f"{len(deliveries)} webhooks delivered, "
+                f"p50 {percentile(deliveries, 50) * 1000:.1f}ms, p99 {percentile(deliveries, 99) * 1000:.1f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
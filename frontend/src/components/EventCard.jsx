@@ -34,7 +34,7 @@ const EventCard = ({ event }) => {
         className="relative w-full h-[200px] sm:h-[300px] bg-gray-100 cursor-pointer"
       >
         <img
-          src={event.image_url || 'https://via.placeholder.com/300x200?text=Event+Image'}
+          src={event.image_variants?.card || event.image_url || 'https://via.placeholder.com/300x200?text=Event+Image'}
           alt={event.title}
           className="w-full h-full object-cover"
           loading="lazy"
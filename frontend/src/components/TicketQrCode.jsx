@@ -0,0 +1,67 @@
+// src/components/TicketQrCode.jsx
+import React, { useEffect, useState } from 'react';
+import ticketsService from '../services/ticketsService';
+
+// QR images need the auth header, so they are fetched as blobs rather than linked directly
+const TicketQrCode = ({ ticket }) => {
+  const [src, setSrc] = useState(null);
+  const [failed, setFailed] = useState(false);
+  const issued = ticket.status === 'paid' || ticket.status === 'used';
+
+  useEffect(() => {
+    if (!issued) {
+      return undefined;
+    }
+
+    let objectUrl = null;
+    let cancelled = false;
+    setFailed(false);
+
+    ticketsService.getTicketQrCode(ticket.id)
+      .then((blob) => {
+        if (cancelled) {
+          return;
+        }
+        objectUrl = URL.createObjectURL(blob);
+        setSrc(objectUrl);
+      })
+      .catch((err) => {
+        console.error(`Error loading QR code for ticket ${ticket.id}:`, err);
+        if (!cancelled) {
+          setFailed(true);
+        }
+      });
+
+    return () => {
+      cancelled = true;
+      if (objectUrl) {
+        URL.revokeObjectURL(objectUrl);
+      }
+    };
+  }, [ticket.id, issued]);
+
+  if (src) {
+    return (
+      <img
+        src={src}
+        alt="Ticket QR Code"
+        className="w-48 h-48 object-contain border-2 border-gray-200 rounded-lg"
+      />
+    );
+  }
+
+  let message = 'QR Code Loading...';
+  if (!issued) {
+    message = 'QR code available once paid';
+  } else if (failed) {
+    message = 'QR code unavailable';
+  }
+
+  return (
+    <div className="w-48 h-48 flex items-center justify-center bg-gray-100 rounded-lg">
+      <p className="text-gray-500 text-center">{message}</p>
+    </div>
+  );
+};
+
+export default TicketQrCode;
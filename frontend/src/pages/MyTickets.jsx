@@ -3,6 +3,7 @@ import { useAuth } from '../context/AuthContext';
 import { useNavigate } from 'react-router-dom';
 import { format } from 'date-fns';
 import ticketsService from '../services/ticketsService';
+import TicketQrCode from '../components/TicketQrCode';
 
 const MyTickets = () => {
   const { user } = useAuth();
@@ -132,17 +133,7 @@ const MyTickets = () => {
                   <div className="p-6">
                     {/* QR Code */}
                     <div className="mb-6 flex justify-center">
-                      {ticket.qr_code_url ? (
-                        <img
-                          src={ticket.qr_code_url}
-                          alt="Ticket QR Code"
-                          className="w-48 h-48 object-contain border-2 border-gray-200 rounded-lg"
-                        />
-                      ) : (
-                        <div className="w-48 h-48 flex items-center justify-center bg-gray-100 rounded-lg">
-                          <p className="text-gray-500 text-center">QR Code Loading...</p>
-                        </div>
-                      )}
+                      <TicketQrCode ticket={ticket} />
                     </div>
 
                     {/* Ticket Details */}
@@ -1,46 +1,25 @@
 import api from './api';
 
+// Ticket fields the My Tickets page shows; list endpoints only return what is asked for
+const TICKET_CARD_FIELDS = [
+  'event_id', 'ticket_type_name', 'quantity', 'total_price', 'status', 'created_at'
+].join(',');
+
 const ticketsService = {
   getBuyerTickets: async (buyerEmail, page = 1, size = 10) => {
     try {
       const response = await api.get(`/tickets/buyer/${buyerEmail}`, {
-        params: { page, size }
+        params: { page, size, fields: TICKET_CARD_FIELDS }
       });
 
-      // Fetch event details for each ticket
-      const ticketsWithEvents = await Promise.all(
-        response.data.tickets.map(async (ticket) => {
-          try {
-            if (ticket.event_id) {
-              const eventResponse = await api.get(`/events/${ticket.event_id}`);
-              return {
-                ...ticket,
-                event: eventResponse.data,
-                // Ensure required fields have default values
-                status: ticket.status || 'pending',
-                total_price: ticket.total_price || ticket.total_amount || 0,
-                qr_code_url: ticket.qr_code_url || null
-              };
-            }
-            return {
-              ...ticket,
-              event: null,
-              status: ticket.status || 'pending',
-              total_price: ticket.total_price || ticket.total_amount || 0,
-              qr_code_url: ticket.qr_code_url || null
-            };
-          } catch (error) {
-            console.error(`Error fetching event details for ticket ${ticket.id}:`, error);
-            return {
-              ...ticket,
-              event: null,
-              status: ticket.status || 'pending',
-              total_price: ticket.total_price || ticket.total_amount || 0,
-              qr_code_url: ticket.qr_code_url || null
-            };
-          }
-        })
-      );
+      // Event details come embedded in each ticket
+      const ticketsWithEvents = response.data.tickets.map((ticket) => ({
+        ...ticket,
+        event: ticket.event || null,
+        // Ensure required fields have default values
+        status: ticket.status || 'pending',
+        total_price: ticket.total_price || ticket.total_amount || 0
+      }));
 
       return {
         ...response.data,
@@ -79,6 +58,14 @@ const ticketsService = {
     }
   },
 
+  // PNG of a ticket's QR code, rendered on demand by the API
+  getTicketQrCode: async (ticketId) => {
+    const response = await api.get(`/tickets/${ticketId}/qr.png`, {
+      responseType: 'blob'
+    });
+    return response.data;
+  },
+
   createTicket: async (ticketData) => {
     try {
       const response = await api.post('/tickets', ticketData);